@@ -0,0 +1,132 @@
+"""
+Agent Result Cache
+Per-user cache of the AI agents' portfolio analyses. An entry is reused until the user's
+portfolio version moves (the write endpoints bump it after committing), a shared table it
+reads changes, its TTL runs out or it is evicted as least recently used.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from table_versions import get_version_cache
+
+AGENT_CACHE_TTL_SECONDS = 300  # also bounds staleness after writes made outside the portal (ingest, reseed)
+AGENT_CACHE_MAX_ENTRIES = 5000
+
+
+class PortfolioVersions:
+    """Per-user change counters; bump after a user's holdings or allocation are committed"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, user_ids: Iterable[str]):
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+
+_portfolio_versions = PortfolioVersions()
+
+
+def get_portfolio_versions() -> PortfolioVersions:
+    """The process-wide portfolio version counters"""
+    return _portfolio_versions
+
+
+class UncachedText(str):
+    """An agent response the cache must not keep, such as a 'try again later' message"""
+
+
+class AgentResultCache:
+    """LRU + TTL cache of agent results keyed by (analysis, database, user)"""
+
+    def __init__(self, ttl_seconds: float = AGENT_CACHE_TTL_SECONDS, max_entries: int = AGENT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (result, version stamp, stored at)
+        self._entries: 'OrderedDict[Tuple, Tuple[Any, Tuple, float]]' = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple, stamp: Tuple, compute: Callable[[], Any]) -> Any:
+        """The cached result for key if it was stored under stamp within the TTL, else compute() and store it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == stamp and now - entry[2] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry[0]
+            self._counters['misses'] += 1
+            if entry is not None:
+                self._counters['stale'] += 1
+
+        result = compute()
+        if isinstance(result, UncachedText):
+            return result
+
+        with self._lock:
+            self._entries[key] = (result, stamp, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, hit/miss counters and hit rate"""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            **counters,
+            'hit_rate': round(counters['hits'] / lookups, 4) if lookups else None
+        }
+
+
+_agent_cache = AgentResultCache()
+
+
+def get_agent_cache() -> AgentResultCache:
+    """The process-wide agent result cache"""
+    return _agent_cache
+
+
+def _shared_versions(db_path: Optional[str], tables: Tuple[str, ...]) -> Tuple:
+    # Table versions are tracked for the portal database only
+    if db_path is not None or not tables:
+        return ()
+    versions = get_version_cache().versions()
+    return tuple(versions[table][0] if table in versions else None for table in tables)
+
+
+def cached_analysis(name: str, shared_tables: Tuple[str, ...] = ()):
+    """Agent method decorator: cache handler(user_id, message) per user.
+
+    The result must depend only on user_id's own portfolio data and shared_tables, not on
+    the message text.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, user_id: str, message: str):
+            stamp = (get_portfolio_versions().get(user_id), _shared_versions(self.db_path, shared_tables))
+            return get_agent_cache().get_or_compute((name, self.db_path, user_id), stamp,
+                                                    lambda: method(self, user_id, message))
+        return wrapper
+    return decorator
@@ -3,20 +3,20 @@ AI Agents System for Portfolio Management
 Multi-agent system providing intelligent portfolio analysis and recommendations
 """
 
-import sqlite3
 import json
 import datetime
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 import random
 import re
-
-@dataclass
-class ChatMessage:
-    role: str  # 'user' or 'assistant'
-    content: str
-    timestamp: datetime.datetime
-    agent_type: str = 'general'
+from agent_cache import UncachedText, cached_analysis
+from chat_history import ChatHistoryStore, ChatMessage
+from db import get_db_connection
+from goal_projection import CONTRIBUTION_RATE, project_user
+from intent_router import IntentRouter
+from portfolio_snapshot import get_portfolio_snapshot, RISK_LEVELS
+from risk_engine import get_fund_covariance, portfolio_risk
+from risk_scan import scan_risk_alerts
 
 @dataclass
 class MarketInsight:
@@ -36,10 +36,14 @@ class RiskAlert:
     affected_holdings: List[str]
     timestamp: datetime.datetime
 
+# Same thresholds as AutoRebalancingAgent.rebalancing_alert, so the sweep reads only alerting rows
+NEEDS_REBALANCING_CONDITION = 'poor_performer_count >= 2 OR COALESCE(poor_performer_avg_return, 0) < -10'
+MONITORING_CHUNK_ROWS = 500  # snapshots fetched per round trip during a sweep
+
 class AIAgentSystem:
-    def __init__(self, db_path='database/portfolio_management.db'):
-        self.db_path = db_path
-        self.chat_history = []
+    def __init__(self, db_path=None):
+        self.db_path = db_path  # None means the shared portal database
+        self.chat_history = ChatHistoryStore(db_path)  # bounded per-user buffers, persisted in chat_messages
         self.initialize_agents()
     
     def initialize_agents(self):
@@ -49,41 +53,30 @@ class AIAgentSystem:
         self.market_intelligence = MarketIntelligenceAgent(self.db_path)
         self.goal_planning_agent = GoalPlanningAgent(self.db_path)
         self.risk_management = RiskManagementAgent(self.db_path)
+        
+        # Ties go to the agent registered first, matching the old if/elif order
+        self.intent_router = IntentRouter('general', self.portfolio_assistant.handle_general_query)
+        self.register_agent('rebalancing', ['rebalance', 'buy', 'sell', 'allocation'],
+                            self.portfolio_assistant.handle_rebalancing_query)
+        self.register_agent('risk', ['risk', 'safe', 'protect', 'lose'], self.risk_management.analyze_risk_query)
+        self.register_agent('planning', ['goal', 'retire', 'plan', 'future'],
+                            self.goal_planning_agent.handle_planning_query)
+        self.register_agent('market', ['market', 'news', 'trend', 'economy'],
+                            self.market_intelligence.handle_market_query)
     
-    def get_db_connection(self):
-        """Get database connection"""
-        import os
-        # Use the same path logic as the main app
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        db_path = os.path.join(base_path, 'database', 'portfolio_management.db')
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def register_agent(self, agent_type: str, keywords: List[str], handler):
+        """Route chat messages containing any of keywords to handler(user_id, message)"""
+        self.intent_router.register(agent_type, keywords, handler)
     
     def process_chat_message(self, user_id: str, message: str) -> Dict[str, Any]:
         """Process incoming chat message and route to appropriate agent"""
-        message_lower = message.lower()
-        
-        # Determine which agent should handle the message
-        if any(word in message_lower for word in ['rebalance', 'buy', 'sell', 'allocation']):
-            response = self.portfolio_assistant.handle_rebalancing_query(user_id, message)
-            agent_type = 'rebalancing'
-        elif any(word in message_lower for word in ['risk', 'safe', 'protect', 'lose']):
-            response = self.risk_management.analyze_risk_query(user_id, message)
-            agent_type = 'risk'
-        elif any(word in message_lower for word in ['goal', 'retire', 'plan', 'future']):
-            response = self.goal_planning_agent.handle_planning_query(user_id, message)
-            agent_type = 'planning'
-        elif any(word in message_lower for word in ['market', 'news', 'trend', 'economy']):
-            response = self.market_intelligence.handle_market_query(user_id, message)
-            agent_type = 'market'
-        else:
-            response = self.portfolio_assistant.handle_general_query(user_id, message)
-            agent_type = 'general'
+        # One pass over every agent's keywords; the best scoring agent handles the message
+        agent_type, response = self.intent_router.route(user_id, message)
         
         # Store chat history
-        self.chat_history.append(ChatMessage('user', message, datetime.datetime.now(), agent_type))
-        self.chat_history.append(ChatMessage('assistant', response, datetime.datetime.now(), agent_type))
+        self.chat_history.append(user_id,
+                                 ChatMessage('user', message, datetime.datetime.now(), agent_type),
+                                 ChatMessage('assistant', response, datetime.datetime.now(), agent_type))
         
         return {
             'response': response,
@@ -129,18 +122,11 @@ class PortfolioAssistantAgent:
     def __init__(self, db_path):
         self.db_path = db_path
     
-    def get_db_connection(self):
-        import os
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        db_path = os.path.join(base_path, 'database', 'portfolio_management.db')
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
+    @cached_analysis('general', shared_tables=('funds_universe',))
     def handle_general_query(self, user_id: str, message: str) -> str:
         """Handle general portfolio queries"""
         try:
-            conn = self.get_db_connection()
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get user portfolio summary
@@ -181,12 +167,13 @@ class PortfolioAssistantAgent:
 What would you like to explore further?"""
             
         except Exception as e:
-            return f"I'm having trouble accessing your portfolio data right now. Please try again in a moment."
+            return UncachedText("I'm having trouble accessing your portfolio data right now. Please try again in a moment.")
     
+    @cached_analysis('rebalancing', shared_tables=('funds_universe',))
     def handle_rebalancing_query(self, user_id: str, message: str) -> str:
         """Handle rebalancing-related queries"""
         try:
-            conn = self.get_db_connection()
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get underperforming holdings
@@ -235,7 +222,7 @@ Based on your current holdings, I suggest a gradual rebalancing approach. You ca
 Would you like me to explain why these changes would benefit your portfolio?"""
             
         except Exception as e:
-            return "I'm having trouble analyzing your rebalancing options right now. Please check the Rebalancing page for detailed scenarios."
+            return UncachedText("I'm having trouble analyzing your rebalancing options right now. Please check the Rebalancing page for detailed scenarios.")
 
 class AutoRebalancingAgent:
     """Agent for autonomous portfolio monitoring and rebalancing suggestions"""
@@ -247,19 +234,8 @@ class AutoRebalancingAgent:
         """Monitor all portfolios and generate alerts"""
         alerts = []
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get all users
-            cursor.execute('SELECT DISTINCT user_id FROM user_holdings')
-            users = cursor.fetchall()
-            
-            for user in users:
-                user_id = user[0]
-                alert = self.check_user_portfolio(cursor, user_id)
-                if alert:
-                    alerts.append(alert)
-            
+            conn = get_db_connection(self.db_path)
+            alerts = list(self.sweep_portfolios(conn.cursor()))
             conn.close()
             
         except Exception as e:
@@ -267,21 +243,52 @@ class AutoRebalancingAgent:
         
         return alerts
     
+    def monitoring_watermark(self, cursor) -> Optional[str]:
+        """Latest snapshot refresh time; pass it back as since to re-check only what changed after it"""
+        cursor.execute('SELECT MAX(updated_at) FROM portfolio_snapshot')
+        return cursor.fetchone()[0]
+    
+    def sweep_portfolios(self, cursor, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield rebalancing alerts from one pass over portfolio_snapshot, in user order.
+        
+        With since (a watermark), only portfolios refreshed at or after it are checked, and
+        those that no longer need attention are yielded as {'user_id', 'type': 'cleared'}.
+        """
+        if since is None:
+            cursor.execute(f'''
+                SELECT * FROM portfolio_snapshot
+                WHERE holdings_count > 0 AND ({NEEDS_REBALANCING_CONDITION})
+                ORDER BY user_id
+            ''')
+        else:
+            cursor.execute('SELECT * FROM portfolio_snapshot WHERE updated_at >= ? ORDER BY user_id', (since,))
+        
+        while True:
+            snapshots = cursor.fetchmany(MONITORING_CHUNK_ROWS)
+            if not snapshots:
+                break
+            for snapshot in snapshots:
+                alert = self.rebalancing_alert(snapshot) if snapshot['holdings_count'] else None
+                if alert:
+                    yield alert
+                elif since is not None:
+                    yield {'user_id': snapshot['user_id'], 'type': 'cleared'}
+    
     def check_user_portfolio(self, cursor, user_id: str) -> Optional[Dict[str, Any]]:
         """Check individual portfolio for rebalancing needs"""
-        cursor.execute('''
-            SELECT COUNT(*) as poor_count, AVG(return_percent) as avg_return
-            FROM user_holdings 
-            WHERE user_id = ? AND performance_rating IN ('Poor', 'Below Average')
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        poor_count = result[0]
-        avg_return = result[1] or 0
+        snapshot = get_portfolio_snapshot(cursor, user_id)
+        if not snapshot:
+            return None
+        return self.rebalancing_alert(snapshot)
+    
+    def rebalancing_alert(self, snapshot) -> Optional[Dict[str, Any]]:
+        """The rebalancing alert for a portfolio snapshot row, or None"""
+        poor_count = snapshot['poor_performer_count']
+        avg_return = snapshot['poor_performer_avg_return'] or 0
         
         if poor_count >= 2 or avg_return < -10:
             return {
-                'user_id': user_id,
+                'user_id': snapshot['user_id'],
                 'type': 'rebalancing_needed',
                 'priority': 'high' if avg_return < -15 else 'medium',
                 'message': f'Portfolio has {poor_count} underperforming holdings with {avg_return:.1f}% average return',
@@ -394,10 +401,11 @@ class GoalPlanningAgent:
     def __init__(self, db_path):
         self.db_path = db_path
     
+    @cached_analysis('planning', shared_tables=('investor_ref_data',))
     def handle_planning_query(self, user_id: str, message: str) -> str:
         """Handle financial planning queries"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get user info
@@ -407,9 +415,9 @@ class GoalPlanningAgent:
             if not user_data:
                 return "I need access to your investor profile to provide personalized planning advice."
             
-            age = user_data[2]  # age column
-            risk_capacity = user_data[4]  # risk_capacity column
-            annual_income = user_data[6]  # annual_income column
+            age = user_data['age']
+            risk_capacity = user_data['risk_capacity']
+            annual_income = user_data['annual_income']
             
             # Calculate retirement planning
             retirement_age = 65
@@ -423,8 +431,10 @@ class GoalPlanningAgent:
             
             result = cursor.fetchone()
             current_portfolio = result[0] if result[0] else 0
-            
+
+            projection = project_user(conn, user_id)
             conn.close()
+            retirement = projection['goals'][0]
             
             # Simple retirement calculation
             target_retirement_fund = annual_income * 10  # 10x annual income rule
@@ -441,6 +451,12 @@ class GoalPlanningAgent:
 • Portfolio Value: ${current_portfolio:,.2f}
 • Target Retirement Fund: ${target_retirement_fund:,.2f}
 
+**Projection ({projection['paths']:,} simulated market paths):**
+• Chance of reaching your retirement target: {retirement['success_probability'] * 100:.0f}%
+• Likely value at {retirement_age}: ${retirement['median_value']:,.0f} (1-in-10 downside: ${retirement['p10_value']:,.0f})
+• Expected return of your current mix: {projection['expected_return'] * 100:.1f}% a year, volatility {projection['volatility'] * 100:.1f}%
+• Assumes {CONTRIBUTION_RATE * 100:.0f}% of income (${projection['annual_contribution']:,.0f}) invested each year until retirement
+
 **Recommendations:**
 • Monthly Savings Goal: ${monthly_savings_needed:,.2f}
 • Asset Allocation: {70-age}% stocks, {age-10}% bonds (age-based rule)
@@ -454,7 +470,7 @@ class GoalPlanningAgent:
 Would you like me to help you set specific investment goals?"""
             
         except Exception as e:
-            return "I'm having trouble accessing your planning data. Please ensure your profile is complete."
+            return UncachedText("I'm having trouble accessing your planning data. Please ensure your profile is complete.")
 
 class RiskManagementAgent:
     """Agent for portfolio risk analysis and management"""
@@ -462,49 +478,38 @@ class RiskManagementAgent:
     def __init__(self, db_path):
         self.db_path = db_path
     
+    @cached_analysis('risk')
     def analyze_risk_query(self, user_id: str, message: str) -> str:
         """Analyze portfolio risk and provide recommendations"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
-            # Get holdings with risk ratings
-            cursor.execute('''
-                SELECT uh.fund_name, uh.current_value, uh.risk_rating, uh.return_percent
-                FROM user_holdings uh
-                WHERE uh.user_id = ?
-            ''', (user_id,))
-            holdings = cursor.fetchall()
+            # Risk mix from the precomputed portfolio snapshot
+            snapshot = get_portfolio_snapshot(cursor, user_id)
+            metrics = portfolio_risk(conn, [user_id], covariance=get_fund_covariance(self.db_path)).get(user_id)
+            conn.close()
             
-            if not holdings:
+            if not snapshot or not snapshot['holdings_count']:
                 return "I need your portfolio data to perform a risk analysis."
             
-            total_value = sum(h[1] for h in holdings)
+            total_value = snapshot['total_value']
             
             # Calculate risk distribution
             risk_distribution = {}
-            for holding in holdings:
-                risk_level = holding[2]
-                value = holding[1]
-                percentage = (value / total_value) * 100
-                
-                if risk_level in risk_distribution:
-                    risk_distribution[risk_level] += percentage
-                else:
-                    risk_distribution[risk_level] = percentage
-            
-            # Identify high-risk holdings
-            high_risk_holdings = [h for h in holdings if h[2] in ['High', 'Very High']]
-            volatile_holdings = [h for h in holdings if h[3] and h[3] < -15]
+            for risk_level, column in RISK_LEVELS:
+                if snapshot[column]:
+                    risk_distribution[risk_level] = snapshot[column] / total_value * 100
             
-            conn.close()
+            high_risk_count = snapshot['high_risk_count']
+            volatile_count = snapshot['volatile_count']
             
             # Generate risk score (0-100)
             risk_score = 0
             risk_score += risk_distribution.get('Very High', 0) * 2
             risk_score += risk_distribution.get('High', 0) * 1.5
             risk_score += risk_distribution.get('Medium', 0) * 1
-            risk_score += len(volatile_holdings) * 5
+            risk_score += volatile_count * 5
             
             risk_level = 'Low' if risk_score < 30 else 'Medium' if risk_score < 60 else 'High'
             
@@ -513,13 +518,22 @@ class RiskManagementAgent:
             recommendations = []
             if risk_score > 70:
                 recommendations.append("Consider reducing exposure to high-risk assets")
-            if len(volatile_holdings) > 2:
+            if volatile_count > 2:
                 recommendations.append("Review holdings with significant losses")
             if risk_distribution.get('Very Low', 0) < 20:
                 recommendations.append("Add some stable, low-risk holdings for balance")
             
             recommendations_text = "\n".join([f"• {rec}" for rec in recommendations]) if recommendations else "• Your risk levels appear well-balanced"
             
+            volatility_text = "• Not enough position data to estimate volatility"
+            if metrics:
+                contributors = ", ".join(f"{c['fund_symbol']} ({c['risk_contribution']:.0f}% of risk, {c['weight']:.0f}% of value)"
+                                         for c in metrics['risk_contributions'][:3])
+                volatility_text = f"""• Expected annual volatility: {metrics['annual_volatility'] * 100:.1f}% (about ${metrics['annual_volatility_value']:,.0f})
+• 1-day value at risk ({metrics['confidence'] * 100:.0f}%): ${metrics['value_at_risk']:,.0f}
+• Biggest risk contributors: {contributors}
+• Based on fund price history for {metrics['history_coverage'] * 100:.0f}% of your portfolio; the rest uses risk-rating estimates"""
+            
             return f"""⚠️ **Risk Analysis Report**
 
 **Overall Risk Level:** {risk_level} ({risk_score:.0f}/100)
@@ -527,12 +541,15 @@ class RiskManagementAgent:
 **Risk Distribution:**
 {risk_text}
 
+**Volatility & Value at Risk:**
+{volatility_text}
+
 **Recommendations:**
 {recommendations_text}
 
 **Stress Test Results:**
 • In a 20% market downturn, your portfolio could lose approximately ${total_value * 0.15:,.0f}
-• High-risk holdings ({len(high_risk_holdings)}) may see 30-40% volatility
+• High-risk holdings ({high_risk_count}) may see 30-40% volatility
 
 💡 **Risk Management Tips:**
 • Diversify across asset classes
@@ -542,39 +559,20 @@ class RiskManagementAgent:
 Would you like specific suggestions to optimize your risk profile?"""
             
         except Exception as e:
-            return "I'm having trouble analyzing your portfolio risk. Please try again later."
+            return UncachedText("I'm having trouble analyzing your portfolio risk. Please try again later.")
     
     def generate_risk_alerts(self, user_id: str) -> List[RiskAlert]:
         """Generate risk alerts for a user's portfolio"""
         alerts = []
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Check for concentrated risk
-            cursor.execute('''
-                SELECT fund_name, current_value, 
-                       (current_value * 100.0 / (SELECT SUM(current_value) FROM user_holdings WHERE user_id = ?)) as percentage
-                FROM user_holdings 
-                WHERE user_id = ? AND 
-                      (current_value * 100.0 / (SELECT SUM(current_value) FROM user_holdings WHERE user_id = ?)) > 30
-            ''', (user_id, user_id, user_id))
-            
-            concentrated_holdings = cursor.fetchall()
-            
-            if concentrated_holdings:
-                for holding in concentrated_holdings:
-                    alerts.append(RiskAlert(
-                        level='medium',
-                        type='concentration_risk',
-                        message=f'{holding[0]} represents {holding[2]:.1f}% of your portfolio',
-                        recommendations=['Consider reducing position size', 'Diversify into other assets'],
-                        affected_holdings=[holding[0]],
-                        timestamp=datetime.datetime.now()
-                    ))
-            
+            conn = get_db_connection(self.db_path)
+            # Same snapshot-joined scan as the portfolio-wide /api/ai/risk-alerts, for one user
+            user_alerts = scan_risk_alerts(conn.cursor(), [user_id]).get(user_id, [])
             conn.close()
             
+            for alert in user_alerts:
+                alerts.append(RiskAlert(**{**alert, 'timestamp': datetime.datetime.fromisoformat(alert['timestamp'])}))
+            
         except Exception as e:
             print(f"Error generating risk alerts: {e}")
         
@@ -3,11 +3,19 @@ AI Agents API Routes
 Flask routes for the multi-agent AI system
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+from agent_cache import get_agent_cache
 from ai_agents import AIAgentSystem
 from ai_scenarios import AIScenarioGenerator
+from db import get_db_connection
+from drift_engine import compute_portfolio_drift, get_rebalancing_priority
+from goal_projection import get_projection_cache, parse_goal, project_book, project_user
+from risk_engine import DEFAULT_CONFIDENCE, DEFAULT_HORIZON_DAYS, get_fund_covariance, portfolio_risk
+from risk_scan import scan_risk_alerts
+from serializers import get_encoder
 import datetime
 import json
+import os
 
 # Create a blueprint for AI routes
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
@@ -16,6 +24,29 @@ ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 ai_system = AIAgentSystem()
 scenario_generator = AIScenarioGenerator()
 
+def equity_drift_for(record):
+    """Equity drift shown to advisors; an empty portfolio is off by its whole target"""
+    if record['portfolio_value']:
+        return record['drift']['equity']
+    return abs(record['target']['equity'] or 0)
+
+def number_arg(name, default, convert=float):
+    """Query parameter converted by convert; malformed values raise ValueError instead of falling back to default"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        raise ValueError(f"{name} must be {'a whole number' if convert is int else 'a number'}") from None
+
+def string_list(data, name):
+    """data[name] from a JSON body: None when absent, else it must be a list of strings"""
+    value = data.get(name)
+    if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+        raise ValueError(f'{name} must be a list of strings')
+    return value
+
 @ai_bp.route('/chat', methods=['POST'])
 def chat_with_ai():
     """Handle chat messages from users"""
@@ -44,16 +75,9 @@ def chat_with_ai():
 def get_chat_history(user_id):
     """Get chat history for a user"""
     try:
-        # Filter chat history for this user (simplified for demo)
-        history = [
-            {
-                'role': msg.role,
-                'content': msg.content,
-                'timestamp': msg.timestamp.isoformat(),
-                'agent_type': msg.agent_type
-            }
-            for msg in ai_system.chat_history[-20:]  # Last 20 messages
-        ]
+        # Last 20 messages of this user's conversation (?limit= for more, up to the buffer cap)
+        limit = min(request.args.get('limit', 20, type=int), ai_system.chat_history.max_messages)
+        history = [msg.to_dict() for msg in ai_system.chat_history.recent(user_id, max(limit, 0))]
         
         return jsonify({
             'success': True,
@@ -114,6 +138,94 @@ def get_market_intelligence():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@ai_bp.route('/risk-alerts')
+def get_portfolio_risk_alerts():
+    """Risk alerts for the whole book (or ?user_ids=a,b), grouped by user; ?level= keeps one level"""
+    try:
+        user_ids = request.args.get('user_ids')
+        user_ids = [user_id for user_id in user_ids.split(',') if user_id] if user_ids else None
+        level = request.args.get('level')
+        
+        conn = get_db_connection()
+        alerts_by_user = scan_risk_alerts(conn.cursor(), user_ids)
+        conn.close()
+        
+        if level:
+            alerts_by_user = {
+                user_id: [alert for alert in alerts if alert['level'] == level]
+                for user_id, alerts in alerts_by_user.items()
+            }
+            alerts_by_user = {user_id: alerts for user_id, alerts in alerts_by_user.items() if alerts}
+        
+        return jsonify({
+            'success': True,
+            'alerts_by_user': alerts_by_user,
+            'users_with_alerts': len(alerts_by_user),
+            'total_alerts': sum(len(alerts) for alerts in alerts_by_user.values()),
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_bp.route('/risk/metrics')
+def get_portfolio_risk_metrics():
+    """Volatility, parametric VaR and risk contributions for the whole book (or ?user_ids=a,b).
+    
+    ?confidence= (default 0.95) and ?horizon_days= (default 1) set the VaR.
+    """
+    try:
+        user_ids = request.args.get('user_ids')
+        user_ids = [user_id for user_id in user_ids.split(',') if user_id] if user_ids else None
+        confidence = number_arg('confidence', DEFAULT_CONFIDENCE)
+        horizon_days = number_arg('horizon_days', DEFAULT_HORIZON_DAYS, int)
+        
+        conn = get_db_connection()
+        try:
+            metrics_by_user = portfolio_risk(conn, user_ids, confidence, horizon_days)
+        finally:
+            conn.close()
+        
+        return jsonify({
+            'success': True,
+            'metrics_by_user': metrics_by_user,
+            'count': len(metrics_by_user),
+            'total_value_at_risk': round(sum(m['value_at_risk'] for m in metrics_by_user.values()), 2),
+            'covariance': get_fund_covariance().stats(),
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_bp.route('/risk/metrics/<user_id>')
+def get_risk_metrics(user_id):
+    """Volatility, parametric VaR and risk contributions for one portfolio"""
+    try:
+        confidence = number_arg('confidence', DEFAULT_CONFIDENCE)
+        horizon_days = number_arg('horizon_days', DEFAULT_HORIZON_DAYS, int)
+        
+        conn = get_db_connection()
+        try:
+            metrics = portfolio_risk(conn, [user_id], confidence, horizon_days).get(user_id)
+        finally:
+            conn.close()
+        
+        if metrics is None:
+            return jsonify({'success': False, 'error': 'No holdings found for this user'}), 404
+        
+        return jsonify({
+            'success': True,
+            'metrics': metrics
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @ai_bp.route('/risk-alerts/<user_id>')
 def get_risk_alerts(user_id):
     """Get risk alerts for a specific user"""
@@ -142,33 +254,129 @@ def get_risk_alerts(user_id):
 
 @ai_bp.route('/goals/<user_id>')
 def get_financial_goals(user_id):
-    """Get financial planning and goals analysis"""
+    """Get financial planning and goals analysis.
+    
+    The projection scores retirement plus any ?goal=name:amount:years given (repeatable).
+    """
     try:
+        extra_goals = [parse_goal(spec) for spec in request.args.getlist('goal')]
         planning_analysis = ai_system.goal_planning_agent.handle_planning_query(
             user_id, "Help me with financial planning"
         )
         
+        conn = get_db_connection()
+        try:
+            projection = project_user(conn, user_id, extra_goals)
+        finally:
+            conn.close()
+        
         return jsonify({
             'success': True,
             'planning_analysis': planning_analysis,
+            'projection': projection,
             'timestamp': datetime.datetime.now().isoformat()
         })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@ai_bp.route('/monitoring/alerts')
-def get_monitoring_alerts():
-    """Get autonomous monitoring alerts for all users"""
+@ai_bp.route('/goals/projections', methods=['POST'])
+def get_goal_projections():
+    """Monte Carlo goal projections for user_ids (every investor when omitted).
+    
+    Optional goals: ["name:amount:years", ...]; workers > 1 simulates on a process pool.
+    """
     try:
-        alerts = ai_system.rebalancing_agent.monitor_portfolios()
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            raise ValueError('Request body must be a JSON object')
+        user_ids = string_list(data, 'user_ids')
+        extra_goals = [parse_goal(spec) for spec in string_list(data, 'goals') or []]
+        workers = data.get('workers') or 0
+        if not isinstance(workers, int) or isinstance(workers, bool) or workers < 0:
+            raise ValueError('workers must be a non-negative whole number')
+        workers = min(workers, os.cpu_count() or 1)
+        
+        conn = get_db_connection()
+        try:
+            projections = project_book(conn, user_ids, extra_goals, workers=workers)
+        finally:
+            conn.close()
         
         return jsonify({
             'success': True,
-            'alerts': alerts,
+            'count': len(projections),
+            'projections': projections,
+            'cache': get_projection_cache().stats(),
             'timestamp': datetime.datetime.now().isoformat()
         })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_bp.route('/monitoring/alerts')
+def get_monitoring_alerts():
+    """Get autonomous monitoring alerts for all users.
+    
+    ?since=<watermark> re-checks only portfolios changed after an earlier sweep (cleared
+    ones are listed in cleared_user_ids); ?stream=1 sends the alerts as NDJSON as they are found.
+    """
+    try:
+        since = request.args.get('since')
+        if since:
+            try:
+                datetime.datetime.strptime(since, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return jsonify({'success': False, 'error': 'since must be a watermark from an earlier sweep'}), 400
+        
+        conn = get_db_connection()
+        streaming = False
+        try:
+            cursor = conn.cursor()
+            agent = ai_system.rebalancing_agent
+            watermark = agent.monitoring_watermark(cursor)
+            sweep = agent.sweep_portfolios(cursor, since or None)
+            
+            if request.args.get('stream') == '1':
+                encode = get_encoder()
+                
+                def generate():
+                    try:
+                        for alert in sweep:
+                            yield encode(alert) + b'\n'
+                    finally:
+                        conn.close()
+                
+                response = Response(generate(), mimetype='application/x-ndjson')
+                response.headers['X-Monitoring-Watermark'] = watermark or ''
+                streaming = True  # the generator closes the connection once the sweep is sent
+                return response
+            
+            alerts = []
+            cleared_user_ids = []
+            for alert in sweep:
+                if alert['type'] == 'cleared':
+                    cleared_user_ids.append(alert['user_id'])
+                else:
+                    alerts.append(alert)
+        finally:
+            if not streaming:
+                conn.close()
+        
+        body = {
+            'success': True,
+            'alerts': alerts,
+            'watermark': watermark,
+            'timestamp': datetime.datetime.now().isoformat()
+        }
+        if since:
+            body['cleared_user_ids'] = cleared_user_ids
+        return jsonify(body)
+        
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -207,7 +415,11 @@ def get_agent_status():
             'risk_management': 'active',
             'last_update': datetime.datetime.now().isoformat(),
             'total_insights': len(ai_system.market_intelligence.market_insights),
-            'chat_sessions': len(ai_system.chat_history)
+            'chat_sessions': ai_system.chat_history.session_count(),
+            'chat_history': ai_system.chat_history.stats(),
+            'analysis_cache': get_agent_cache().stats(),
+            'projection_cache': get_projection_cache().stats(),
+            'risk_covariance': get_fund_covariance().stats()
         }
         
         return jsonify({
@@ -240,56 +452,31 @@ def get_ai_scenarios():
 def get_user_scenarios(user_id):
     """Get personalized AI scenarios for a specific user"""
     try:
-        # Get customer profile from database
-        conn = ai_system.get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                ir.user_id, ir.full_name as name, ir.age, ir.investor_category as category,
-                ir.equities_percent as target_equity, ir.bonds_percent as target_bonds,
-                SUM(uh.current_value) as portfolio_value,
-                AVG(uh.return_percent) as avg_return,
-                SUM(CASE WHEN uh.asset_class = 'Equity' THEN uh.current_value ELSE 0 END) as equity_value,
-                SUM(CASE WHEN uh.asset_class = 'Bond' THEN uh.current_value ELSE 0 END) as bond_value
-            FROM investor_ref_data ir
-            LEFT JOIN user_holdings uh ON ir.user_id = uh.user_id
-            WHERE ir.user_id = ?
-            GROUP BY ir.user_id
-        ''', (user_id,))
-        
-        user_data = cursor.fetchone()
+        # Get customer profile from the portfolio snapshot
+        conn = get_db_connection()
+        records = compute_portfolio_drift(conn, user_id)
         conn.close()
         
-        if not user_data:
+        if not records:
             return jsonify({'success': False, 'error': 'User not found'}), 404
-        
-        # Calculate current allocation
-        total_value = user_data['portfolio_value'] or 0
-        if total_value > 0:
-            current_equity = (user_data['equity_value'] or 0) / total_value * 100
-            current_bonds = (user_data['bond_value'] or 0) / total_value * 100
-        else:
-            current_equity = current_bonds = 0
-        
-        equity_drift = abs(current_equity - (user_data['target_equity'] or 0))
+        record = records[0]
         
         # Create customer profile
         customer_profile = {
-            'user_id': user_data['user_id'],
-            'name': user_data['name'],
-            'age': user_data['age'],
-            'category': user_data['category'],
-            'portfolio_value': total_value,
-            'avg_return': user_data['avg_return'] or 0,
-            'equity_drift': equity_drift,
+            'user_id': record['user_id'],
+            'name': record['full_name'],
+            'age': record['age'],
+            'category': record['investor_category'],
+            'portfolio_value': record['portfolio_value'],
+            'avg_return': record['avg_return'],
+            'equity_drift': equity_drift_for(record),
             'current_allocation': {
-                'equity': round(current_equity, 1),
-                'bonds': round(current_bonds, 1)
+                'equity': round(record['current']['equity'], 1),
+                'bonds': round(record['current']['bond'], 1)
             },
             'target_allocation': {
-                'equity': user_data['target_equity'],
-                'bonds': user_data['target_bonds']
+                'equity': record['target']['equity'],
+                'bonds': record['target']['bond']
             }
         }
         
@@ -299,7 +486,7 @@ def get_user_scenarios(user_id):
         # Also get some general scenarios based on user type
         general_scenarios = scenario_generator.get_scenarios_for_user(
             user_id=user_id, 
-            user_type=user_data['category'], 
+            user_type=record['investor_category'], 
             limit=2
         )
         
@@ -319,78 +506,35 @@ def get_user_scenarios(user_id):
 def get_customers():
     """Get all customers with their portfolio profiles"""
     try:
-        conn = ai_system.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get customer data with portfolio summary
-        cursor.execute('''
-            SELECT DISTINCT 
-                ir.user_id,
-                ir.full_name,
-                ir.age,
-                ir.city,
-                ir.investor_category,
-                ir.asset_allocation_model,
-                ir.annual_income,
-                ir.risk_capacity,
-                ir.equities_percent as target_equity,
-                ir.bonds_percent as target_bonds,
-                COUNT(uh.fund_symbol) as total_holdings,
-                SUM(uh.current_value) as total_portfolio_value,
-                AVG(uh.return_percent) as avg_return
-            FROM investor_ref_data ir
-            LEFT JOIN user_holdings uh ON ir.user_id = uh.user_id
-            GROUP BY ir.user_id
-            ORDER BY ir.full_name
-        ''')
+        conn = get_db_connection()
         
+        # One snapshot row per customer instead of re-aggregating their holdings
         customers = []
-        for row in cursor.fetchall():
-            # Calculate current allocation
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN uh.asset_class = 'Equity' THEN uh.current_value ELSE 0 END) as equity_value,
-                    SUM(CASE WHEN uh.asset_class = 'Bond' THEN uh.current_value ELSE 0 END) as bond_value,
-                    SUM(CASE WHEN uh.asset_class = 'Alternative' THEN uh.current_value ELSE 0 END) as alt_value,
-                    SUM(uh.current_value) as total_value
-                FROM user_holdings uh
-                WHERE uh.user_id = ?
-            ''', (row['user_id'],))
-            
-            allocation = cursor.fetchone()
-            if allocation and allocation['total_value']:
-                current_equity = (allocation['equity_value'] or 0) / allocation['total_value'] * 100
-                current_bonds = (allocation['bond_value'] or 0) / allocation['total_value'] * 100
-                current_alt = (allocation['alt_value'] or 0) / allocation['total_value'] * 100
-            else:
-                current_equity = current_bonds = current_alt = 0
-            
-            # Calculate rebalancing need
-            equity_drift = abs(current_equity - (row['target_equity'] or 0))
-            rebalancing_priority = 'High' if equity_drift > 10 else 'Medium' if equity_drift > 5 else 'Low'
+        for record in compute_portfolio_drift(conn):
+            equity_drift = equity_drift_for(record)
             
             customers.append({
-                'user_id': row['user_id'],
-                'name': row['full_name'],
-                'age': row['age'],
-                'city': row['city'],
-                'category': row['investor_category'],
-                'model': row['asset_allocation_model'],
-                'income': row['annual_income'],
-                'risk_capacity': row['risk_capacity'],
-                'portfolio_value': row['total_portfolio_value'] or 0,
-                'holdings_count': row['total_holdings'] or 0,
-                'avg_return': row['avg_return'] or 0,
+                'user_id': record['user_id'],
+                'name': record['full_name'],
+                'age': record['age'],
+                'city': record['city'],
+                'category': record['investor_category'],
+                'model': record['asset_allocation_model'],
+                'income': record['annual_income'],
+                'risk_capacity': record['risk_capacity'],
+                'portfolio_value': record['portfolio_value'],
+                'holdings_count': record['holdings_count'],
+                'avg_return': record['avg_return'],
                 'target_allocation': {
-                    'equity': row['target_equity'],
-                    'bonds': row['target_bonds']
+                    'equity': record['target']['equity'],
+                    'bonds': record['target']['bond']
                 },
                 'current_allocation': {
-                    'equity': round(current_equity, 1),
-                    'bonds': round(current_bonds, 1),
-                    'alternatives': round(current_alt, 1)
+                    'equity': round(record['current']['equity'], 1),
+                    'bonds': round(record['current']['bond'], 1),
+                    'alternatives': round(record['current']['alt'], 1)
                 },
-                'rebalancing_priority': rebalancing_priority,
+                'rebalancing_priority': get_rebalancing_priority(equity_drift),
                 'equity_drift': round(equity_drift, 1)
             })
         
@@ -1,10 +1,43 @@
-from flask import Flask, jsonify, render_template, send_from_directory, request
+from flask import Flask, Response, jsonify, render_template, request
 from flask_cors import CORS
-import sqlite3
-import os
+from datetime import date
+from db import get_db_connection, get_pool
+from drift_engine import compute_portfolio_drift
+from migrations import apply_migrations
+from order_engine import apply_orders
+from portfolio_snapshot import refresh_portfolio_snapshots
+from scenario_engine import generate_scenarios
+from bulk_rebalance import get_bulk_queue, parse_bulk_request, select_users
+from rebalance_solver import solve_rebalancing
+from revaluation import revalue_holdings, DEFAULT_PRICE_SOURCES
+from table_query import open_table_query, investor_overview, is_paged_request, TABLE_SPECS
+from export_stream import stream_export, EXPORT_FORMATS
+from table_versions import versioned, get_version_cache
+from static_assets import send_asset, send_page
+from compression import compress_response, get_compression_stats
+from serializers import rows_response
+from agent_cache import get_portfolio_versions
+from holdings_index import get_holdings_index
+from price_ticks import apply_ticks, make_tick
 
 app = Flask(__name__, static_folder='../frontend/public', template_folder='../frontend/src')
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['X-Total-Count'])  # Enable CORS for all routes
+
+# Bring the database schema up to date (tables, hot path indexes) before serving requests
+with get_pool().connection() as conn:
+    apply_migrations(conn)
+
+@app.after_request
+def invalidate_table_versions(response):
+    """Writes go through non-GET routes; make the next conditional GET see their new table versions"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        get_version_cache().invalidate()
+    return response
+
+@app.after_request
+def compress(response):
+    """gzip/brotli for large JSON and text responses, negotiated from Accept-Encoding"""
+    return compress_response(response)
 
 # Register AI agents blueprint
 try:
@@ -15,99 +48,45 @@ except ImportError as e:
     print(f"⚠️ AI Agents system not available: {e}")
     # Continue without AI features
 
-def get_db_connection():
-    """Get database connection"""
-    # Determine the correct path to database
-    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    db_path = os.path.join(base_path, 'database', 'portfolio_management.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-    return conn
-
 @app.route('/')
 def index():
     """Serve the main HTML page"""
-    return send_from_directory('../frontend/src', 'index.html')
+    return send_page('index.html')
 
 @app.route('/ai-assistant.html')
 def ai_assistant():
     """Serve the AI Assistant page"""
-    return send_from_directory('../frontend/src', 'ai-assistant.html')
+    return send_page('ai-assistant.html')
 
 @app.route('/styles/<path:filename>')
 def styles(filename):
-    """Serve CSS files with cache busting"""
-    response = send_from_directory('../frontend/src/styles', filename)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    """Serve CSS files (hashed build names are cached immutably)"""
+    return send_asset('styles', filename)
 
 @app.route('/api/ai-rebalancing')
 def get_ai_rebalancing_data():
     """Get AI rebalancing data for the main portal tab"""
     try:
-        # Get customers with their rebalancing priorities
+        # Get customers with their rebalancing priorities in a single aggregate pass
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT DISTINCT 
-                ir.user_id,
-                ir.full_name,
-                ir.age,
-                ir.city,
-                ir.investor_category,
-                ir.annual_income,
-                ir.risk_capacity,
-                ir.equities_percent as target_equity,
-                ir.bonds_percent as target_bonds,
-                COUNT(uh.fund_symbol) as total_holdings,
-                SUM(uh.current_value) as total_portfolio_value,
-                AVG(uh.return_percent) as avg_return
-            FROM investor_ref_data ir
-            LEFT JOIN user_holdings uh ON ir.user_id = uh.user_id
-            GROUP BY ir.user_id
-            ORDER BY ir.full_name
-        ''')
         
         customers = []
-        for row in cursor.fetchall():
-            # Calculate current allocation
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN uh.asset_class = 'Equity' THEN uh.current_value ELSE 0 END) as equity_value,
-                    SUM(CASE WHEN uh.asset_class = 'Bond' THEN uh.current_value ELSE 0 END) as bond_value,
-                    SUM(uh.current_value) as total_value
-                FROM user_holdings uh
-                WHERE uh.user_id = ?
-            ''', (row[0],))
-            
-            allocation = cursor.fetchone()
-            if allocation and allocation[2]:
-                current_equity = (allocation[0] or 0) / allocation[2] * 100
-                equity_drift = abs(current_equity - (row[7] or 0))
-            else:
-                current_equity = 0
-                equity_drift = 0
-            
-            rebalancing_priority = 'High' if equity_drift > 10 else 'Medium' if equity_drift > 5 else 'Low'
-            
+        for record in compute_portfolio_drift(conn):
             customers.append({
-                'user_id': row[0],
-                'full_name': row[1],
-                'age': row[2],
-                'city': row[3],
-                'investor_category': row[4],
-                'annual_income': row[5],
-                'risk_capacity': row[6],
-                'portfolio_value': row[10] or 0,
-                'holdings_count': row[9] or 0,
-                'avg_return': row[11] or 0,
-                'equity_drift': round(equity_drift, 1),
-                'rebalancing_priority': rebalancing_priority,
-                'current_equity': round(current_equity, 1),
-                'target_equity': row[7]
+                'user_id': record['user_id'],
+                'full_name': record['full_name'],
+                'age': record['age'],
+                'city': record['city'],
+                'investor_category': record['investor_category'],
+                'annual_income': record['annual_income'],
+                'risk_capacity': record['risk_capacity'],
+                'portfolio_value': record['portfolio_value'],
+                'holdings_count': record['holdings_count'],
+                'avg_return': record['avg_return'],
+                'equity_drift': round(record['drift']['equity'], 1),
+                'rebalancing_priority': record['rebalancing_priority'],
+                'current_equity': round(record['current']['equity'], 1),
+                'target_equity': record['target']['equity']
             })
         
         conn.close()
@@ -133,145 +112,119 @@ def get_ai_rebalancing_data():
 
 @app.route('/components/<path:filename>')
 def components(filename):
-    """Serve JavaScript files with cache busting"""
-    try:
-        response = send_from_directory('../frontend/src/components', filename)
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
-    except FileNotFoundError:
-        # Try serving from src directory for AI assistant files
-        try:
-            response = send_from_directory('../frontend/src', filename)
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            return response
-        except FileNotFoundError:
-            return "File not found", 404
+    """Serve JavaScript files (hashed build names are cached immutably)"""
+    return send_asset('components', filename)
 
-@app.route('/api/investor-data')
-def get_investor_data():
-    """Get all investor reference data with portfolio values"""
+def table_api_response(table):
+    """Serve a table API: the whole table, or one keyset page with ?limit=&after=.
+
+    ?sort=, ?order=, ?q= and column filters apply either way; the number of matching rows
+    is sent in the X-Total-Count header.
+    """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        # Join investor_ref_data with portfolios_cur_allocation to get complete data
-        cursor.execute('''
-            SELECT 
-                i.user_id, i.full_name, i.age, i.city, i.risk_capacity, i.spending_score,
-                i.annual_income, i.investor_category, i.asset_allocation_model,
-                i.equities_percent, i.bonds_percent, i.cash_percent, i.alternatives_percent,
-                i.investment_preference_sectors, i.rebalancing_frequency, 
-                i.last_rebalancing_date, i.variation_limit,
-                COALESCE(p.total_investment_amount, 0) as total_portfolio_value,
-                COALESCE(p.equities_percent, i.equities_percent) as current_equities_percent,
-                COALESCE(p.bonds_percent, i.bonds_percent) as current_bonds_percent,
-                COALESCE(p.cash_percent, i.cash_percent) as current_cash_percent,
-                COALESCE(p.alternatives_percent, i.alternatives_percent) as current_alternatives_percent
-            FROM investor_ref_data i
-            LEFT JOIN portfolios_cur_allocation p ON i.user_id = p.user_id
-            ORDER BY i.user_id
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Convert rows to list of dictionaries
-        data = []
-        for row in rows:
-            data.append(dict(row))
-        
+        try:
+            result = open_table_query(conn, table, request.args)
+            extra = {}
+            if is_paged_request(request.args):
+                extra = {'total': result['total'], 'next_cursor': result['next_cursor']}
+            # Rows are encoded straight from the cursor, without a dict per row for the whole table
+            response = rows_response(result['columns'], result['rows'], extra)
+        finally:
+            conn.close()
+        
+        response.headers['X-Total-Count'] = str(result['total'])
+        return response
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': data,
-            'count': len(data)
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-@app.route('/api/portfolio-allocation')
-def get_portfolio_allocation():
-    """Get all portfolio allocation data"""
+@app.route('/api/investor-data')
+@versioned('investor_ref_data', 'portfolios_cur_allocation')
+def get_investor_data():
+    """Get investor reference data with portfolio values"""
+    return table_api_response('investor-data')
+
+@app.route('/api/investor-data/summary')
+@versioned('investor_ref_data', 'portfolios_cur_allocation')
+def get_investor_data_summary():
+    """Client-base aggregates for the investor data view, over every matching investor rather than one page"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM portfolios_cur_allocation ORDER BY user_id')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Convert rows to list of dictionaries
-        data = []
-        for row in rows:
-            data.append(dict(row))
+        try:
+            overview = investor_overview(conn, request.args)
+        finally:
+            conn.close()
         
         return jsonify({
             'success': True,
-            'data': data,
-            'count': len(data)
+            'summary': overview
         })
-    except Exception as e:
+    except ValueError as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
-
-@app.route('/api/product-market-data')
-def get_product_market_data():
-    """Get all product market data"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT investment_type,industry_sector,market_segment,investment_strategies,investment_product,symbol,market_price_usd FROM product_market_data ORDER BY investment_type')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Convert rows to list of dictionaries
-        data = []
-        for row in rows:
-            data.append(dict(row))
-        
-        return jsonify({
-            'success': True,
-            'data': data,
-            'count': len(data)
-        })
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/portfolio-allocation')
+@versioned('portfolios_cur_allocation')
+def get_portfolio_allocation():
+    """Get portfolio allocation data"""
+    return table_api_response('portfolio-allocation')
+
+@app.route('/api/product-market-data')
+@versioned('product_market_data')
+def get_product_market_data():
+    """Get product market data"""
+    return table_api_response('product-market-data')
+
 @app.route('/api/master-allocation-model')
+@versioned('MasterAllocationModel')
 def get_master_allocation_model():
-    """Get all master allocation model data"""
+    """Get master allocation model data"""
+    return table_api_response('master-allocation-model')
+
+@app.route('/api/export/<table>')
+def export_table(table):
+    """Stream a table extract as CSV or NDJSON (?format=), with the table API's sort, search and filters"""
+    if table not in TABLE_SPECS:
+        return jsonify({'success': False, 'error': f'Unknown export: {table}'}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM MasterAllocationModel ORDER BY category, model_no')
-        rows = cursor.fetchall()
+        chunks = stream_export(conn, table, request.args, export_format)
+    except ValueError as e:
         conn.close()
-        
-        # Convert rows to list of dictionaries
-        data = []
-        for row in rows:
-            data.append(dict(row))
-        
         return jsonify({
-            'success': True,
-            'data': data,
-            'count': len(data)
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
+        conn.close()
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': f'Error exporting {table}: {str(e)}'
         }), 500
+    
+    filename = f'{table}-{date.today().isoformat()}.{export_format}'
+    return Response(chunks, mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 @app.route('/api/stats')
+@versioned('investor_ref_data', 'portfolios_cur_allocation', 'product_market_data', 'MasterAllocationModel')
 def get_stats():
     """Get database statistics"""
     try:
@@ -309,6 +262,7 @@ def get_stats():
         }), 500
 
 @app.route('/api/user/<user_id>')
+@versioned('portfolios_cur_allocation', 'investor_ref_data', 'MasterAllocationModel')
 def get_user_details(user_id):
     """Get detailed user data for dashboard"""
     try:
@@ -387,6 +341,7 @@ def get_user_details(user_id):
         }), 500
 
 @app.route('/api/user/<user_id>/holdings')
+@versioned('user_holdings', 'funds_universe')
 def get_user_holdings(user_id):
     """Get user's current holdings"""
     try:
@@ -444,6 +399,7 @@ def get_rebalancing_options(user_id, asset_class):
             SELECT uh.*, fu.* FROM user_holdings uh
             JOIN funds_universe fu ON uh.fund_symbol = fu.fund_symbol
             WHERE uh.user_id = ? AND fu.asset_class = ?
+            ORDER BY uh.id
         ''', (user_id, asset_class))
         current_holdings = cursor.fetchall()
         
@@ -451,7 +407,7 @@ def get_rebalancing_options(user_id, asset_class):
         cursor.execute('''
             SELECT * FROM funds_universe 
             WHERE asset_class = ? AND performance_rating IN ('Excellent', 'Good') 
-            ORDER BY returns_1year DESC, performance_rating DESC
+            ORDER BY returns_1year DESC, performance_rating DESC, id
             LIMIT 10
         ''', (asset_class,))
         buy_options = cursor.fetchall()
@@ -572,122 +528,17 @@ def execute_custom_rebalancing():
         if not user_id:
             return jsonify({'success': False, 'error': 'User ID is required'}), 400
         
+        # Load, update in memory and write back all orders in one transaction
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        total_sell_amount = 0
-        total_buy_amount = 0
-        
-        # Execute sell orders
-        for sell_order in selected_sells:
-            fund_symbol = sell_order['fund_symbol']
-            sell_amount = sell_order['amount']
-            
-            # Update user holdings
-            cursor.execute('''
-                SELECT * FROM user_holdings 
-                WHERE user_id = ? AND fund_symbol = ?
-            ''', (user_id, fund_symbol))
-            
-            holding = cursor.fetchone()
-            if holding:
-                new_value = max(0, holding['current_value'] - sell_amount)
-                new_units = new_value / holding['current_price'] if holding['current_price'] > 0 else 0
-                new_invested = holding['invested_amount'] * (new_value / holding['current_value']) if holding['current_value'] > 0 else 0
-                
-                if new_value > 0:
-                    cursor.execute('''
-                        UPDATE user_holdings 
-                        SET current_value = ?, units_held = ?, invested_amount = ?
-                        WHERE user_id = ? AND fund_symbol = ?
-                    ''', (new_value, new_units, new_invested, user_id, fund_symbol))
-                else:
-                    cursor.execute('''
-                        DELETE FROM user_holdings 
-                        WHERE user_id = ? AND fund_symbol = ?
-                    ''', (user_id, fund_symbol))
-                
-                total_sell_amount += sell_amount
-        
-        # Execute buy orders
-        for buy_order in selected_buys:
-            fund_symbol = buy_order['fund_symbol']
-            buy_amount = buy_order['amount']
-            
-            # Check if user already has this fund
-            cursor.execute('''
-                SELECT * FROM user_holdings 
-                WHERE user_id = ? AND fund_symbol = ?
-            ''', (user_id, fund_symbol))
-            
-            existing = cursor.fetchone()
-            
-            # Get fund info
-            cursor.execute('''
-                SELECT * FROM funds_universe WHERE fund_symbol = ?
-            ''', (fund_symbol,))
-            fund_info = cursor.fetchone()
-            
-            if fund_info:
-                new_units = buy_amount / fund_info['current_price']
-                
-                if existing:
-                    # Update existing holding
-                    new_total_value = existing['current_value'] + buy_amount
-                    new_total_units = existing['units_held'] + new_units
-                    new_invested = existing['invested_amount'] + buy_amount
-                    
-                    cursor.execute('''
-                        UPDATE user_holdings 
-                        SET current_value = ?, units_held = ?, invested_amount = ?
-                        WHERE user_id = ? AND fund_symbol = ?
-                    ''', (new_total_value, new_total_units, new_invested, user_id, fund_symbol))
-                else:
-                    # Create new holding
-                    cursor.execute('''
-                        INSERT INTO user_holdings 
-                        (user_id, fund_symbol, fund_name, asset_class, units_held, current_price, 
-                         invested_amount, current_value, return_percent, performance_rating, risk_rating, expense_ratio)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
-                    ''', (user_id, fund_symbol, fund_info['fund_name'], fund_info['asset_class'], 
-                         new_units, fund_info['current_price'], buy_amount, buy_amount,
-                         fund_info['performance_rating'], fund_info['risk_rating'], fund_info['expense_ratio']))
-                
-                total_buy_amount += buy_amount
-        
-        # Log the custom rebalancing action
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS custom_rebalancing_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                execution_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                total_sell_amount REAL,
-                total_buy_amount REAL,
-                num_sells INTEGER,
-                num_buys INTEGER,
-                status TEXT DEFAULT 'completed'
-            )
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO custom_rebalancing_log 
-            (user_id, total_sell_amount, total_buy_amount, num_sells, num_buys)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, total_sell_amount, total_buy_amount, len(selected_sells), len(selected_buys)))
-        
-        conn.commit()
+        summary = apply_orders(conn, user_id, selected_sells, selected_buys)
         conn.close()
+        get_portfolio_versions().bump([user_id])
+        get_holdings_index().refresh_users([user_id])
         
         return jsonify({
             'success': True,
             'message': 'Custom rebalancing executed successfully',
-            'summary': {
-                'total_sell_amount': total_sell_amount,
-                'total_buy_amount': total_buy_amount,
-                'net_change': total_buy_amount - total_sell_amount,
-                'num_sells': len(selected_sells),
-                'num_buys': len(selected_buys)
-            }
+            'summary': summary
         })
         
     except Exception as e:
@@ -714,208 +565,11 @@ def get_rebalancing_scenarios(user_id, asset_class):
         if not user_data:
             return jsonify({'success': False, 'error': 'User not found'})
         
-        # Get user's current holdings for the asset class
-        cursor.execute('''
-            SELECT uh.*, fu.* FROM user_holdings uh
-            JOIN funds_universe fu ON uh.fund_symbol = fu.fund_symbol
-            WHERE uh.user_id = ? AND fu.asset_class = ?
-        ''', (user_id, asset_class))
-        current_holdings = cursor.fetchall()
-        
-        # Get recommended funds for buying (top performers in the asset class)
-        cursor.execute('''
-            SELECT * FROM funds_universe 
-            WHERE asset_class = ? AND performance_rating IN ('Excellent', 'Good') 
-            ORDER BY returns_1year DESC, performance_rating DESC
-            LIMIT 8
-        ''', (asset_class,))
-        recommended_funds = cursor.fetchall()
+        # Build the conservative, moderate and aggressive scenarios in one array pass
+        scenarios = generate_scenarios(conn, [user_id], asset_class)[user_id]
         
         conn.close()
         
-        # Generate 3 detailed rebalancing scenarios
-        scenarios = []
-        
-        # Scenario 1: Conservative Rebalancing
-        conservative_actions = []
-        # Sell underperforming holdings
-        for holding in current_holdings:
-            if holding['performance_rating'] in ['Poor', 'Below Average'] and holding['current_value'] > 1000:
-                conservative_actions.append({
-                    'type': 'sell',
-                    'fund_name': holding['fund_name'],
-                    'fund_symbol': holding['fund_symbol'],
-                    'amount': min(holding['current_value'] * 0.3, 3000),  # Sell 30% or max $3000
-                    'reason': f'Underperforming with {holding["return_percent"]:.1f}% return',
-                    'current_performance': holding['return_percent'],
-                    'units': holding['units_held'] * 0.3
-                })
-        
-        # Ensure minimum sell actions by including average performers if needed
-        if len(conservative_actions) < 2:
-            for holding in current_holdings:
-                if holding['performance_rating'] == 'Average' and holding['current_value'] > 1500:
-                    conservative_actions.append({
-                        'type': 'sell',
-                        'fund_name': holding['fund_name'],
-                        'fund_symbol': holding['fund_symbol'],
-                        'amount': min(holding['current_value'] * 0.2, 2000),
-                        'reason': f'Rebalancing average performer ({holding["return_percent"]:.1f}% return)',
-                        'current_performance': holding['return_percent'],
-                        'units': holding['units_held'] * 0.2
-                    })
-                    if len(conservative_actions) >= 3:
-                        break
-        
-        # Buy recommended funds
-        if recommended_funds:
-            total_sell_amount = sum(action['amount'] for action in conservative_actions if action['type'] == 'sell')
-            if total_sell_amount < 1000:  # Ensure minimum buying power
-                total_sell_amount = 2000
-                
-            for i, fund in enumerate(recommended_funds[:3]):  # Buy top 3 recommended
-                buy_amount = total_sell_amount / 3 if i < 3 else 0
-                if buy_amount > 300:  # Lower minimum buy amount
-                    conservative_actions.append({
-                        'type': 'buy',
-                        'fund_name': fund['fund_name'],
-                        'fund_symbol': fund['fund_symbol'],
-                        'amount': buy_amount,
-                        'reason': f'Strong performer: {fund["returns_1year"]:.1f}% annual return',
-                        'current_performance': fund['returns_1year'],
-                        'expected_units': buy_amount / fund['current_price']
-                    })
-        
-        scenarios.append({
-            'id': 1,
-            'name': 'Conservative Rebalancing',
-            'description': 'Gradual rebalancing with minimal risk, focusing on reducing underperforming assets',
-            'risk_level': 'Low',
-            'expected_return': '+2.5% annually',
-            'timeframe': '6-12 months',
-            'cost': '$25-40',
-            'actions': conservative_actions,
-            'allocation_change': {
-                'equity_change': 0 if asset_class != 'equities' else 2,
-                'bond_change': 0 if asset_class != 'bonds' else 1,
-                'cash_change': 0 if asset_class != 'cash' else -3
-            }
-        })
-        
-        # Scenario 2: Moderate Rebalancing
-        moderate_actions = []
-        # More aggressive selling of poor performers
-        for holding in current_holdings:
-            if holding['performance_rating'] in ['Poor', 'Below Average'] and holding['current_value'] > 800:
-                moderate_actions.append({
-                    'type': 'sell',
-                    'fund_name': holding['fund_name'],
-                    'fund_symbol': holding['fund_symbol'],
-                    'amount': min(holding['current_value'] * 0.6, 5000),  # Sell 60% or max $5000
-                    'reason': f'Poor performance ({holding["return_percent"]:.1f}%), better opportunities available',
-                    'current_performance': holding['return_percent'],
-                    'units': holding['units_held'] * 0.6
-                })
-        
-        # Include some average performers for more comprehensive rebalancing
-        for holding in current_holdings:
-            if holding['performance_rating'] == 'Average' and holding['current_value'] > 2000 and len(moderate_actions) < 5:
-                moderate_actions.append({
-                    'type': 'sell',
-                    'fund_name': holding['fund_name'],
-                    'fund_symbol': holding['fund_symbol'],
-                    'amount': min(holding['current_value'] * 0.4, 3000),
-                    'reason': f'Reallocating from average performer to optimize returns',
-                    'current_performance': holding['return_percent'],
-                    'units': holding['units_held'] * 0.4
-                })
-        
-        # Buy more recommended funds
-        if recommended_funds:
-            total_sell_amount = sum(action['amount'] for action in moderate_actions if action['type'] == 'sell')
-            if total_sell_amount < 1500:  # Ensure minimum buying power
-                total_sell_amount = 3000
-                
-            for i, fund in enumerate(recommended_funds[:4]):  # Buy top 4 recommended
-                buy_amount = total_sell_amount / 4 if i < 4 else 0
-                if buy_amount > 400:
-                    moderate_actions.append({
-                        'type': 'buy',
-                        'fund_name': fund['fund_name'],
-                        'fund_symbol': fund['fund_symbol'],
-                        'amount': buy_amount,
-                        'reason': f'Excellent growth potential: {fund["returns_1year"]:.1f}% return, {fund["performance_rating"]} rated',
-                        'current_performance': fund['returns_1year'],
-                        'expected_units': buy_amount / fund['current_price']
-                    })
-        
-        scenarios.append({
-            'id': 2,
-            'name': 'Moderate Rebalancing',
-            'description': 'Balanced approach with strategic reallocation to optimize performance',
-            'risk_level': 'Medium',
-            'expected_return': '+4.2% annually',
-            'timeframe': '3-6 months',
-            'cost': '$40-65',
-            'actions': moderate_actions,
-            'allocation_change': {
-                'equity_change': 0 if asset_class != 'equities' else 3,
-                'bond_change': 0 if asset_class != 'bonds' else 2,
-                'cash_change': 0 if asset_class != 'cash' else -5
-            }
-        })
-        
-        # Scenario 3: Aggressive Rebalancing
-        aggressive_actions = []
-        # Sell most underperforming and average holdings
-        for holding in current_holdings:
-            if holding['performance_rating'] in ['Poor', 'Below Average', 'Average'] and holding['current_value'] > 500:
-                sell_percentage = 0.8 if holding['performance_rating'] in ['Poor', 'Below Average'] else 0.5
-                aggressive_actions.append({
-                    'type': 'sell',
-                    'fund_name': holding['fund_name'],
-                    'fund_symbol': holding['fund_symbol'],
-                    'amount': min(holding['current_value'] * sell_percentage, 8000),  # Sell 50-80% or max $8000
-                    'reason': f'Maximizing portfolio optimization ({holding["return_percent"]:.1f}% → targeting 15%+ returns)',
-                    'current_performance': holding['return_percent'],
-                    'units': holding['units_held'] * sell_percentage
-                })
-        
-        # Buy top recommended funds
-        if recommended_funds:
-            total_sell_amount = sum(action['amount'] for action in aggressive_actions if action['type'] == 'sell')
-            if total_sell_amount < 2000:  # Ensure substantial buying power for aggressive strategy
-                total_sell_amount = 5000
-                
-            for i, fund in enumerate(recommended_funds[:5]):  # Buy top 5 recommended
-                buy_amount = total_sell_amount / 5 if i < 5 else 0
-                if buy_amount > 500:  # Reasonable minimum for aggressive strategy
-                    aggressive_actions.append({
-                        'type': 'buy',
-                        'fund_name': fund['fund_name'],
-                        'fund_symbol': fund['fund_symbol'],
-                        'amount': buy_amount,
-                        'reason': f'Top-tier opportunity: {fund["returns_1year"]:.1f}% annual returns, {fund["performance_rating"]} rating',
-                        'current_performance': fund['returns_1year'],
-                        'expected_units': buy_amount / fund['current_price']
-                    })
-        
-        scenarios.append({
-            'id': 3,
-            'name': 'Aggressive Rebalancing',
-            'description': 'Maximum optimization for growth, substantial portfolio restructuring',
-            'risk_level': 'High',
-            'expected_return': '+6.8% annually',
-            'timeframe': '1-3 months',
-            'cost': '$65-100',
-            'actions': aggressive_actions,
-            'allocation_change': {
-                'equity_change': 0 if asset_class != 'equities' else 5,
-                'bond_change': 0 if asset_class != 'bonds' else 3,
-                'cash_change': 0 if asset_class != 'cash' else -8
-            }
-        })
-        
         return jsonify({
             'success': True,
             'scenarios': scenarios,
@@ -994,6 +648,8 @@ def execute_rebalancing():
                         WHERE f.fund_symbol = ?
                     ''', (user_id, action['units'], action['amount'], action['amount'], action['fund_symbol']))
         
+        refresh_portfolio_snapshots(cursor, [user_id])
+        
         # Log the rebalancing action
         cursor.execute('''
             INSERT INTO rebalancing_scenarios 
@@ -1004,6 +660,8 @@ def execute_rebalancing():
         
         conn.commit()
         conn.close()
+        get_portfolio_versions().bump([user_id])
+        get_holdings_index().refresh_users([user_id])
         
         return jsonify({
             'success': True,
@@ -1016,6 +674,188 @@ def execute_rebalancing():
             'error': str(e)
         }), 500
 
+@app.route('/api/rebalance/bulk', methods=['POST'])
+def submit_bulk_rebalancing():
+    """Queue a rebalancing job for many portfolios (by user_ids, filter or explicit orders)"""
+    try:
+        bulk = parse_bulk_request(request.get_json(silent=True) or {})
+        user_ids, filters = bulk['user_ids'], bulk['filter']
+        
+        if user_ids is None and filters is None and not bulk['orders']:
+            return jsonify({'success': False, 'error': 'Provide user_ids, filter or portfolios'}), 400
+        
+        # Explicit orders per user; everyone else is rebalanced by the chosen strategy
+        orders = bulk['orders']
+        
+        selected = []
+        if user_ids is not None or filters is not None:
+            conn = get_db_connection()
+            selected = select_users(conn, user_ids, filters)
+            conn.close()
+        already_selected = set(selected)
+        selected += [user_id for user_id in orders if user_id not in already_selected]
+        
+        job = get_bulk_queue().submit(selected, orders, bulk['batch_size'], bulk['strategy'])
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error queuing bulk rebalancing: {str(e)}'
+        }), 500
+
+@app.route('/api/rebalance/bulk')
+def list_bulk_rebalancing_jobs():
+    """Status of recent bulk rebalancing jobs"""
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in get_bulk_queue().jobs()]
+    })
+
+@app.route('/api/rebalance/bulk/<job_id>')
+def get_bulk_rebalancing_job(job_id):
+    """Progress of a bulk rebalancing job (?results=1 adds the per-user outcomes)"""
+    job = get_bulk_queue().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(include_results=request.args.get('results') == '1')
+    })
+
+@app.route('/api/rebalance/optimal/<user_id>')
+@versioned('investor_ref_data', 'user_holdings', 'funds_universe', 'MasterAllocationModel')
+def get_optimal_rebalancing(user_id):
+    """Minimum-turnover trades that bring every asset class within the investor's variation_limit"""
+    try:
+        conn = get_db_connection()
+        plans = solve_rebalancing(conn, [user_id])
+        conn.close()
+        
+        if user_id not in plans:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'plan': plans[user_id]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error solving rebalancing: {str(e)}'
+        }), 500
+
+@app.route('/api/rebalance/optimal', methods=['POST'])
+def solve_optimal_rebalancing():
+    """Minimum-turnover plans for many portfolios (user_ids, filter, or the whole book when neither is given)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        user_ids = data.get('user_ids')
+        filters = data.get('filter')
+        
+        conn = get_db_connection()
+        if filters is not None:
+            user_ids = select_users(conn, user_ids, filters)
+        plans = solve_rebalancing(conn, user_ids)
+        conn.close()
+        
+        plans = list(plans.values())
+        if data.get('needs_trades'):
+            plans = [plan for plan in plans if plan['sells'] or plan['buys']]
+        
+        return jsonify({
+            'success': True,
+            'plans': plans,
+            'count': len(plans),
+            'total_turnover': round(sum(plan['turnover'] for plan in plans), 2)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error solving rebalancing: {str(e)}'
+        }), 500
+
+@app.route('/api/holdings/revalue', methods=['POST'])
+def revalue_all_holdings():
+    """Mark every holding to its latest fund price (body: optional sources list, dry_run)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        conn = get_db_connection()
+        result = revalue_holdings(conn, data.get('sources', DEFAULT_PRICE_SOURCES), bool(data.get('dry_run')))
+        conn.close()
+        
+        user_ids = result.pop('user_ids')
+        if not result['dry_run']:
+            get_portfolio_versions().bump(user_ids)
+        
+        return jsonify({
+            'success': True,
+            'revaluation': result
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error revaluing holdings: {str(e)}'
+        }), 500
+
+@app.route('/api/prices/ticks', methods=['POST'])
+def ingest_price_ticks():
+    """Apply a micro-batch of price ticks: {"ticks": [{"symbol": ..., "price": ...}, ...]}"""
+    try:
+        data = request.get_json(silent=True) or {}
+        ticks = [make_tick(tick.get('symbol'), tick.get('price')) for tick in data.get('ticks', [])]
+        if not ticks:
+            return jsonify({'success': False, 'error': 'Provide ticks as [{"symbol": ..., "price": ...}]'}), 400
+        
+        conn = get_db_connection()
+        result = apply_ticks(conn, ticks)
+        conn.close()
+        
+        user_ids = result.pop('user_ids')
+        get_portfolio_versions().bump(user_ids)
+        
+        return jsonify({
+            'success': True,
+            'applied': result
+        })
+        
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error applying price ticks: {str(e)}'
+        }), 500
+
+@app.route('/api/metrics/holdings-index')
+def get_holdings_index_metrics():
+    """Size and age of the fund symbol -> holdings reverse index"""
+    return jsonify({
+        'success': True,
+        'holdings_index': get_holdings_index().stats()
+    })
+
+@app.route('/api/metrics/compression')
+def get_compression_metrics():
+    """Responses compressed and bytes saved since the server started"""
+    return jsonify({
+        'success': True,
+        'compression': get_compression_stats().to_dict()
+    })
+
 # ===== AI BEHAVIORAL FINANCE COACH API ENDPOINTS =====
 
 @app.route('/api/behavioral-coach/analyze', methods=['POST'])
@@ -1177,6 +1017,7 @@ def execute_behavioral_rebalancing():
         
         conn.commit()
         conn.close()
+        get_portfolio_versions().bump([user_id])
         
         return jsonify({
             'success': True,
@@ -0,0 +1,385 @@
+"""
+Bulk Rebalancing Jobs
+Rebalances many portfolios per request: users are selected by id or by filter, queued as a
+job on a local worker pool and processed in parallel batches with the same order engine
+the single-user routes use
+"""
+
+import datetime
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from agent_cache import get_portfolio_versions
+from db import get_db_connection
+from holdings_index import get_holdings_index
+from order_engine import apply_orders
+from rebalance_solver import MIN_TRADE_AMOUNT, TARGET_COLUMNS, load_best_funds, solve_rebalancing
+from table_versions import get_version_cache
+
+DEFAULT_WORKERS = 4        # leaves half of the connection pool for the web routes
+DEFAULT_BATCH_SIZE = 200   # portfolios loaded per query / handled per worker task
+MAX_BATCH_SIZE = 5000
+MAX_FINISHED_JOBS = 100    # finished jobs kept for status polling...
+FINISHED_JOB_TTL_SECONDS = 3600  # ...for at most this long
+MAX_REPORTED_ERRORS = 50
+MAX_REPORTED_RESULTS = 1000  # per-user outcomes kept per job; the counters cover everyone
+
+FILTER_KEYS = ('rebalancing_frequency', 'investor_category', 'due')
+
+# How users without explicit orders are rebalanced: all the way back to target, or the
+# fewest trades that bring every asset class inside its variation_limit band
+STRATEGIES = ('target', 'min_turnover')
+
+# Days between rebalances for each investor_ref_data.rebalancing_frequency
+REBALANCING_INTERVAL_DAYS = {
+    'Monthly': 30,
+    'Quarterly': 91,
+    'Semi-Annual': 182,
+    'Annual': 365
+}
+
+BATCH_POSITIONS_QUERY = '''
+    SELECT
+        ir.user_id,
+        ir.equities_percent,
+        ir.bonds_percent,
+        ir.cash_percent,
+        ir.alternatives_percent,
+        h.fund_symbol,
+        h.asset_class,
+        h.current_value
+    FROM (SELECT DISTINCT value FROM json_each(?)) u
+    JOIN investor_ref_data ir ON ir.user_id = u.value
+    LEFT JOIN user_holdings h ON h.user_id = ir.user_id
+    ORDER BY h.id
+'''
+
+
+@dataclass
+class BulkRebalanceJob:
+    job_id: str
+    user_ids: List[str]
+    # Explicit orders per user ({'selected_sells': [...], 'selected_buys': [...]});
+    # users without an entry are rebalanced back to their target allocation
+    orders: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    batch_size: int = DEFAULT_BATCH_SIZE
+    strategy: str = 'target'  # one of STRATEGIES
+    status: str = 'queued'  # 'queued', 'running', 'completed', 'failed'
+    processed: int = 0
+    succeeded: int = 0
+    skipped: int = 0
+    failed: int = 0
+    total_sell_amount: float = 0
+    total_buy_amount: float = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    results_omitted: int = 0
+    errors: List[Dict[str, str]] = field(default_factory=list)
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.now)
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    pending_batches: int = 0
+
+    def to_dict(self, include_results: bool = False) -> Dict[str, Any]:
+        """Status payload for the polling route"""
+        total = len(self.user_ids)
+        data = {
+            'job_id': self.job_id,
+            'status': self.status,
+            'strategy': self.strategy,
+            'total': total,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'progress_percent': round(self.processed / total * 100, 1) if total else 100.0,
+            'total_sell_amount': round(self.total_sell_amount, 2),
+            'total_buy_amount': round(self.total_buy_amount, 2),
+            'errors': self.errors,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_results:
+            data['results'] = self.results
+            data['results_omitted'] = self.results_omitted
+        return data
+
+
+def parse_bulk_request(data) -> Dict[str, Any]:
+    """Validated user_ids, filter, orders, batch_size and strategy of a bulk request body.
+
+    Raises ValueError describing the first malformed field.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+
+    user_ids = data.get('user_ids')
+    if user_ids is not None and not (isinstance(user_ids, list) and all(isinstance(u, str) for u in user_ids)):
+        raise ValueError('user_ids must be a list of user id strings')
+
+    filters = data.get('filter')
+    if filters is not None:
+        if not isinstance(filters, dict):
+            raise ValueError('filter must be an object')
+        unknown = [key for key in filters if key not in FILTER_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown filter {', '.join(unknown)}. Use: {', '.join(FILTER_KEYS)}")
+
+    portfolios = data.get('portfolios') or []
+    if not isinstance(portfolios, list):
+        raise ValueError('portfolios must be a list')
+    orders = {}
+    for position, portfolio in enumerate(portfolios):
+        if not isinstance(portfolio, dict) or not isinstance(portfolio.get('user_id'), str) or not portfolio['user_id']:
+            raise ValueError(f'portfolios[{position}] needs a user_id')
+        for key in ('selected_sells', 'selected_buys'):
+            if not isinstance(portfolio.get(key, []), list):
+                raise ValueError(f'portfolios[{position}].{key} must be a list of orders')
+        orders[portfolio['user_id']] = portfolio
+
+    batch_size = data.get('batch_size', DEFAULT_BATCH_SIZE)
+    if not isinstance(batch_size, int) or isinstance(batch_size, bool) or not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f'batch_size must be a whole number from 1 to {MAX_BATCH_SIZE}')
+
+    strategy = data.get('strategy', 'target')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+
+    return {'user_ids': user_ids, 'filter': filters, 'orders': orders,
+            'batch_size': batch_size, 'strategy': strategy}
+
+
+def select_users(conn, user_ids: Optional[List[str]] = None,
+                 filters: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Resolve a bulk request to investor ids.
+
+    filters may contain 'rebalancing_frequency', 'investor_category' and 'due' (only
+    investors whose last_rebalancing_date is at least one frequency interval ago).
+    """
+    filters = filters or {}
+    conditions = []
+    params = []
+
+    if user_ids is not None:
+        conditions.append('user_id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(list(user_ids)))
+    for column in ('rebalancing_frequency', 'investor_category'):
+        if filters.get(column):
+            conditions.append(f'{column} = ?')
+            params.append(filters[column])
+    if filters.get('due'):
+        interval_cases = ' '.join(f"WHEN '{name}' THEN {days}" for name, days in REBALANCING_INTERVAL_DAYS.items())
+        conditions.append(f'''
+            (last_rebalancing_date IS NULL OR
+             julianday('now') - julianday(last_rebalancing_date) >= CASE rebalancing_frequency {interval_cases} ELSE 0 END)
+        ''')
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT DISTINCT user_id FROM investor_ref_data {where} ORDER BY user_id', params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_buy_candidates(conn) -> Dict[str, str]:
+    """Highest buy-priority fund symbol in each asset class"""
+    return {asset_class: fund['fund_symbol'] for asset_class, fund in load_best_funds(conn).items()}
+
+
+def load_batch_positions(conn, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Targets and holdings for a batch of users in one query"""
+    portfolios = {}
+    cursor = conn.cursor()
+    cursor.execute(BATCH_POSITIONS_QUERY, (json.dumps(user_ids),))
+    for row in cursor.fetchall():
+        portfolio = portfolios.get(row['user_id'])
+        if portfolio is None:
+            portfolio = portfolios[row['user_id']] = {
+                'targets': {asset_class: row[column] or 0 for asset_class, column in TARGET_COLUMNS.items()},
+                'holdings': []
+            }
+        if row['fund_symbol'] is not None:
+            portfolio['holdings'].append((row['fund_symbol'], row['asset_class'], row['current_value']))
+    return portfolios
+
+
+def plan_target_orders(portfolio: Dict[str, Any], buy_candidates: Dict[str, str]):
+    """Sell/buy orders that bring each asset class back to its target weight.
+
+    Overweight classes are trimmed pro rata across their holdings; underweight classes
+    are topped up in the best-ranked fund for that class.
+    """
+    holdings = portfolio['holdings']
+    total_value = sum(value for _, _, value in holdings)
+    sells = []
+    buys = []
+    if total_value <= 0:
+        return sells, buys
+
+    class_values = {}
+    for _, asset_class, value in holdings:
+        class_values[asset_class] = class_values.get(asset_class, 0) + value
+
+    for asset_class, target_percent in portfolio['targets'].items():
+        class_value = class_values.get(asset_class, 0)
+        gap = target_percent / 100 * total_value - class_value
+
+        if gap < -MIN_TRADE_AMOUNT:
+            for fund_symbol, holding_class, value in holdings:
+                if holding_class == asset_class and value > 0:
+                    sells.append({'fund_symbol': fund_symbol, 'amount': round(-gap * value / class_value, 2)})
+        elif gap > MIN_TRADE_AMOUNT and asset_class in buy_candidates:
+            buys.append({'fund_symbol': buy_candidates[asset_class], 'amount': round(gap, 2)})
+
+    return sells, buys
+
+
+class BulkRebalanceQueue:
+    """Runs bulk rebalancing jobs on a bounded thread pool, one task per batch of users"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-rebalance')
+        self._jobs: 'OrderedDict[str, BulkRebalanceJob]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, user_ids: List[str], orders: Optional[Dict[str, Dict[str, Any]]] = None,
+               batch_size: int = DEFAULT_BATCH_SIZE, strategy: str = 'target') -> BulkRebalanceJob:
+        """Queue a job for the given users and return it immediately"""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+        job = BulkRebalanceJob(job_id=uuid.uuid4().hex, user_ids=list(user_ids),
+                               orders=orders or {}, batch_size=max(1, batch_size), strategy=strategy)
+        batches = [job.user_ids[i:i + job.batch_size] for i in range(0, len(job.user_ids), job.batch_size)]
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+            job.pending_batches = len(batches)
+            if not batches:
+                job.status = 'completed'
+                job.started_at = job.finished_at = datetime.datetime.now()
+
+        for batch in batches:
+            self._executor.submit(self._run_batch, job, batch)
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkRebalanceJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[BulkRebalanceJob]:
+        with self._lock:
+            self._prune()
+            return list(self._jobs.values())
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _prune(self):
+        """Forget finished jobs older than FINISHED_JOB_TTL_SECONDS, then the oldest beyond MAX_FINISHED_JOBS (lock held)"""
+        expired_before = datetime.datetime.now() - datetime.timedelta(seconds=FINISHED_JOB_TTL_SECONDS)
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for position, job_id in enumerate(finished):
+            if position < len(finished) - MAX_FINISHED_JOBS or self._jobs[job_id].finished_at < expired_before:
+                del self._jobs[job_id]
+
+    def _run_batch(self, job: BulkRebalanceJob, user_ids: List[str]):
+        """Plan and apply every portfolio in one batch; each portfolio commits on its own"""
+        with self._lock:
+            if job.status == 'queued':
+                job.status = 'running'
+                job.started_at = datetime.datetime.now()
+
+        outcomes = []
+        conn = None
+        try:
+            conn = get_db_connection(self.db_path)
+            auto_users = [user_id for user_id in user_ids if user_id not in job.orders]
+            portfolios = {}
+            buy_candidates = {}
+            if auto_users and job.strategy == 'min_turnover':
+                portfolios = solve_rebalancing(conn, auto_users)
+            elif auto_users:
+                portfolios = load_batch_positions(conn, auto_users)
+                buy_candidates = load_buy_candidates(conn)
+
+            for user_id in user_ids:
+                if user_id in job.orders:
+                    sells = job.orders[user_id].get('selected_sells', [])
+                    buys = job.orders[user_id].get('selected_buys', [])
+                elif user_id in portfolios and job.strategy == 'min_turnover':
+                    sells, buys = portfolios[user_id]['sells'], portfolios[user_id]['buys']
+                elif user_id in portfolios:
+                    sells, buys = plan_target_orders(portfolios[user_id], buy_candidates)
+                else:
+                    outcomes.append({'user_id': user_id, 'status': 'failed', 'error': 'User not found'})
+                    continue
+
+                if not sells and not buys:
+                    outcomes.append({'user_id': user_id, 'status': 'skipped', 'reason': 'No orders needed'})
+                    continue
+
+                try:
+                    summary = apply_orders(conn, user_id, sells, buys, mark_rebalanced=True)
+                    outcomes.append({'user_id': user_id, 'status': 'succeeded', 'summary': summary})
+                except Exception as e:
+                    outcomes.append({'user_id': user_id, 'status': 'failed', 'error': str(e)})
+        except Exception as e:
+            # The batch could not be loaded: everything not yet handled fails together
+            handled = {outcome['user_id'] for outcome in outcomes}
+            outcomes.extend({'user_id': user_id, 'status': 'failed', 'error': str(e)}
+                            for user_id in user_ids if user_id not in handled)
+        finally:
+            if conn is not None:
+                conn.close()
+
+        # The batch wrote holdings after the request that queued it returned
+        get_version_cache().invalidate()
+        succeeded = [outcome['user_id'] for outcome in outcomes if outcome['status'] == 'succeeded']
+        get_portfolio_versions().bump(succeeded)
+        if self.db_path is None:
+            get_holdings_index().refresh_users(succeeded)
+        self._record(job, outcomes)
+
+    def _record(self, job: BulkRebalanceJob, outcomes: List[Dict[str, Any]]):
+        """Fold a finished batch into the job's progress counters"""
+        with self._lock:
+            for outcome in outcomes:
+                job.processed += 1
+                if outcome['status'] == 'succeeded':
+                    job.succeeded += 1
+                    job.total_sell_amount += outcome['summary']['total_sell_amount']
+                    job.total_buy_amount += outcome['summary']['total_buy_amount']
+                elif outcome['status'] == 'skipped':
+                    job.skipped += 1
+                else:
+                    job.failed += 1
+                    if len(job.errors) < MAX_REPORTED_ERRORS:
+                        job.errors.append({'user_id': outcome['user_id'], 'error': outcome['error']})
+            kept = outcomes[:max(0, MAX_REPORTED_RESULTS - len(job.results))]
+            job.results.extend(kept)
+            job.results_omitted += len(outcomes) - len(kept)
+
+            job.pending_batches -= 1
+            if job.pending_batches == 0:
+                job.status = 'failed' if job.failed and not job.succeeded and not job.skipped else 'completed'
+                job.finished_at = datetime.datetime.now()
+
+
+_queue: Optional[BulkRebalanceQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_bulk_queue() -> BulkRebalanceQueue:
+    """Shared job queue for the portal, created on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = BulkRebalanceQueue()
+        return _queue
@@ -0,0 +1,183 @@
+"""
+Chat History Store
+Per-user chat history for the AI assistant: a bounded ring buffer per user in memory,
+written through to the chat_messages table by a background thread. A user's buffer is
+loaded from the database on first use and the least recently used users are evicted, so
+memory stays bounded however many advisors are chatting.
+"""
+
+import datetime
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from db import get_pool
+
+MAX_MESSAGES_PER_USER = int(os.environ.get('PORTFOLIO_CHAT_HISTORY_CAP', 50))
+MAX_RESIDENT_USERS = int(os.environ.get('PORTFOLIO_CHAT_HISTORY_USERS', 1000))
+WRITE_BATCH_SIZE = 200  # messages inserted per write-through transaction
+
+
+@dataclass
+class ChatMessage:
+    role: str  # 'user' or 'assistant'
+    content: str
+    timestamp: datetime.datetime
+    agent_type: str = 'general'
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.timestamp.isoformat(),
+            'agent_type': self.agent_type
+        }
+
+
+class ChatHistoryStore:
+    """Bounded per-user chat history with lazy loading, LRU eviction and async write-through"""
+
+    def __init__(self, db_path: Optional[str] = None, max_messages: int = MAX_MESSAGES_PER_USER,
+                 max_users: int = MAX_RESIDENT_USERS):
+        self.db_path = db_path
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self._buffers: 'OrderedDict[str, Deque[ChatMessage]]' = OrderedDict()
+        self._pending: Dict[str, int] = {}  # messages queued but not yet written, per user
+        self._loading: Dict[str, int] = {}  # database reads in flight, per user
+        self._writes: 'queue.Queue[Tuple[str, ChatMessage]]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _load(self, user_id: str) -> Deque[ChatMessage]:
+        """The user's newest max_messages from the database, oldest first"""
+        with get_pool(self.db_path).connection() as conn:
+            rows = conn.execute('''
+                SELECT role, content, agent_type, created_at FROM chat_messages
+                WHERE user_id = ? ORDER BY id DESC LIMIT ?
+            ''', (user_id, self.max_messages)).fetchall()
+        return deque((ChatMessage(row[0], row[1], datetime.datetime.fromisoformat(row[3]), row[2])
+                      for row in reversed(rows)), maxlen=self.max_messages)
+
+    def _resident(self, user_id: str, loaded: Optional[Deque[ChatMessage]] = None) -> Optional[Deque[ChatMessage]]:
+        """The user's buffer marked most recently used, installing loaded if absent (lock held)"""
+        buffer = self._buffers.get(user_id)
+        if buffer is not None:
+            self._buffers.move_to_end(user_id)
+            return buffer
+        if loaded is None:
+            return None
+
+        self._buffers[user_id] = loaded
+        self._evict(keep=user_id)
+        return loaded
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop least recently used buffers beyond max_users (lock held).
+
+        Users with unwritten messages stay resident until the writer catches up, so a reload
+        never misses them, and so do users being loaded, so a load that raced an append never
+        replaces the buffer holding it; the cap may be exceeded briefly under a write backlog.
+        """
+        excess = len(self._buffers) - self.max_users
+        for idle_user in list(self._buffers):
+            if excess <= 0:
+                break
+            if idle_user != keep and not self._pending.get(idle_user) and not self._loading.get(idle_user):
+                del self._buffers[idle_user]
+                excess -= 1
+
+    def _acquire_buffer(self, user_id: str) -> Deque[ChatMessage]:
+        """Take the lock with the user's buffer resident; the database read happens outside the lock"""
+        self._lock.acquire()
+        buffer = self._resident(user_id)
+        if buffer is None:
+            # A user that is not resident has nothing pending, so the database copy is complete.
+            # Anyone appending while we read installs the user, who then stays resident until
+            # we are back, and their buffer wins over what we loaded.
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+            self._lock.release()
+            try:
+                loaded = self._load(user_id)
+            finally:
+                self._lock.acquire()
+                self._loading[user_id] -= 1
+                if not self._loading[user_id]:
+                    del self._loading[user_id]
+            buffer = self._resident(user_id, loaded)
+        return buffer
+
+    def append(self, user_id: str, *messages: ChatMessage):
+        """Add messages to the user's history; they reach the database asynchronously"""
+        buffer = self._acquire_buffer(user_id)
+        try:
+            for message in messages:
+                buffer.append(message)
+                self._writes.put((user_id, message))
+            self._pending[user_id] = self._pending.get(user_id, 0) + len(messages)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='chat-history-writer', daemon=True)
+                self._writer.start()
+        finally:
+            self._lock.release()
+
+    def recent(self, user_id: str, limit: int = 20) -> List[ChatMessage]:
+        """The user's last limit messages, oldest first"""
+        buffer = self._acquire_buffer(user_id)
+        try:
+            return list(buffer)[-limit:] if limit else []
+        finally:
+            self._lock.release()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with get_pool(self.db_path).connection() as conn:
+                    conn.executemany('''
+                        INSERT INTO chat_messages (user_id, role, content, agent_type, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [(user_id, message.role, message.content, message.agent_type,
+                           message.timestamp.isoformat()) for user_id, message in batch])
+                    conn.commit()
+            except Exception as e:
+                print(f"⚠️ Could not persist {len(batch)} chat messages: {e}")
+            finally:
+                with self._lock:
+                    for user_id, _ in batch:
+                        self._pending[user_id] -= 1
+                        if not self._pending[user_id]:
+                            del self._pending[user_id]
+                    self._evict()
+                for _ in batch:
+                    self._writes.task_done()
+
+    def flush(self):
+        """Block until every queued message has been written"""
+        self._writes.join()
+
+    def session_count(self) -> int:
+        """Number of users with any chat history"""
+        with get_pool(self.db_path).connection() as conn:
+            persisted = {row[0] for row in conn.execute('SELECT DISTINCT user_id FROM chat_messages')}
+        with self._lock:
+            return len(persisted | set(self._pending))
+
+    def stats(self) -> Dict[str, int]:
+        """Memory footprint of the store"""
+        with self._lock:
+            return {
+                'resident_users': len(self._buffers),
+                'resident_messages': sum(len(buffer) for buffer in self._buffers.values()),
+                'pending_writes': sum(self._pending.values()),
+                'max_messages_per_user': self.max_messages,
+                'max_resident_users': self.max_users
+            }
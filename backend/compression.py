@@ -0,0 +1,147 @@
+"""
+Response Compression
+gzip (or brotli, when the brotli package is installed) for JSON, CSV and other text
+responses, negotiated from Accept-Encoding. Buffered responses are only compressed above
+a size threshold; streamed responses (exports) are compressed chunk by chunk so rows keep
+flowing to the client. Bytes in/out are counted for /api/metrics/compression.
+"""
+
+import gzip
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024  # smaller bodies cost more in CPU than they save on the wire
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic responses: well below the 11 used for the prebuilt static assets
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/csv', 'text/html', 'text/css', 'text/plain', 'text/javascript'
+}
+
+# Preferred first when the client weights them equally
+SUPPORTED_ENCODINGS = (['br'] if brotli is not None else []) + ['gzip']
+
+
+class CompressionStats:
+    """Thread-safe counters of what the compression layer has done"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {'compressed': 0, 'streamed': 0, 'skipped_small': 0, 'bytes_in': 0, 'bytes_out': 0}
+            self._encodings: Dict[str, int] = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, streamed: bool = False):
+        with self._lock:
+            self._counters['compressed'] += 1
+            self._counters['streamed'] += streamed
+            self._counters['bytes_in'] += bytes_in
+            self._counters['bytes_out'] += bytes_out
+            self._encodings[encoding] = self._encodings.get(encoding, 0) + 1
+
+    def record_skipped(self):
+        with self._lock:
+            self._counters['skipped_small'] += 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            encodings = dict(self._encodings)
+        saved = counters['bytes_in'] - counters['bytes_out']
+        return {
+            'responses_compressed': counters['compressed'],
+            'responses_streamed': counters['streamed'],
+            'responses_below_threshold': counters['skipped_small'],
+            'bytes_in': counters['bytes_in'],
+            'bytes_out': counters['bytes_out'],
+            'bytes_saved': saved,
+            'ratio': round(counters['bytes_out'] / counters['bytes_in'], 4) if counters['bytes_in'] else None,
+            'encodings': encodings,
+            'min_bytes': COMPRESS_MIN_BYTES,
+            'available_encodings': SUPPORTED_ENCODINGS
+        }
+
+
+_stats = CompressionStats()
+
+
+def get_compression_stats() -> CompressionStats:
+    """The process-wide compression counters"""
+    return _stats
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body, flushing after every chunk so the client sees rows as they come"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        compress, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    bytes_in = bytes_out = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        bytes_in += len(chunk)
+        block = compress(chunk) + flush()
+        bytes_out += len(block)
+        if block:
+            yield block
+    block = finish()
+    bytes_out += len(block)
+    yield block
+    _stats.record(encoding, bytes_in, bytes_out, streamed=True)
+
+
+def compress_response(response):
+    """after_request hook: compress the body when the client accepts it and it is worth it"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough  # files; static assets ship precompressed variants
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        chunks = response.response
+        response.response = _compress_stream(chunks, encoding)
+        if hasattr(chunks, 'close'):
+            # The wrapper may be closed before it starts; the original stream still has to release its cursor
+            response.call_on_close(chunks.close)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            _stats.record_skipped()
+            return response
+        compressed = _compress(data, encoding)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        _stats.record(encoding, len(data), len(compressed))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
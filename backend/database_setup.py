@@ -1,6 +1,25 @@
 import sqlite3
 import pandas as pd
 import os
+from migrations import apply_migrations
+from portfolio_snapshot import refresh_portfolio_snapshots
+from product_loader import load_product_market_data
+
+# Tables reloaded from the Excel files and demo data on every setup run
+SEED_TABLES = [
+    'investor_ref_data',
+    'portfolios_cur_allocation',
+    'product_market_data',
+    'MasterAllocationModel',
+    'user_holdings',
+    'funds_universe',
+    'rebalancing_scenarios'
+]
+
+
+def print_load_progress(loaded, total):
+    """Progress callback for the chunked loaders"""
+    print(f"   ... {loaded}{f' / {total}' if total else ''} rows")
 
 
 def create_database():
@@ -18,147 +37,15 @@ def create_database():
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
-    # Drop existing tables if they exist
-    cursor.execute('DROP TABLE IF EXISTS investor_ref_data')
-    cursor.execute('DROP TABLE IF EXISTS portfolios_cur_allocation')
-    cursor.execute('DROP TABLE IF EXISTS product_market_data')
-    cursor.execute('DROP TABLE IF EXISTS MasterAllocationModel')
-    cursor.execute('DROP TABLE IF EXISTS user_holdings')
-    cursor.execute('DROP TABLE IF EXISTS funds_universe')
-    cursor.execute('DROP TABLE IF EXISTS rebalancing_scenarios')
-
-
-    cursor.execute('''
-        CREATE TABLE investor_ref_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            age INTEGER,
-            city TEXT,
-            risk_capacity TEXT,
-            spending_score TEXT,
-            annual_income REAL,
-            investor_category TEXT,
-            asset_allocation_model TEXT,
-            equities_percent REAL,
-            bonds_percent REAL,
-            cash_percent REAL,
-            alternatives_percent REAL,
-            investment_preference_sectors TEXT,
-            rebalancing_frequency TEXT,
-            last_rebalancing_date DATE,
-            variation_limit REAL
-        )
-    ''')
-    
-    # Create PortfoliosCurAllocation table
-    cursor.execute('''
-        CREATE TABLE portfolios_cur_allocation (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            total_investment_amount REAL,
-            equities_percent REAL,
-            bonds_percent REAL,
-            cash_percent REAL,
-            alternatives_percent REAL
-        )
-    ''')
-    
-    # Create ProductMarketData table
-    cursor.execute('''
-        CREATE TABLE product_market_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            investment_type TEXT,
-            industry_sector TEXT,
-            market_segment TEXT,
-            investment_strategies TEXT,
-            investment_product TEXT,
-            symbol TEXT,
-            market_price_usd REAL
-        )
-    ''')
+    # Bring the schema up to date (tables and indexes are owned by migrations.py)
+    apply_migrations(conn)
     
-    # Create MasterAllocationModel table
-    cursor.execute('''
-        CREATE TABLE MasterAllocationModel (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT,
-            model_no INTEGER,
-            model_type TEXT,
-            model_desc TEXT,
-            equities REAL,
-            domestic_equities REAL,
-            emerging_market REAL,
-            bonds REAL,
-            cash_cash_equivalents REAL,
-            alternative_investments REAL
-        )
-    ''')
+    # Clear the reference and demo tables before reloading them; schema and indexes are kept
+    for table in SEED_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+    cursor.execute(f"DELETE FROM sqlite_sequence WHERE name IN ({','.join('?' * len(SEED_TABLES))})", SEED_TABLES)
     
-    # Create User Holdings table
-    cursor.execute('''
-        CREATE TABLE user_holdings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            fund_symbol TEXT NOT NULL,
-            fund_name TEXT NOT NULL,
-            asset_class TEXT NOT NULL,
-            units_held REAL NOT NULL,
-            current_price REAL NOT NULL,
-            invested_amount REAL NOT NULL,
-            current_value REAL NOT NULL,
-            return_percent REAL,
-            performance_rating TEXT,
-            risk_rating TEXT,
-            expense_ratio REAL,
-            last_updated DATE DEFAULT CURRENT_DATE
-        )
-    ''')
-    
-    # Create Funds Universe table
-    cursor.execute('''
-        CREATE TABLE funds_universe (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fund_symbol TEXT UNIQUE NOT NULL,
-            fund_name TEXT NOT NULL,
-            asset_class TEXT NOT NULL,
-            category TEXT,
-            fund_manager TEXT,
-            current_price REAL NOT NULL,
-            returns_1year REAL,
-            returns_3year REAL,
-            returns_5year REAL,
-            expense_ratio REAL,
-            risk_rating TEXT,
-            performance_rating TEXT,
-            min_investment REAL DEFAULT 1000,
-            is_recommended BOOLEAN DEFAULT 0,
-            sector_focus TEXT,
-            market_cap_focus TEXT
-        )
-    ''')
-    
-    # Create Rebalancing Scenarios table
-    cursor.execute('''
-        CREATE TABLE rebalancing_scenarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            scenario_name TEXT NOT NULL,
-            asset_class TEXT NOT NULL,
-            action_type TEXT NOT NULL,
-            sell_fund_symbol TEXT,
-            sell_amount REAL,
-            buy_fund_symbol TEXT,
-            buy_amount REAL,
-            expected_return REAL,
-            risk_score INTEGER,
-            scenario_desc TEXT,
-            created_date DATE DEFAULT CURRENT_DATE
-        )
-    ''')
-    
-    print("Tables created successfully!")
+    print("Tables ready!")
     
     # Load data from Excel files
     try:
@@ -242,14 +129,9 @@ def create_database():
         # Load ProductMarketData
         product_file = os.path.join(base_path, 'ProductMarketData.xlsx')
         if os.path.exists(product_file):
-            df_product = pd.read_excel(product_file)
-            # Map Excel columns to database columns
-            df_product.columns = [
-                'investment_type', 'industry_sector', 'market_segment',
-                'investment_strategies', 'investment_product', 'symbol', 'market_price_usd'
-            ]
-            df_product.to_sql('product_market_data', conn, if_exists='append', index=False)
-            print(f"✅ Loaded {len(df_product)} records into product_market_data")
+            # Streamed in chunks so large vendor files never sit in memory whole
+            loaded = load_product_market_data(cursor, product_file, progress=print_load_progress)
+            print(f"✅ Loaded {loaded} records into product_market_data")
         else:
             print("⚠️ ProductMarketData.xlsx not found, skipping")
         
@@ -418,6 +300,10 @@ def create_database():
         ''', sample_holdings)
         
         print(f"✅ Loaded {len(sample_holdings)} user holdings with realistic performance data")
+        
+        # Rebuild the per-investor snapshots from the freshly loaded holdings and targets
+        refresh_portfolio_snapshots(cursor)
+        print("✅ Refreshed portfolio snapshots")
         print("🎯 Database setup completed successfully with market-driven rebalancing scenarios!")
         
     except Exception as e:
@@ -0,0 +1,159 @@
+"""
+Data Access Layer
+Thread-safe SQLite connection pool shared by the Flask routes and the AI agents
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.environ.get('PORTFOLIO_DB_PATH', os.path.join(BASE_PATH, 'database', 'portfolio_management.db'))
+
+DEFAULT_POOL_SIZE = 8
+ACQUIRE_TIMEOUT_SECONDS = 30
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+# Applied once per physical connection instead of on every request
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA mmap_size = 268435456',   # 256 MB memory-mapped I/O
+    'PRAGMA cache_size = -65536',     # 64 MB page cache
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000'
+]
+
+
+class PooledConnection:
+    """A borrowed connection; close() hands it back to the pool instead of closing it"""
+
+    _conn = None
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a connection returned to the pool')
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        """The underlying sqlite3 connection"""
+        return self._conn
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Routes that return early without close() still give their connection back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pre-configured SQLite connections"""
+
+    def __init__(self, db_path: str = DB_PATH, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new physical connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # the pool guarantees one borrower at a time
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Borrow a connection, opening a new one while the pool is below its size"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=ACQUIRE_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    raise RuntimeError(f'Timed out waiting for a database connection ({self.size} in use)')
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        """Take a connection back, discarding any uncommitted work like sqlite3 close() would"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            # Broken connection: drop it so a fresh one can be opened
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    """Get the shared pool for a database file (the portal database by default)"""
+    path = os.path.abspath(db_path or DB_PATH)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
+def get_db_connection(db_path: Optional[str] = None) -> PooledConnection:
+    """Get database connection from the shared pool; close() returns it"""
+    return get_pool(db_path).acquire()
@@ -0,0 +1,106 @@
+"""
+Set-based Drift Engine
+Reads current allocation weights, drift against investor targets and rebalancing
+priority for every investor from the portfolio_snapshot table in a single query
+"""
+
+from typing import List, Dict, Any, Optional
+
+# One snapshot row per investor; the aggregates and drift are maintained by the write
+# paths (see portfolio_snapshot.py), so nothing here touches user_holdings
+DRIFT_QUERY = '''
+    SELECT
+        ir.user_id,
+        ir.full_name,
+        ir.age,
+        ir.city,
+        ir.investor_category,
+        ir.asset_allocation_model,
+        ir.annual_income,
+        ir.risk_capacity,
+        ir.variation_limit,
+        ir.equities_percent,
+        ir.bonds_percent,
+        ir.cash_percent,
+        ir.alternatives_percent,
+        s.holdings_count,
+        s.total_value,
+        s.avg_return,
+        s.equity_value,
+        s.bond_value,
+        s.cash_value,
+        s.alt_value,
+        s.equity_drift,
+        s.bond_drift,
+        s.cash_drift,
+        s.alt_drift
+    FROM investor_ref_data ir
+    LEFT JOIN portfolio_snapshot s ON s.user_id = ir.user_id
+    {where}
+    ORDER BY ir.full_name
+'''
+
+
+def get_rebalancing_priority(drift: float) -> str:
+    """Map an allocation drift (percentage points) to a rebalancing priority"""
+    return 'High' if drift > 10 else 'Medium' if drift > 5 else 'Low'
+
+
+def _weight(value, total_value) -> float:
+    """Percentage of total_value held in one asset class"""
+    return (value or 0) / total_value * 100
+
+
+def build_drift_record(row) -> Dict[str, Any]:
+    """Turn one snapshot row (a plain tuple in DRIFT_QUERY column order) into weights, drift and priority"""
+    (user_id, full_name, age, city, investor_category, asset_allocation_model, annual_income,
+     risk_capacity, variation_limit, target_equity, target_bond, target_cash, target_alt,
+     total_holdings, total_value, avg_return, equity_value, bond_value, cash_value, alt_value,
+     equity_drift, bond_drift, cash_drift, alt_drift) = row
+
+    target = {'equity': target_equity, 'bond': target_bond, 'cash': target_cash, 'alt': target_alt}
+    if equity_drift is None:
+        # Investor added since the last snapshot refresh; nothing held yet
+        drift = {'equity': 0, 'bond': 0, 'cash': 0, 'alt': 0}
+    else:
+        drift = {'equity': equity_drift, 'bond': bond_drift, 'cash': cash_drift, 'alt': alt_drift}
+
+    if total_value:
+        current = {
+            'equity': _weight(equity_value, total_value),
+            'bond': _weight(bond_value, total_value),
+            'cash': _weight(cash_value, total_value),
+            'alt': _weight(alt_value, total_value)
+        }
+    else:
+        current = {'equity': 0, 'bond': 0, 'cash': 0, 'alt': 0}
+
+    return {
+        'user_id': user_id,
+        'full_name': full_name,
+        'age': age,
+        'city': city,
+        'investor_category': investor_category,
+        'asset_allocation_model': asset_allocation_model,
+        'annual_income': annual_income,
+        'risk_capacity': risk_capacity,
+        'variation_limit': variation_limit,
+        'portfolio_value': total_value or 0,
+        'holdings_count': total_holdings or 0,
+        'avg_return': avg_return or 0,
+        'current': current,
+        'target': target,
+        'drift': drift,
+        'rebalancing_priority': get_rebalancing_priority(drift['equity'])
+    }
+
+
+def compute_portfolio_drift(conn, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Drift records for all investors (or one) from the snapshot table in a single query"""
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples, unpacked positionally in build_drift_record
+    if user_id is None:
+        cursor.execute(DRIFT_QUERY.format(where=''))
+    else:
+        cursor.execute(DRIFT_QUERY.format(where='WHERE ir.user_id = ?'), (user_id,))
+    return [build_drift_record(row) for row in cursor]
@@ -0,0 +1,63 @@
+"""
+Streaming Exports
+Writes table extracts as chunked CSV or NDJSON straight from a SQLite cursor, so server
+memory stays constant however many rows are exported
+"""
+
+import csv
+import io
+from typing import Iterator, List, Union
+
+from serializers import encoded_row_chunks
+from table_query import build_export_query
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+EXPORT_CHUNK_ROWS = 1000  # rows fetched from the cursor and written per response chunk
+
+
+def _csv_chunks(cursor, columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header of an empty extract
+
+
+def _ndjson_chunks(cursor, columns: List[str]) -> Iterator[bytes]:
+    for rows in encoded_row_chunks(columns, cursor, chunk_rows=EXPORT_CHUNK_ROWS):
+        yield b'\n'.join(rows) + b'\n'
+
+
+def stream_export(conn, table: str, args, export_format: str = 'csv') -> Iterator[Union[str, bytes]]:
+    """Generator of response chunks for an extract of table filtered/sorted by args.
+
+    The query is prepared eagerly, so an unknown table, format or sort column raises
+    (KeyError/ValueError) before the response starts. conn is closed when the stream ends.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {export_format}')
+    query, params = build_export_query(table, args)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    columns = [description[0] for description in cursor.description]
+    chunks = _csv_chunks(cursor, columns) if export_format == 'csv' else _ndjson_chunks(cursor, columns)
+
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            cursor.close()
+            conn.close()
+
+    return generate()
@@ -0,0 +1,322 @@
+"""
+Goal Projection Engine
+Monte Carlo projection of a portfolio's value for goal planning. Every path is simulated
+at once: correlated yearly returns for the four asset classes are drawn as one array from
+a seeded generator, the mix is rebalanced yearly to the investor's current weights and
+contributions are added until retirement. Goals (retirement at 65 on 10x income, plus any
+others the caller names) are scored as the share of paths that reach them.
+
+A projection depends only on its inputs, which are rounded into an allocation fingerprint
+before simulating, so results are cached by fingerprint and reused across users and calls.
+project_book runs the whole book, optionally on a process pool.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rebalance_solver import ASSET_CLASSES
+
+# Long-run yearly (expected return, volatility) per asset class, in ASSET_CLASSES order
+RETURN_ASSUMPTIONS = {
+    'Equity': (0.07, 0.16),
+    'Bond': (0.035, 0.06),
+    'Cash': (0.02, 0.01),
+    'Alternative': (0.055, 0.12)
+}
+CORRELATIONS = np.array([
+    [1.00, 0.10, 0.00, 0.60],
+    [0.10, 1.00, 0.20, 0.15],
+    [0.00, 0.20, 1.00, 0.00],
+    [0.60, 0.15, 0.00, 1.00]
+])
+
+DEFAULT_PATHS = 5000
+DEFAULT_SEED = 42
+RETIREMENT_AGE = 65
+RETIREMENT_INCOME_MULTIPLE = 10   # retirement target: 10x annual income
+CONTRIBUTION_RATE = 0.10          # share of annual income invested each year until retirement
+MAX_YEARS = 60
+PROJECTION_CACHE_MAX_ENTRIES = 2000
+
+# Fingerprint rounding: weights to 0.5 percentage points, money to $100
+WEIGHT_STEP = 0.005
+AMOUNT_STEP = 100.0
+
+
+@dataclass(frozen=True)
+class Goal:
+    """A target amount to reach within a number of years"""
+    name: str
+    target_amount: float
+    years: int
+
+
+@dataclass(frozen=True)
+class ProjectionInputs:
+    """Everything a projection depends on, already rounded to the fingerprint grid"""
+    weights: Tuple[float, ...]         # per asset class, summing to 1
+    start_value: float
+    annual_contribution: float
+    contribution_years: int
+    goals: Tuple[Goal, ...]
+    paths: int = DEFAULT_PATHS
+    seed: int = DEFAULT_SEED
+
+    @property
+    def years(self) -> int:
+        return max([goal.years for goal in self.goals] + [1])
+
+    def fingerprint(self) -> str:
+        """Short stable hash of the inputs, shown with the result"""
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _round_amount(amount: float) -> float:
+    return round((amount or 0) / AMOUNT_STEP) * AMOUNT_STEP
+
+
+def make_inputs(class_values: Sequence[float], start_value: float, annual_contribution: float = 0,
+                contribution_years: int = 0, goals: Sequence[Goal] = (),
+                paths: int = DEFAULT_PATHS, seed: int = DEFAULT_SEED) -> ProjectionInputs:
+    """Round a portfolio's asset-class values, contributions and goals onto the fingerprint grid.
+
+    class_values are in ASSET_CLASSES order; an empty mix is projected as all cash.
+    """
+    mix = np.clip(np.asarray(class_values, dtype=float), 0, None)
+    if mix.sum() <= 0:
+        mix = np.array([1.0 if asset_class == 'Cash' else 0.0 for asset_class in ASSET_CLASSES])
+    steps = np.round(mix / mix.sum() / WEIGHT_STEP)
+    steps[np.argmax(steps)] += round(1 / WEIGHT_STEP) - steps.sum()  # keep the rounded weights summing to 1
+    return ProjectionInputs(
+        weights=tuple(round(step * WEIGHT_STEP, 4) for step in steps.tolist()),
+        start_value=_round_amount(start_value),
+        annual_contribution=_round_amount(annual_contribution),
+        contribution_years=min(max(int(contribution_years), 0), MAX_YEARS),
+        goals=tuple(Goal(goal.name, _round_amount(goal.target_amount), min(max(int(goal.years), 0), MAX_YEARS))
+                    for goal in goals),
+        paths=int(paths),
+        seed=int(seed)
+    )
+
+
+def _assumptions() -> Tuple[np.ndarray, np.ndarray]:
+    """Yearly expected returns and volatilities in ASSET_CLASSES order"""
+    return (np.array([RETURN_ASSUMPTIONS[asset_class][0] for asset_class in ASSET_CLASSES]),
+            np.array([RETURN_ASSUMPTIONS[asset_class][1] for asset_class in ASSET_CLASSES]))
+
+
+def simulate_paths(inputs: ProjectionInputs) -> np.ndarray:
+    """(paths, years + 1) portfolio values, column 0 being today's value"""
+    years = inputs.years
+    means, vols = _assumptions()
+
+    # Correlated lognormal yearly returns for every path, year and asset class at once
+    rng = np.random.default_rng(inputs.seed)
+    shocks = rng.standard_normal((inputs.paths, years, len(ASSET_CLASSES))) @ np.linalg.cholesky(CORRELATIONS).T
+    class_growth = np.exp(np.log1p(means) - vols ** 2 / 2 + vols * shocks)
+    growth = np.cumprod(class_growth @ np.array(inputs.weights), axis=1)
+
+    # V_t = G_t * (V_0 + sum_{k<=t} c_k / G_k) for growth G and year-end contributions c
+    contributions = np.where(np.arange(1, years + 1) <= inputs.contribution_years, inputs.annual_contribution, 0.0)
+    values = growth * (inputs.start_value + np.cumsum(contributions / growth, axis=1))
+    return np.hstack([np.full((inputs.paths, 1), inputs.start_value), values])
+
+
+def simulate_projection(inputs: ProjectionInputs) -> Dict[str, Any]:
+    """Goal success probabilities and value percentiles for one set of inputs"""
+    values = simulate_paths(inputs)
+    weights = np.array(inputs.weights)
+    means, vols = _assumptions()
+    covariance = CORRELATIONS * np.outer(vols, vols)
+    p10, p50, p90 = np.percentile(values[:, -1], [10, 50, 90]).tolist()
+
+    goals = []
+    for goal in inputs.goals:
+        at_goal = values[:, goal.years]
+        goals.append({
+            'name': goal.name,
+            'target_amount': goal.target_amount,
+            'years': goal.years,
+            'success_probability': round(float(np.mean(at_goal >= goal.target_amount)), 4),
+            'median_value': round(float(np.median(at_goal)), 2),
+            'p10_value': round(float(np.percentile(at_goal, 10)), 2)
+        })
+
+    return {
+        'fingerprint': inputs.fingerprint(),
+        'paths': inputs.paths,
+        'seed': inputs.seed,
+        'years': inputs.years,
+        'weights': dict(zip(ASSET_CLASSES, inputs.weights)),
+        'start_value': inputs.start_value,
+        'annual_contribution': inputs.annual_contribution,
+        'contribution_years': inputs.contribution_years,
+        'expected_return': round(float(weights @ means), 4),
+        'volatility': round(float(np.sqrt(weights @ covariance @ weights)), 4),
+        'final_value': {'p10': round(p10, 2), 'p50': round(p50, 2), 'p90': round(p90, 2)},
+        'goals': goals
+    }
+
+
+class ProjectionCache:
+    """LRU cache of projections keyed by their inputs"""
+
+    def __init__(self, max_entries: int = PROJECTION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[ProjectionInputs, Dict[str, Any]]' = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def get(self, inputs: ProjectionInputs) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(inputs)
+            if result is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(inputs)
+            self._counters['hits'] += 1
+            return result
+
+    def put(self, inputs: ProjectionInputs, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[inputs] = result
+            self._entries.move_to_end(inputs)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, hit/miss counters and hit rate"""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            **counters,
+            'hit_rate': round(counters['hits'] / lookups, 4) if lookups else None
+        }
+
+
+_projection_cache = ProjectionCache()
+
+
+def get_projection_cache() -> ProjectionCache:
+    """The process-wide projection cache"""
+    return _projection_cache
+
+
+def project(inputs: ProjectionInputs, cache: Optional[ProjectionCache] = None) -> Dict[str, Any]:
+    """The projection for inputs, simulated only when no identical allocation has been projected"""
+    cache = cache or get_projection_cache()
+    result = cache.get(inputs)
+    if result is None:
+        result = simulate_projection(inputs)
+        cache.put(inputs, result)
+    return result
+
+
+def project_many(inputs_by_user: Dict[str, ProjectionInputs], workers: int = 0,
+                 cache: Optional[ProjectionCache] = None) -> Dict[str, Dict[str, Any]]:
+    """Projections for many users; each distinct uncached allocation is simulated once.
+
+    With workers > 1 the simulations run on a process pool of that size.
+    """
+    cache = cache or get_projection_cache()
+    results: Dict[ProjectionInputs, Dict[str, Any]] = {}
+    missing = []
+    for inputs in dict.fromkeys(inputs_by_user.values()):
+        cached = cache.get(inputs)
+        if cached is None:
+            missing.append(inputs)
+        else:
+            results[inputs] = cached
+
+    if workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            computed = list(pool.map(simulate_projection, missing, chunksize=max(1, len(missing) // (workers * 4))))
+    else:
+        computed = [simulate_projection(inputs) for inputs in missing]
+    for inputs, result in zip(missing, computed):
+        cache.put(inputs, result)
+        results[inputs] = result
+
+    return {user_id: results[inputs] for user_id, inputs in inputs_by_user.items()}
+
+
+def retirement_goal(age: Optional[int], annual_income: Optional[float]) -> Goal:
+    """Retirement at 65 on 10x annual income"""
+    years_to_retirement = max(0, RETIREMENT_AGE - (age or RETIREMENT_AGE))
+    return Goal('retirement', (annual_income or 0) * RETIREMENT_INCOME_MULTIPLE, years_to_retirement)
+
+
+def load_projection_inputs(conn, user_ids: Optional[List[str]] = None, extra_goals: Sequence[Goal] = (),
+                           paths: int = DEFAULT_PATHS, seed: int = DEFAULT_SEED) -> Dict[str, ProjectionInputs]:
+    """user_id -> projection inputs from each investor's profile and portfolio snapshot
+    (every investor when user_ids is None)"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    where, params = '', ()
+    if user_ids is not None:
+        where, params = 'WHERE ir.user_id IN (SELECT value FROM json_each(?))', (json.dumps(list(user_ids)),)
+    cursor.execute(f'''
+        SELECT ir.user_id, ir.age, ir.annual_income, COALESCE(s.total_value, 0),
+               COALESCE(s.equity_value, 0), COALESCE(s.bond_value, 0),
+               COALESCE(s.cash_value, 0), COALESCE(s.alt_value, 0)
+        FROM investor_ref_data ir
+        LEFT JOIN portfolio_snapshot s ON s.user_id = ir.user_id
+        {where}
+        ORDER BY ir.id
+    ''', params)
+
+    inputs_by_user = {}
+    for user_id, age, annual_income, total_value, *class_values in cursor.fetchall():
+        if user_id in inputs_by_user:
+            continue
+        retirement = retirement_goal(age, annual_income)
+        inputs_by_user[user_id] = make_inputs(
+            class_values, total_value,
+            annual_contribution=(annual_income or 0) * CONTRIBUTION_RATE,
+            contribution_years=retirement.years,
+            goals=[retirement, *extra_goals],
+            paths=paths, seed=seed
+        )
+    return inputs_by_user
+
+
+def project_user(conn, user_id: str, extra_goals: Sequence[Goal] = ()) -> Optional[Dict[str, Any]]:
+    """Cached projection for one investor, or None if they have no profile"""
+    inputs = load_projection_inputs(conn, [user_id], extra_goals).get(user_id)
+    return project(inputs) if inputs is not None else None
+
+
+def project_book(conn, user_ids: Optional[List[str]] = None, extra_goals: Sequence[Goal] = (),
+                 workers: int = 0) -> Dict[str, Dict[str, Any]]:
+    """Cached projections for user_ids (the whole book when None)"""
+    return project_many(load_projection_inputs(conn, user_ids, extra_goals), workers=workers)
+
+
+def parse_goal(spec: str) -> Goal:
+    """A Goal from 'name:amount:years'; raises ValueError if malformed"""
+    try:
+        name, amount, years = spec.split(':')
+        goal = Goal(name.strip(), float(amount), int(years))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid goal '{spec}'. Use name:amount:years, e.g. house:100000:5")
+    if not goal.name or not (goal.target_amount > 0 and math.isfinite(goal.target_amount)) \
+            or not 0 <= goal.years <= MAX_YEARS:
+        raise ValueError(f"Invalid goal '{spec}'. Amount must be a positive number and years 0-{MAX_YEARS}")
+    return goal
@@ -0,0 +1,138 @@
+"""
+Holdings Reverse Index
+In-process map from fund symbol to the user_holdings rows (and owners) that hold it, so a
+price change finds its positions without scanning user_holdings. Built from one scan on
+first use, then kept current from the holdings_changes log (migration 11): every lookup
+re-reads the users whose holdings changed since the last seq it saw, whichever process
+wrote them. The write endpoints also patch it right after they commit, and it is rebuilt
+after INDEX_MAX_AGE_SECONDS as a backstop.
+"""
+
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from db import get_pool
+
+INDEX_MAX_AGE_SECONDS = 300
+
+
+class HoldingsIndex:
+    """fund_symbol -> holding ids, with each holding's owner"""
+
+    def __init__(self, db_path: Optional[str] = None, max_age_seconds: float = INDEX_MAX_AGE_SECONDS):
+        self.db_path = db_path
+        self.max_age_seconds = max_age_seconds
+        self._by_symbol: Dict[str, Set[int]] = {}
+        self._by_user: Dict[str, Set[int]] = {}
+        self._holdings: Dict[int, Tuple[str, str]] = {}  # holding id -> (user_id, fund_symbol)
+        self._built_at: Optional[float] = None
+        self._seq = 0  # holdings_changes watermark the index reflects
+        self._lock = threading.Lock()
+
+    def _read(self, user_ids: Optional[List[str]] = None) -> List[Tuple[int, str, str]]:
+        with get_pool(self.db_path).connection() as conn:
+            if user_ids is None:
+                return conn.execute('SELECT id, user_id, fund_symbol FROM user_holdings').fetchall()
+            return conn.execute('''
+                SELECT id, user_id, fund_symbol FROM user_holdings
+                WHERE user_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(user_ids),)).fetchall()
+
+    def _changes_since(self, seq: Optional[int]) -> Tuple[List[str], int]:
+        """Users whose holdings changed after seq, and the newest seq (just the latter for None)"""
+        with get_pool(self.db_path).connection() as conn:
+            if seq is None:
+                return [], conn.execute('SELECT COALESCE(MAX(seq), 0) FROM holdings_changes').fetchone()[0]
+            rows = conn.execute('SELECT user_id, seq FROM holdings_changes WHERE seq > ?', (seq,)).fetchall()
+        return [row[0] for row in rows], max((row[1] for row in rows), default=seq)
+
+    def _add(self, rows: Iterable[Tuple[int, str, str]]):
+        """Index holding rows (lock held)"""
+        for holding_id, user_id, fund_symbol in rows:
+            self._holdings[holding_id] = (user_id, fund_symbol)
+            self._by_symbol.setdefault(fund_symbol, set()).add(holding_id)
+            self._by_user.setdefault(user_id, set()).add(holding_id)
+
+    def _remove_user(self, user_id: str):
+        """Drop a user's holdings from the index (lock held)"""
+        for holding_id in self._by_user.pop(user_id, ()):
+            _, fund_symbol = self._holdings.pop(holding_id)
+            holders = self._by_symbol[fund_symbol]
+            holders.discard(holding_id)
+            if not holders:
+                del self._by_symbol[fund_symbol]
+
+    def rebuild(self):
+        """Re-read every holding; the database scan happens outside the lock"""
+        # Watermark first: a change racing the scan is then re-read by the next catch-up
+        _, seq = self._changes_since(None)
+        rows = self._read()
+        with self._lock:
+            self._by_symbol, self._by_user, self._holdings = {}, {}, {}
+            self._add(rows)
+            self._built_at = time.monotonic()
+            self._seq = seq
+
+    def _catch_up(self):
+        """Re-read the users whose holdings changed since the watermark"""
+        user_ids, seq = self._changes_since(self._seq)
+        if user_ids:
+            self._replace_users(user_ids, self._read(user_ids), seq)
+
+    def _ensure_current(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at >= self.max_age_seconds:
+            self.rebuild()
+        else:
+            self._catch_up()
+
+    def _replace_users(self, user_ids: List[str], rows: List[Tuple[int, str, str]], seq: int = 0):
+        """Swap in the re-read holdings of user_ids (and advance the watermark to seq)"""
+        with self._lock:
+            for user_id in user_ids:
+                self._remove_user(user_id)
+            self._add(rows)
+            self._seq = max(self._seq, seq)
+
+    def refresh_users(self, user_ids: Iterable[str]):
+        """Re-read the holdings of user_ids; call after committing writes to them"""
+        if self._built_at is None:
+            return  # nothing indexed yet; the first lookup reads everything
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return
+        self._replace_users(user_ids, self._read(user_ids))
+
+    def holdings_for(self, symbols: Iterable[str]) -> List[int]:
+        """Ids of every holding in any of symbols"""
+        self._ensure_current()
+        with self._lock:
+            return [holding_id for symbol in symbols for holding_id in self._by_symbol.get(symbol, ())]
+
+    def holders(self, symbol: str) -> Set[str]:
+        """Users holding symbol"""
+        self._ensure_current()
+        with self._lock:
+            return {self._holdings[holding_id][0] for holding_id in self._by_symbol.get(symbol, ())}
+
+    def stats(self) -> Dict[str, object]:
+        """Size and age of the index"""
+        with self._lock:
+            return {
+                'built': self._built_at is not None,
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+                'symbols': len(self._by_symbol),
+                'holdings': len(self._holdings),
+                'users': len(self._by_user),
+                'change_seq': self._seq
+            }
+
+
+_holdings_index = HoldingsIndex()
+
+
+def get_holdings_index() -> HoldingsIndex:
+    """The process-wide reverse index over the portal database"""
+    return _holdings_index
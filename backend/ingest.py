@@ -0,0 +1,294 @@
+"""
+Incremental Reference-Data Ingest
+Diffs the InvestorRefData, ProductMarketData and MasterAllocationModel files (Excel or CSV)
+against the current rows by key and upserts only what changed, in batched transactions.
+Holdings, logs and everything else in the database are left untouched.
+
+Run from the backend directory: python ingest.py [--dry-run] [--delete-missing] [--revalue] [dataset=path ...]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+import pandas as pd
+
+from db import get_db_connection
+from migrations import apply_migrations
+from portfolio_snapshot import refresh_portfolio_snapshots
+from revaluation import revalue_holdings
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INGEST_BATCH_SIZE = 500  # changed rows written per transaction
+
+
+@dataclass
+class IngestDataset:
+    """A reference table fed from a file whose columns map positionally onto `columns`"""
+    table: str
+    columns: List[str]
+    key: List[str]
+    default_file: str
+    refresh_snapshots: bool = False  # investor targets feed the portfolio snapshot drift
+    # (table, column) still referencing a row's first key column; such rows are never deleted
+    referenced_by: Optional[Tuple[str, str]] = None
+
+
+DATASETS: Dict[str, IngestDataset] = {
+    'investors': IngestDataset(
+        table='investor_ref_data',
+        columns=['user_id', 'full_name', 'age', 'city', 'risk_capacity', 'spending_score',
+                 'annual_income', 'investor_category', 'asset_allocation_model',
+                 'equities_percent', 'bonds_percent', 'cash_percent', 'alternatives_percent',
+                 'investment_preference_sectors', 'rebalancing_frequency',
+                 'last_rebalancing_date', 'variation_limit'],
+        key=['user_id'],
+        default_file='InvestorRefData.xlsx',
+        refresh_snapshots=True,
+        referenced_by=('user_holdings', 'user_id')
+    ),
+    'products': IngestDataset(
+        table='product_market_data',
+        columns=['investment_type', 'industry_sector', 'market_segment',
+                 'investment_strategies', 'investment_product', 'symbol', 'market_price_usd'],
+        key=['investment_type', 'industry_sector', 'symbol'],
+        default_file='ProductMarketData.xlsx'
+    ),
+    'models': IngestDataset(
+        table='MasterAllocationModel',
+        columns=['category', 'model_no', 'model_type', 'model_desc', 'equities',
+                 'domestic_equities', 'emerging_market', 'bonds', 'cash_cash_equivalents',
+                 'alternative_investments'],
+        key=['category', 'model_no'],
+        default_file='MasterAllocationModel.xlsx'
+    )
+}
+
+
+def _normalize(value):
+    """Coerce a spreadsheet cell to what SQLite stores (NaN -> None, dates -> ISO text)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if hasattr(value, 'item'):  # numpy scalars
+        return value.item()
+    return value
+
+
+def read_source(path: str, dataset: IngestDataset) -> List[Tuple]:
+    """Rows of an Excel or CSV file as tuples in dataset.columns order"""
+    if path.lower().endswith('.csv'):
+        frame = pd.read_csv(path)
+    else:
+        frame = pd.read_excel(path)
+    if len(frame.columns) != len(dataset.columns):
+        raise ValueError(f'{os.path.basename(path)} has {len(frame.columns)} columns, '
+                         f'expected {len(dataset.columns)} for {dataset.table}')
+    return [tuple(_normalize(value) for value in row) for row in frame.itertuples(index=False, name=None)]
+
+
+def load_current(cursor, dataset: IngestDataset) -> List[Tuple[int, Tuple]]:
+    """Current rows as (row id, values in dataset.columns order), oldest first"""
+    cursor.execute(f"SELECT id, {', '.join(dataset.columns)} FROM {dataset.table} ORDER BY id")
+    return [(row[0], tuple(row[1:])) for row in cursor.fetchall()]
+
+
+def diff_rows(current: List[Tuple[int, Tuple]], incoming: List[Tuple], dataset: IngestDataset,
+              delete_missing: bool = False) -> Dict[str, Any]:
+    """Split incoming rows into inserts, updates (values + row id) and deletes (row ids) by key.
+
+    Rows whose key is absent from the file are listed in `missing` and only deleted with
+    delete_missing.
+    """
+    key_positions = [dataset.columns.index(column) for column in dataset.key]
+
+    # A key repeated in the file keeps its last row
+    incoming_by_key = {}
+    for row in incoming:
+        incoming_by_key[tuple(row[i] for i in key_positions)] = row
+
+    # A key repeated in the table keeps its oldest row; the copies are deleted
+    current_by_key = {}
+    deletes = []
+    missing = []
+    for row_id, values in current:
+        key = tuple(values[i] for i in key_positions)
+        if key in current_by_key:
+            deletes.append((row_id,))
+        elif key not in incoming_by_key:
+            missing.append((row_id,))
+        else:
+            current_by_key[key] = (row_id, values)
+
+    inserts = []
+    updates = []
+    unchanged = 0
+    for key, row in incoming_by_key.items():
+        existing = current_by_key.get(key)
+        if existing is None:
+            inserts.append(row)
+        elif existing[1] != row:
+            updates.append(row + (existing[0],))
+        else:
+            unchanged += 1
+
+    return {
+        'inserts': inserts,
+        'updates': updates,
+        'deletes': deletes + missing if delete_missing else deletes,
+        'missing': missing,
+        'unchanged': unchanged,
+        'duplicates': len(incoming) - len(incoming_by_key)
+    }
+
+
+def protect_referenced(cursor, dataset: IngestDataset, diff: Dict[str, Any]) -> int:
+    """Drop deletes of missing rows that other tables still reference; returns how many were kept"""
+    missing = {row_id for (row_id,) in diff['missing']}
+    candidates = [row_id for (row_id,) in diff['deletes'] if row_id in missing]
+    if dataset.referenced_by is None or not candidates:
+        return 0
+    table, column = dataset.referenced_by
+    key = dataset.key[0]
+    cursor.execute(f'''
+        SELECT id FROM {dataset.table}
+        WHERE id IN (SELECT value FROM json_each(?))
+          AND {key} IN (SELECT {column} FROM {table})
+    ''', (json.dumps(candidates),))
+    referenced = {row[0] for row in cursor.fetchall()}
+    diff['deletes'] = [row for row in diff['deletes'] if row[0] not in referenced]
+    return len(referenced)
+
+
+def _batches(rows: List[Tuple], size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def apply_diff(conn, dataset: IngestDataset, diff: Dict[str, Any], batch_size: int = INGEST_BATCH_SIZE):
+    """Write a diff in batches, one BEGIN IMMEDIATE transaction per batch"""
+    columns = dataset.columns
+    key_positions = [columns.index(column) for column in dataset.key]
+    insert_sql = (f"INSERT INTO {dataset.table} ({', '.join(columns)}) "
+                  f"VALUES ({', '.join('?' * len(columns))})")
+    update_sql = f"UPDATE {dataset.table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+    delete_sql = f'DELETE FROM {dataset.table} WHERE id = ?'
+
+    work = ([(delete_sql, batch) for batch in _batches(diff['deletes'], batch_size)] +
+            [(update_sql, batch) for batch in _batches(diff['updates'], batch_size)] +
+            [(insert_sql, batch) for batch in _batches(diff['inserts'], batch_size)])
+
+    cursor = conn.cursor()
+    for sql, batch in work:
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if dataset.refresh_snapshots and sql == delete_sql:
+                ids = [row_id for (row_id,) in batch]
+                cursor.execute(f"SELECT user_id FROM {dataset.table} WHERE id IN ({', '.join('?' * len(ids))})", ids)
+                user_ids = [row[0] for row in cursor.fetchall()]
+            elif dataset.refresh_snapshots:
+                user_ids = [row[key_positions[0]] for row in batch]
+            cursor.executemany(sql, batch)
+            if dataset.refresh_snapshots:
+                refresh_portfolio_snapshots(cursor, user_ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def record_ingest(conn, dataset: IngestDataset, source: str, counts: Dict[str, int]):
+    """Append the run to ingest_log"""
+    conn.execute('''
+        INSERT INTO ingest_log (table_name, source_file, inserted, updated, deleted, unchanged)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (dataset.table, os.path.basename(source), counts['inserted'], counts['updated'],
+          counts['deleted'], counts['unchanged']))
+    conn.commit()
+
+
+def ingest_dataset(conn, name: str, path: Optional[str] = None, delete_missing: bool = False,
+                   dry_run: bool = False, batch_size: int = INGEST_BATCH_SIZE) -> Dict[str, int]:
+    """Sync one dataset's table with its source file; returns inserted/updated/deleted/unchanged counts.
+
+    Rows absent from the file are kept unless delete_missing; even then, investors that still
+    have holdings are kept (counted in `protected`).
+    """
+    dataset = DATASETS[name]
+    path = path or os.path.join(BASE_PATH, dataset.default_file)
+
+    incoming = read_source(path, dataset)
+    diff = diff_rows(load_current(conn.cursor(), dataset), incoming, dataset, delete_missing)
+    protected = protect_referenced(conn.cursor(), dataset, diff)
+
+    counts = {
+        'inserted': len(diff['inserts']),
+        'updated': len(diff['updates']),
+        'deleted': len(diff['deletes']),
+        'missing': len(diff['missing']),
+        'protected': protected,
+        'unchanged': diff['unchanged'],
+        'duplicates': diff['duplicates']
+    }
+    if not dry_run:
+        apply_diff(conn, dataset, diff, batch_size)
+        record_ingest(conn, dataset, path, counts)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally sync reference tables from Excel/CSV files')
+    parser.add_argument('sources', nargs='*', metavar='dataset=path',
+                        help=f"files to ingest, e.g. products=ProductMarketData.csv (datasets: {', '.join(DATASETS)}); "
+                             'defaults to the Excel files in the project root')
+    parser.add_argument('--dry-run', action='store_true', help='report the counts without writing')
+    parser.add_argument('--delete-missing', action='store_true',
+                        help='delete rows absent from the file (investors with holdings are always kept)')
+    parser.add_argument('--revalue', action='store_true', help='mark holdings to the new prices afterwards')
+    args = parser.parse_args()
+
+    sources = {}
+    for source in args.sources:
+        name, _, path = source.partition('=')
+        if name not in DATASETS or not path:
+            parser.error(f'expected dataset=path with dataset in {", ".join(DATASETS)}, got {source}')
+        sources[name] = path
+    if not sources:
+        sources = {name: None for name, dataset in DATASETS.items()
+                   if os.path.exists(os.path.join(BASE_PATH, dataset.default_file))}
+
+    conn = get_db_connection()
+    try:
+        apply_migrations(conn)
+        for name, path in sources.items():
+            counts = ingest_dataset(conn, name, path, delete_missing=args.delete_missing, dry_run=args.dry_run)
+            print(f"{'🔎' if args.dry_run else '✅'} {DATASETS[name].table}: "
+                  f"{counts['inserted']} inserted, {counts['updated']} updated, "
+                  f"{counts['deleted']} deleted, {counts['unchanged']} unchanged")
+            if counts['protected']:
+                print(f"⚠️ {counts['protected']} rows not in the {name} file still have holdings and were kept")
+            elif counts['missing'] and not args.delete_missing:
+                print(f"ℹ️ {counts['missing']} rows not in the {name} file were kept (--delete-missing removes them)")
+            if counts['duplicates']:
+                print(f"⚠️ {counts['duplicates']} duplicate keys in the {name} file (last row kept)")
+        if args.revalue:
+            result = revalue_holdings(conn, dry_run=args.dry_run)
+            print(f"{'🔎' if args.dry_run else '✅'} user_holdings: {result['holdings_revalued']} revalued "
+                  f"for {result['users_affected']} investors")
+    except Exception as e:
+        print(f"❌ Ingest failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Intent Router
+Routes an AI assistant chat message to an agent with a single pass of one compiled regex
+over every registered agent's keywords, instead of one substring scan per keyword. The
+keywords are compiled as a trie (shared prefixes factored out), so the cost per character
+stays flat as agents and vocabulary are added.
+Each keyword hit scores a point for the agents that registered it; the highest score
+wins and ties go to the agent registered first.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+# handler(user_id, message) -> response text
+IntentHandler = Callable[[str, str], str]
+
+
+@dataclass
+class Intent:
+    name: str
+    keywords: List[str]
+    handler: Optional[IntentHandler] = None
+
+
+def trie_pattern(keywords: List[str]) -> str:
+    """A regex matching any of keywords (longest first), with common prefixes factored out"""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}  # end of a keyword
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        ends_here = '' in node
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        # Greedy optional group: the longer keyword wins, falling back to the one ending here
+        return f"(?:{'|'.join(branches)}){'?' if ends_here else ''}"
+
+    return build(trie)
+
+
+class IntentRouter:
+    """Keyword-scored intent matching over one lazily compiled pattern of all keywords"""
+
+    def __init__(self, default_intent: str = 'general', default_handler: Optional[IntentHandler] = None):
+        self.default = Intent(default_intent, [], default_handler)
+        self._intents: List[Intent] = []
+        # (pattern, keyword -> intent positions, intents), swapped in whole so readers never see a mix
+        self._compiled: Optional[Tuple[Pattern, Dict[str, List[int]], List[Intent]]] = None
+
+    def register(self, name: str, keywords: List[str], handler: Optional[IntentHandler] = None):
+        """Add an intent (or replace the keywords and handler of an existing one)"""
+        intent = Intent(name, [keyword.lower() for keyword in keywords], handler)
+        for position, existing in enumerate(self._intents):
+            if existing.name == name:
+                self._intents[position] = intent
+                break
+        else:
+            self._intents.append(intent)
+        self._compiled = None  # recompiled on the next match
+
+    def intents(self) -> List[str]:
+        """Registered intent names in tie-break order"""
+        return [intent.name for intent in self._intents]
+
+    def _compile(self) -> Tuple[Pattern, Dict[str, List[int]], List[Intent]]:
+        intents = list(self._intents)
+        keyword_intents: Dict[str, List[int]] = {}
+        for position, intent in enumerate(intents):
+            for keyword in intent.keywords:
+                keyword_intents.setdefault(keyword, []).append(position)
+        pattern = re.compile(trie_pattern(list(keyword_intents)) if keyword_intents else '(?!)')
+        self._compiled = (pattern, keyword_intents, intents)
+        return self._compiled
+
+    def _hits(self, message: str) -> Tuple[List[int], List[Intent]]:
+        pattern, keyword_intents, intents = self._compiled or self._compile()
+        hits = [0] * len(intents)
+        for keyword in pattern.findall(message.lower()):
+            for position in keyword_intents[keyword]:
+                hits[position] += 1
+        return hits, intents
+
+    def scores(self, message: str) -> Dict[str, int]:
+        """Keyword hits per intent (substring matches, case-insensitive); intents without hits are omitted"""
+        hits, intents = self._hits(message)
+        return {intent.name: count for intent, count in zip(intents, hits) if count}
+
+    def match(self, message: str) -> Intent:
+        """The best scoring intent, or the default intent when no keyword matches"""
+        hits, intents = self._hits(message)
+        best = max(hits, default=0)
+        return intents[hits.index(best)] if best else self.default
+
+    def route(self, user_id: str, message: str) -> Tuple[str, str]:
+        """(intent name, handler response) for a message"""
+        intent = self.match(message)
+        handler = intent.handler or self.default.handler
+        return intent.name, handler(user_id, message)
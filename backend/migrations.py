@@ -0,0 +1,447 @@
+"""
+Schema Migrations
+Versioned DDL for the portfolio database, applied in order and recorded in schema_migrations
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+from portfolio_snapshot import refresh_portfolio_snapshots
+
+# A migration step is either a SQL statement or a callable that receives the cursor
+MigrationStep = Union[str, Callable[[sqlite3.Cursor], None]]
+
+
+def _add_column_if_missing(table: str, column: str, definition: str) -> Callable[[sqlite3.Cursor], None]:
+    """Build a step that adds a column unless an older setup already created it"""
+    def step(cursor):
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+
+# Version 1 is the schema database_setup.py used to create with DROP TABLE/CREATE TABLE,
+# plus the log tables the routes created on demand. IF NOT EXISTS lets it adopt existing databases.
+BASELINE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS investor_ref_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        age INTEGER,
+        city TEXT,
+        risk_capacity TEXT,
+        spending_score TEXT,
+        annual_income REAL,
+        investor_category TEXT,
+        asset_allocation_model TEXT,
+        equities_percent REAL,
+        bonds_percent REAL,
+        cash_percent REAL,
+        alternatives_percent REAL,
+        investment_preference_sectors TEXT,
+        rebalancing_frequency TEXT,
+        last_rebalancing_date DATE,
+        variation_limit REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS portfolios_cur_allocation (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        total_investment_amount REAL,
+        equities_percent REAL,
+        bonds_percent REAL,
+        cash_percent REAL,
+        alternatives_percent REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS product_market_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        investment_type TEXT,
+        industry_sector TEXT,
+        market_segment TEXT,
+        investment_strategies TEXT,
+        investment_product TEXT,
+        symbol TEXT,
+        market_price_usd REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS MasterAllocationModel (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT,
+        model_no INTEGER,
+        model_type TEXT,
+        model_desc TEXT,
+        equities REAL,
+        domestic_equities REAL,
+        emerging_market REAL,
+        bonds REAL,
+        cash_cash_equivalents REAL,
+        alternative_investments REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_holdings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        fund_symbol TEXT NOT NULL,
+        fund_name TEXT NOT NULL,
+        asset_class TEXT NOT NULL,
+        units_held REAL NOT NULL,
+        current_price REAL NOT NULL,
+        invested_amount REAL NOT NULL,
+        current_value REAL NOT NULL,
+        return_percent REAL,
+        performance_rating TEXT,
+        risk_rating TEXT,
+        expense_ratio REAL,
+        last_updated DATE DEFAULT CURRENT_DATE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS funds_universe (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fund_symbol TEXT UNIQUE NOT NULL,
+        fund_name TEXT NOT NULL,
+        asset_class TEXT NOT NULL,
+        category TEXT,
+        fund_manager TEXT,
+        current_price REAL NOT NULL,
+        returns_1year REAL,
+        returns_3year REAL,
+        returns_5year REAL,
+        expense_ratio REAL,
+        risk_rating TEXT,
+        performance_rating TEXT,
+        min_investment REAL DEFAULT 1000,
+        is_recommended BOOLEAN DEFAULT 0,
+        sector_focus TEXT,
+        market_cap_focus TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rebalancing_scenarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        scenario_name TEXT NOT NULL,
+        asset_class TEXT NOT NULL,
+        action_type TEXT NOT NULL,
+        sell_fund_symbol TEXT,
+        sell_amount REAL,
+        buy_fund_symbol TEXT,
+        buy_amount REAL,
+        expected_return REAL,
+        risk_score INTEGER,
+        scenario_desc TEXT,
+        created_date DATE DEFAULT CURRENT_DATE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS custom_rebalancing_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        execution_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        total_sell_amount REAL,
+        total_buy_amount REAL,
+        num_sells INTEGER,
+        num_buys INTEGER,
+        status TEXT DEFAULT 'completed'
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS behavioral_coaching (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        life_event TEXT,
+        timeline TEXT,
+        financial_impact TEXT,
+        risk_change TEXT,
+        current_emotion TEXT,
+        market_outlook TEXT,
+        decision_style TEXT,
+        recent_behavior TEXT,
+        event_details TEXT,
+        insights_json TEXT,
+        recommendations_json TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rebalancing_executions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        execution_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        scenario_type TEXT,
+        life_event TEXT,
+        old_allocation_json TEXT,
+        new_allocation_json TEXT,
+        emotional_impact TEXT,
+        status TEXT DEFAULT 'completed'
+    )
+    '''
+]
+
+# Indexes for the hot read paths: holdings by user (and user + fund), fund screens by
+# asset class / rating, and the per-user lookups on the reference tables
+HOT_PATH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_user_holdings_user_fund ON user_holdings (user_id, fund_symbol)',
+    # Covers the per-user aggregates (drift, totals, monitoring) without touching the table rows
+    '''CREATE INDEX IF NOT EXISTS idx_user_holdings_user_alloc
+       ON user_holdings (user_id, asset_class, current_value, return_percent, performance_rating)''',
+    'CREATE INDEX IF NOT EXISTS idx_funds_universe_class_rating ON funds_universe (asset_class, performance_rating, returns_1year)',
+    'CREATE INDEX IF NOT EXISTS idx_funds_universe_rating ON funds_universe (performance_rating, returns_1year)',
+    'CREATE INDEX IF NOT EXISTS idx_investor_ref_data_user ON investor_ref_data (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_portfolios_cur_allocation_user ON portfolios_cur_allocation (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_master_allocation_model_type ON MasterAllocationModel (model_type)',
+    'CREATE INDEX IF NOT EXISTS idx_behavioral_coaching_user ON behavioral_coaching (user_id, analysis_date)'
+]
+
+# One row per investor, maintained by portfolio_snapshot.refresh_portfolio_snapshots
+PORTFOLIO_SNAPSHOT_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS portfolio_snapshot (
+        user_id TEXT PRIMARY KEY,
+        holdings_count INTEGER NOT NULL DEFAULT 0,
+        total_value REAL NOT NULL DEFAULT 0,
+        avg_return REAL,
+        equity_value REAL NOT NULL DEFAULT 0,
+        bond_value REAL NOT NULL DEFAULT 0,
+        cash_value REAL NOT NULL DEFAULT 0,
+        alt_value REAL NOT NULL DEFAULT 0,
+        equity_drift REAL NOT NULL DEFAULT 0,
+        bond_drift REAL NOT NULL DEFAULT 0,
+        cash_drift REAL NOT NULL DEFAULT 0,
+        alt_drift REAL NOT NULL DEFAULT 0,
+        poor_performer_count INTEGER NOT NULL DEFAULT 0,
+        poor_performer_avg_return REAL,
+        volatile_count INTEGER NOT NULL DEFAULT 0,
+        high_risk_count INTEGER NOT NULL DEFAULT 0,
+        very_high_risk_value REAL NOT NULL DEFAULT 0,
+        high_risk_value REAL NOT NULL DEFAULT 0,
+        medium_risk_value REAL NOT NULL DEFAULT 0,
+        low_risk_value REAL NOT NULL DEFAULT 0,
+        very_low_risk_value REAL NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Keyset pages of the table APIs walk these in their default order (the rowid tiebreak is implicit)
+TABLE_PAGING_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_product_market_data_type ON product_market_data (investment_type)',
+    'CREATE INDEX IF NOT EXISTS idx_master_allocation_model_category ON MasterAllocationModel (category, model_no)'
+]
+
+# One row per incremental ingest run (see ingest.py)
+INGEST_LOG_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        source_file TEXT,
+        inserted INTEGER NOT NULL DEFAULT 0,
+        updated INTEGER NOT NULL DEFAULT 0,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        unchanged INTEGER NOT NULL DEFAULT 0,
+        ingested_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Tables whose writes invalidate cached API responses (see table_versions.py)
+VERSIONED_TABLES = [
+    'investor_ref_data',
+    'portfolios_cur_allocation',
+    'product_market_data',
+    'MasterAllocationModel',
+    'user_holdings',
+    'funds_universe'
+]
+
+TABLE_VERSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# AI assistant chat history, read newest-first per user (see chat_history.py)
+CHAT_MESSAGES_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        agent_type TEXT,
+        created_at TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages (user_id, id)'
+]
+
+# Incremental monitoring sweeps read the snapshots refreshed since a watermark
+SNAPSHOT_UPDATED_INDEX = 'CREATE INDEX IF NOT EXISTS idx_portfolio_snapshot_updated ON portfolio_snapshot (updated_at)'
+
+# Daily closing price per fund, the input of the risk engine's covariance matrix (see
+# risk_engine.py); seeded with today's prices so the first returns appear tomorrow
+FUND_PRICE_HISTORY_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS fund_price_history (
+        fund_symbol TEXT NOT NULL,
+        price_date DATE NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (price_date, fund_symbol)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    INSERT OR IGNORE INTO fund_price_history (fund_symbol, price_date, price)
+    SELECT fund_symbol, CURRENT_DATE, current_price FROM funds_universe WHERE current_price > 0
+    '''
+]
+
+
+# Users whose set of holdings changed, stamped with a global sequence number; the holdings
+# reverse index of every process catches up from its last seen seq (see holdings_index.py).
+# Price-only updates (revaluation, ticks) do not touch it. One row per user keeps it bounded.
+_STAMP_HOLDINGS_CHANGE = '''
+        INSERT INTO holdings_changes (user_id, seq)
+        VALUES ({user}.user_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM holdings_changes))
+        ON CONFLICT (user_id) DO UPDATE SET seq = excluded.seq;
+'''
+
+HOLDINGS_CHANGES_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS holdings_changes (
+        user_id TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_holdings_changes_seq ON holdings_changes (seq)',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_user_holdings_changes_insert
+    AFTER INSERT ON user_holdings
+    BEGIN{_STAMP_HOLDINGS_CHANGE.format(user='NEW')}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_user_holdings_changes_delete
+    AFTER DELETE ON user_holdings
+    BEGIN{_STAMP_HOLDINGS_CHANGE.format(user='OLD')}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_user_holdings_changes_update
+    AFTER UPDATE OF user_id, fund_symbol ON user_holdings
+    BEGIN{_STAMP_HOLDINGS_CHANGE.format(user='OLD')}{_STAMP_HOLDINGS_CHANGE.format(user='NEW')}    END
+    '''
+]
+
+def _version_triggers(cursor):
+    """Seed table_versions and bump a table's row on every insert, update and delete"""
+    for table in VERSIONED_TABLES:
+        cursor.execute('INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)', (table,))
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_version_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE table_versions
+                    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE table_name = '{table}';
+                END
+            ''')
+
+
+# Marking holdings to market rewrites only these columns, often on most of the table in one
+# statement; such writes bump user_holdings' version once per statement themselves (see
+# revaluation.reprice_staged) instead of once per row from the trigger
+HOLDINGS_PRICE_COLUMNS = ('current_price', 'current_value', 'return_percent', 'last_updated')
+
+
+def _holdings_version_trigger_skips_price_writes(cursor):
+    """Fire user_holdings' update version trigger only for updates of non-price columns"""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(user_holdings)').fetchall()
+               if row[1] not in HOLDINGS_PRICE_COLUMNS]
+    cursor.execute('DROP TRIGGER IF EXISTS trg_user_holdings_version_update')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_user_holdings_version_update
+        AFTER UPDATE OF {', '.join(columns)} ON user_holdings
+        BEGIN
+            UPDATE table_versions
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = 'user_holdings';
+        END
+    ''')
+
+
+# (version, name, steps) - append new migrations, never edit applied ones
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, 'baseline schema', BASELINE_SCHEMA),
+    (2, 'hot path indexes', HOT_PATH_INDEXES),
+    (3, 'portfolio last rebalance date', [
+        _add_column_if_missing('portfolios_cur_allocation', 'last_rebalance_date', 'DATETIME')
+    ]),
+    (4, 'portfolio snapshot', [
+        PORTFOLIO_SNAPSHOT_SCHEMA,
+        refresh_portfolio_snapshots  # backfill from the current holdings
+    ]),
+    (5, 'table paging indexes', TABLE_PAGING_INDEXES),
+    (6, 'ingest log', [INGEST_LOG_SCHEMA]),
+    (7, 'table versions', [TABLE_VERSIONS_SCHEMA, _version_triggers]),
+    (8, 'chat messages', CHAT_MESSAGES_SCHEMA),
+    (9, 'snapshot updated index', [SNAPSHOT_UPDATED_INDEX]),
+    (10, 'fund price history', FUND_PRICE_HISTORY_SCHEMA),
+    (11, 'holdings change log', HOLDINGS_CHANGES_SCHEMA),
+    (12, 'per-statement holdings price versions', [_holdings_version_trigger_skips_price_writes])
+]
+
+
+def get_schema_version(conn) -> int:
+    """Highest migration version applied to this database (0 for a fresh one)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    cursor.execute('SELECT MAX(version) FROM schema_migrations')
+    return cursor.fetchone()[0] or 0
+
+
+def apply_migrations(conn, verbose: bool = True) -> List[int]:
+    """Apply every pending migration, each in its own transaction; returns the versions applied"""
+    current_version = get_schema_version(conn)
+    applied = []
+
+    for version, name, steps in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Another process may have migrated while we waited for the write lock
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                conn.commit()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        if verbose:
+            print(f"✅ Applied migration {version}: {name}")
+
+    return applied
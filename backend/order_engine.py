@@ -0,0 +1,186 @@
+"""
+Order Application Engine
+Applies a batch of buy/sell orders to a user's holdings: one read, in-memory position
+updates, and batched writes inside a single BEGIN IMMEDIATE transaction
+"""
+
+import json
+from typing import List, Dict, Any
+
+from portfolio_snapshot import refresh_portfolio_snapshots
+
+# Holdings and fund rows for every symbol in the batch, fetched in one round-trip.
+# The symbol list is bound as a JSON array so the statement text never changes.
+LOAD_POSITIONS_QUERY = '''
+    SELECT
+        s.value as symbol,
+        h.id as holding_id,
+        h.units_held,
+        h.current_price,
+        h.invested_amount,
+        h.current_value,
+        f.fund_symbol as fund_symbol,
+        f.fund_name,
+        f.asset_class,
+        f.current_price as fund_price,
+        f.performance_rating,
+        f.risk_rating,
+        f.expense_ratio
+    FROM (SELECT DISTINCT value FROM json_each(?)) s
+    LEFT JOIN user_holdings h ON h.user_id = ? AND h.fund_symbol = s.value
+    LEFT JOIN funds_universe f ON f.fund_symbol = s.value
+    ORDER BY h.id
+'''
+
+
+def _load_positions(cursor, user_id: str, symbols: List[str]):
+    """Return (holdings by symbol, funds by symbol) for the symbols in the batch"""
+    holdings = {}
+    funds = {}
+    cursor.execute(LOAD_POSITIONS_QUERY, (json.dumps(symbols), user_id))
+    for row in cursor.fetchall():
+        symbol = row['symbol']
+        # Keep the oldest row if a user somehow holds the same fund twice
+        if row['holding_id'] is not None and symbol not in holdings:
+            holdings[symbol] = {
+                'id': row['holding_id'],
+                'units_held': row['units_held'],
+                'current_price': row['current_price'],
+                'invested_amount': row['invested_amount'],
+                'current_value': row['current_value'],
+                'status': 'unchanged'
+            }
+        if row['fund_symbol'] is not None:
+            funds[symbol] = row
+    return holdings, funds
+
+
+def apply_orders(conn, user_id: str, sell_orders: List[Dict[str, Any]],
+                 buy_orders: List[Dict[str, Any]], mark_rebalanced: bool = False) -> Dict[str, Any]:
+    """Apply sell orders then buy orders for one user and log the execution.
+
+    Each order is a dict with 'fund_symbol' and 'amount' (in dollars). Sells of funds the
+    user does not hold and buys of funds missing from funds_universe are skipped.
+    mark_rebalanced also stamps investor_ref_data.last_rebalancing_date in the same transaction.
+    """
+    symbols = [order['fund_symbol'] for order in sell_orders] + [order['fund_symbol'] for order in buy_orders]
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        holdings, funds = _load_positions(cursor, user_id, symbols)
+
+        total_sell_amount = 0
+        total_buy_amount = 0
+
+        # Execute sell orders against the in-memory positions
+        for sell_order in sell_orders:
+            holding = holdings.get(sell_order['fund_symbol'])
+            if not holding or holding['status'] == 'deleted':
+                continue
+
+            sell_amount = sell_order['amount']
+            new_value = max(0, holding['current_value'] - sell_amount)
+            new_units = new_value / holding['current_price'] if holding['current_price'] > 0 else 0
+            new_invested = holding['invested_amount'] * (new_value / holding['current_value']) if holding['current_value'] > 0 else 0
+
+            holding['current_value'] = new_value
+            holding['units_held'] = new_units
+            holding['invested_amount'] = new_invested
+            if new_value <= 0:
+                holding['status'] = 'deleted'
+            elif holding['status'] == 'unchanged':
+                holding['status'] = 'updated'
+
+            total_sell_amount += sell_amount
+
+        # Execute buy orders, topping up open positions or opening new ones
+        for buy_order in buy_orders:
+            fund_symbol = buy_order['fund_symbol']
+            fund_info = funds.get(fund_symbol)
+            if not fund_info:
+                continue
+
+            buy_amount = buy_order['amount']
+            new_units = buy_amount / fund_info['fund_price']
+            holding = holdings.get(fund_symbol)
+
+            if holding and holding['status'] != 'deleted':
+                holding['current_value'] += buy_amount
+                holding['units_held'] += new_units
+                holding['invested_amount'] += buy_amount
+                if holding['status'] == 'unchanged':
+                    holding['status'] = 'updated'
+            else:
+                holdings[fund_symbol] = {
+                    'id': holding['id'] if holding else None,
+                    'units_held': new_units,
+                    'current_price': fund_info['fund_price'],
+                    'invested_amount': buy_amount,
+                    'current_value': buy_amount,
+                    'fund_info': fund_info,
+                    # A sold-out position bought back in the same batch is replaced by a fresh row
+                    'status': 'reopened' if holding else 'new'
+                }
+
+            total_buy_amount += buy_amount
+
+        # Write every changed position back in batches
+        updates = []
+        deletes = []
+        inserts = []
+        for fund_symbol, holding in holdings.items():
+            if holding['status'] == 'updated':
+                updates.append((holding['current_value'], holding['units_held'], holding['invested_amount'], holding['id']))
+            elif holding['status'] == 'deleted':
+                deletes.append((holding['id'],))
+            elif holding['status'] in ('new', 'reopened'):
+                if holding['status'] == 'reopened':
+                    deletes.append((holding['id'],))
+                fund_info = holding['fund_info']
+                inserts.append((user_id, fund_symbol, fund_info['fund_name'], fund_info['asset_class'],
+                                holding['units_held'], holding['current_price'], holding['invested_amount'],
+                                holding['current_value'], fund_info['performance_rating'],
+                                fund_info['risk_rating'], fund_info['expense_ratio']))
+
+        if updates:
+            cursor.executemany('''
+                UPDATE user_holdings
+                SET current_value = ?, units_held = ?, invested_amount = ?
+                WHERE id = ?
+            ''', updates)
+        if deletes:
+            cursor.executemany('DELETE FROM user_holdings WHERE id = ?', deletes)
+        if inserts:
+            cursor.executemany('''
+                INSERT INTO user_holdings
+                (user_id, fund_symbol, fund_name, asset_class, units_held, current_price,
+                 invested_amount, current_value, return_percent, performance_rating, risk_rating, expense_ratio)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+            ''', inserts)
+
+        refresh_portfolio_snapshots(cursor, [user_id])
+
+        # Log the custom rebalancing action
+        cursor.execute('''
+            INSERT INTO custom_rebalancing_log
+            (user_id, total_sell_amount, total_buy_amount, num_sells, num_buys)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, total_sell_amount, total_buy_amount, len(sell_orders), len(buy_orders)))
+
+        if mark_rebalanced:
+            cursor.execute('''
+                UPDATE investor_ref_data SET last_rebalancing_date = DATE('now') WHERE user_id = ?
+            ''', (user_id,))
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'total_sell_amount': total_sell_amount,
+        'total_buy_amount': total_buy_amount,
+        'net_change': total_buy_amount - total_sell_amount,
+        'num_sells': len(sell_orders),
+        'num_buys': len(buy_orders)
+    }
@@ -0,0 +1,102 @@
+"""
+Portfolio Snapshots
+One precomputed row per investor (asset-class totals, drift, performance and risk summary)
+kept current by the write paths, so readers never re-aggregate user_holdings
+"""
+
+import json
+from typing import List, Optional
+
+# (risk_rating, snapshot column) in reporting order
+RISK_LEVELS = [
+    ('Very High', 'very_high_risk_value'),
+    ('High', 'high_risk_value'),
+    ('Medium', 'medium_risk_value'),
+    ('Low', 'low_risk_value'),
+    ('Very Low', 'very_low_risk_value')
+]
+
+POOR_RATINGS = "('Poor', 'Below Average')"
+VOLATILE_RETURN_PERCENT = -15
+
+
+def _drift_sql(value_column: str, target_column: str) -> str:
+    # Same arithmetic as the drift engine: |value / total * 100 - target|, 0 with no holdings
+    return (f'CASE WHEN h.total_value > 0 '
+            f'THEN ABS(h.{value_column} / h.total_value * 100 - COALESCE(ir.{target_column}, 0)) ELSE 0 END')
+
+
+REFRESH_QUERY = f'''
+    INSERT OR REPLACE INTO portfolio_snapshot (
+        user_id, holdings_count, total_value, avg_return,
+        equity_value, bond_value, cash_value, alt_value,
+        equity_drift, bond_drift, cash_drift, alt_drift,
+        poor_performer_count, poor_performer_avg_return, volatile_count, high_risk_count,
+        {', '.join(column for _, column in RISK_LEVELS)}
+    )
+    SELECT
+        ir.user_id,
+        COALESCE(h.holdings_count, 0),
+        COALESCE(h.total_value, 0),
+        h.avg_return,
+        COALESCE(h.equity_value, 0),
+        COALESCE(h.bond_value, 0),
+        COALESCE(h.cash_value, 0),
+        COALESCE(h.alt_value, 0),
+        {_drift_sql('equity_value', 'equities_percent')},
+        {_drift_sql('bond_value', 'bonds_percent')},
+        {_drift_sql('cash_value', 'cash_percent')},
+        {_drift_sql('alt_value', 'alternatives_percent')},
+        COALESCE(h.poor_performer_count, 0),
+        h.poor_performer_avg_return,
+        COALESCE(h.volatile_count, 0),
+        COALESCE(h.high_risk_count, 0),
+        {', '.join(f'COALESCE(h.{column}, 0)' for _, column in RISK_LEVELS)}
+    FROM investor_ref_data ir
+    LEFT JOIN (
+        SELECT
+            user_id,
+            COUNT(fund_symbol) as holdings_count,
+            SUM(current_value) as total_value,
+            AVG(return_percent) as avg_return,
+            SUM(CASE WHEN asset_class = 'Equity' THEN current_value ELSE 0 END) as equity_value,
+            SUM(CASE WHEN asset_class = 'Bond' THEN current_value ELSE 0 END) as bond_value,
+            SUM(CASE WHEN asset_class = 'Cash' THEN current_value ELSE 0 END) as cash_value,
+            SUM(CASE WHEN asset_class = 'Alternative' THEN current_value ELSE 0 END) as alt_value,
+            SUM(CASE WHEN performance_rating IN {POOR_RATINGS} THEN 1 ELSE 0 END) as poor_performer_count,
+            AVG(CASE WHEN performance_rating IN {POOR_RATINGS} THEN return_percent END) as poor_performer_avg_return,
+            SUM(CASE WHEN return_percent < {VOLATILE_RETURN_PERCENT} THEN 1 ELSE 0 END) as volatile_count,
+            SUM(CASE WHEN risk_rating IN ('High', 'Very High') THEN 1 ELSE 0 END) as high_risk_count,
+            {', '.join(f"SUM(CASE WHEN risk_rating = '{level}' THEN current_value ELSE 0 END) as {column}"
+                       for level, column in RISK_LEVELS)}
+        FROM user_holdings
+        {{holdings_where}}
+        GROUP BY user_id
+    ) h ON h.user_id = ir.user_id
+    {{where}}
+'''
+
+
+def refresh_portfolio_snapshots(cursor, user_ids: Optional[List[str]] = None):
+    """Recompute the snapshot rows for user_ids (every investor when None).
+
+    Call inside the transaction that changed the holdings or targets so readers never
+    see a snapshot that disagrees with user_holdings.
+    """
+    if user_ids is None:
+        cursor.execute('DELETE FROM portfolio_snapshot')
+        cursor.execute(REFRESH_QUERY.format(holdings_where='', where=''))
+        return
+
+    users_json = json.dumps(list(user_ids))
+    cursor.execute('DELETE FROM portfolio_snapshot WHERE user_id IN (SELECT value FROM json_each(?))', (users_json,))
+    cursor.execute(REFRESH_QUERY.format(
+        holdings_where='WHERE user_id IN (SELECT value FROM json_each(?))',
+        where='WHERE ir.user_id IN (SELECT value FROM json_each(?))'
+    ), (users_json, users_json))
+
+
+def get_portfolio_snapshot(cursor, user_id: str):
+    """The snapshot row for one investor, or None"""
+    cursor.execute('SELECT * FROM portfolio_snapshot WHERE user_id = ?', (user_id,))
+    return cursor.fetchone()
@@ -0,0 +1,253 @@
+"""
+Price Tick Ingest
+Applies fund price updates as they arrive: each micro-batch updates the quoted price in
+funds_universe and product_market_data, reprices just the holdings the reverse index maps
+to those symbols (by row id, no user_holdings scan), refreshes the affected portfolio
+snapshots and records the prices as today's close, all in one transaction.
+
+Ticks are "SYMBOL,price" or {"symbol": ..., "price": ...} lines. Run from the backend directory:
+    python price_ticks.py --file ticks.csv [--follow]    # a local feed file, optionally tailed
+    python price_ticks.py --listen 127.0.0.1:9100        # newline-delimited ticks over TCP
+"""
+
+import argparse
+import json
+import math
+import queue
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import get_db_connection
+from holdings_index import HoldingsIndex, get_holdings_index
+from migrations import apply_migrations
+from revaluation import record_price_history, refresh_affected_snapshots, reprice_staged, stage_prices
+
+TICK_BATCH_SIZE = 500        # ticks applied per transaction
+TICK_BATCH_WAIT_SECONDS = 0.2  # longest a tick waits for its batch to fill
+FOLLOW_POLL_SECONDS = 0.5
+
+Tick = Tuple[str, float]
+
+
+def make_tick(symbol, price) -> Tick:
+    """A validated (SYMBOL, price) tick; raises ValueError for a missing symbol or a price that is not finite and positive"""
+    symbol = str(symbol or '').strip().upper()
+    price = float(price)
+    if not symbol or not (price > 0 and math.isfinite(price)):
+        raise ValueError(f'Invalid tick: {symbol or "(no symbol)"} at {price}')
+    return symbol, price
+
+
+def parse_tick(line: str) -> Optional[Tick]:
+    """(symbol, price) from one feed line, or None for blank lines and comments"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        data = json.loads(line)
+        return make_tick(data.get('symbol'), data.get('price'))
+    symbol, _, price = line.partition(',')
+    return make_tick(symbol, price)
+
+
+def apply_ticks(conn, ticks: Iterable[Tick], index: Optional[HoldingsIndex] = None) -> Dict[str, Any]:
+    """Apply one micro-batch of ticks (the last price per symbol wins)"""
+    prices = dict(ticks)
+    if not prices:
+        return {'symbols': 0, 'holdings_repriced': 0, 'users_affected': 0, 'user_ids': []}
+
+    holding_ids = (index or get_holdings_index()).holdings_for(prices)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        stage_prices(cursor, prices)
+        record_price_history(cursor)
+        # Keep the price sources current, so new buys and a later full revaluation agree
+        cursor.execute('''
+            UPDATE funds_universe AS f SET current_price = p.price
+            FROM temp.revaluation_prices p
+            WHERE p.symbol = f.fund_symbol AND f.current_price IS NOT p.price
+        ''')
+        cursor.execute('''
+            UPDATE product_market_data AS m SET market_price_usd = p.price
+            FROM temp.revaluation_prices p
+            WHERE p.symbol = m.symbol AND m.market_price_usd IS NOT p.price
+        ''')
+        owners = reprice_staged(cursor, holding_ids) if holding_ids else []
+        user_ids = list(dict.fromkeys(owners))
+        refresh_affected_snapshots(cursor, user_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'symbols': len(prices),
+        'holdings_repriced': len(owners),
+        'users_affected': len(user_ids),
+        'user_ids': user_ids
+    }
+
+
+class TickIngestor:
+    """Queues ticks from any number of feeds and applies them in micro-batches on one thread"""
+
+    def __init__(self, db_path: Optional[str] = None, index: Optional[HoldingsIndex] = None,
+                 batch_size: int = TICK_BATCH_SIZE, batch_wait_seconds: float = TICK_BATCH_WAIT_SECONDS,
+                 on_batch=None):
+        self.db_path = db_path
+        self.index = index
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.on_batch = on_batch  # called with each batch's result
+        self._ticks: 'queue.Queue[Tick]' = queue.Queue()
+        self._counters = {'received': 0, 'rejected': 0, 'applied': 0, 'batches': 0,
+                          'holdings_repriced': 0, 'failed_batches': 0}
+        self._last_batch_ms: Optional[float] = None
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit_line(self, line: str):
+        """Parse and queue one feed line; malformed lines are counted and dropped"""
+        try:
+            tick = parse_tick(line)
+        except (ValueError, TypeError, AttributeError):
+            with self._lock:
+                self._counters['rejected'] += 1
+            return
+        if tick is not None:
+            self.submit([tick])
+
+    def submit(self, ticks: List[Tick]):
+        with self._lock:
+            self._counters['received'] += len(ticks)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._apply_loop, name='price-ticks', daemon=True)
+                self._worker.start()
+        for tick in ticks:
+            self._ticks.put(tick)
+
+    def _next_batch(self) -> List[Tick]:
+        batch = [self._ticks.get()]
+        deadline = time.monotonic() + self.batch_wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._ticks.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply_loop(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            conn = None
+            try:
+                conn = get_db_connection(self.db_path)
+                result = apply_ticks(conn, batch, self.index)
+                with self._lock:
+                    self._counters['applied'] += len(batch)
+                    self._counters['batches'] += 1
+                    self._counters['holdings_repriced'] += result['holdings_repriced']
+                    self._last_batch_ms = (time.perf_counter() - started) * 1000
+                if self.on_batch:
+                    self.on_batch(result)
+            except Exception as e:
+                print(f"⚠️ Could not apply {len(batch)} price ticks: {e}")
+                with self._lock:
+                    self._counters['failed_batches'] += 1
+            finally:
+                if conn is not None:
+                    conn.close()
+                for _ in batch:
+                    self._ticks.task_done()
+
+    def flush(self):
+        """Block until every queued tick has been applied"""
+        self._ticks.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                'queued': self._ticks.qsize(),
+                'last_batch_ms': round(self._last_batch_ms, 2) if self._last_batch_ms is not None else None
+            }
+
+
+def read_feed_file(path: str, ingestor: TickIngestor, follow: bool = False):
+    """Queue every tick in a feed file; with follow, keep tailing it for appended lines"""
+    with open(path, 'r', encoding='utf-8') as feed:
+        partial = ''
+        while True:
+            line = feed.readline()
+            if line:
+                partial += line
+                if partial.endswith('\n'):
+                    ingestor.submit_line(partial)
+                    partial = ''
+            elif follow:
+                time.sleep(FOLLOW_POLL_SECONDS)  # wait for the feed to append (or finish a line)
+            else:
+                if partial:
+                    ingestor.submit_line(partial)
+                return
+
+
+def serve_feed_socket(host: str, port: int, ingestor: TickIngestor) -> socketserver.ThreadingTCPServer:
+    """A TCP server queueing newline-delimited ticks from any number of feed connections"""
+
+    class TickHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                ingestor.submit_line(raw.decode('utf-8', errors='replace'))
+
+    server = socketserver.ThreadingTCPServer((host, port), TickHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply streaming fund price ticks to user holdings')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help='feed file of SYMBOL,price or JSON lines')
+    source.add_argument('--listen', metavar='HOST:PORT', help='accept newline-delimited ticks over TCP')
+    parser.add_argument('--follow', action='store_true', help='keep tailing --file for new ticks')
+    parser.add_argument('--batch-size', type=int, default=TICK_BATCH_SIZE, help='ticks per transaction')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    apply_migrations(conn)
+    conn.close()
+
+    def report(result):
+        print(f"✅ {result['symbols']} prices: {result['holdings_repriced']} holdings of "
+              f"{result['users_affected']} investors repriced")
+
+    ingestor = TickIngestor(batch_size=args.batch_size, on_batch=report)
+    try:
+        if args.file:
+            read_feed_file(args.file, ingestor, follow=args.follow)
+            ingestor.flush()
+        else:
+            host, _, port = args.listen.rpartition(':')
+            with serve_feed_socket(host or '127.0.0.1', int(port), ingestor) as server:
+                print(f"🎯 Listening for price ticks on {host or '127.0.0.1'}:{port}")
+                server.serve_forever()
+    except KeyboardInterrupt:
+        ingestor.flush()
+    except Exception as e:
+        print(f"❌ Price tick ingest failed: {e}")
+        sys.exit(1)
+    stats = ingestor.stats()
+    print(f"🎯 {stats['applied']} ticks applied in {stats['batches']} batches, {stats['rejected']} rejected")
+
+
+if __name__ == "__main__":
+    main()
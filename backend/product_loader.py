@@ -0,0 +1,113 @@
+"""
+Streaming Product Loader
+Reads ProductMarketData from a workbook (openpyxl read-only mode) or a CSV file in
+fixed-size row chunks and inserts each chunk into product_market_data, so peak memory
+stays flat however many securities the vendor file holds
+"""
+
+import csv
+import os
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+# Source columns, in file order
+PRODUCT_COLUMNS = [
+    'investment_type', 'industry_sector', 'market_segment',
+    'investment_strategies', 'investment_product', 'symbol', 'market_price_usd'
+]
+DEFAULT_CHUNK_ROWS = 5000
+
+INSERT_PRODUCT_QUERY = f'''
+    INSERT INTO product_market_data ({', '.join(PRODUCT_COLUMNS)})
+    VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))})
+'''
+
+# Called after every chunk with (rows loaded so far, total data rows or None when unknown)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def _xlsx_rows(path: str) -> Tuple[Iterator[tuple], Optional[int], Callable[[], None]]:
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    sheet = workbook.active
+    # max_row comes from the sheet's dimension record and may be missing
+    total = sheet.max_row - 1 if sheet.max_row else None
+    return sheet.iter_rows(min_row=2, values_only=True), total, workbook.close
+
+
+def _csv_rows(path: str) -> Tuple[Iterator[tuple], Optional[int], Callable[[], None]]:
+    handle = open(path, newline='', encoding='utf-8-sig')
+    reader = csv.reader(handle)
+    next(reader, None)  # header
+    return (tuple(row) for row in reader), None, handle.close
+
+
+def iter_row_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Tuple[List[tuple], Optional[int]]]:
+    """Yield (chunk of raw data rows, total data rows or None) from an .xlsx or .csv file"""
+    opener = _csv_rows if path.lower().endswith('.csv') else _xlsx_rows
+    rows, total, close = opener(path)
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk, total
+                chunk = []
+        if chunk:
+            yield chunk, total
+    finally:
+        close()
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        return str(value)
+    return value if value.strip() else None
+
+
+def _price(value) -> Optional[float]:
+    if isinstance(value, str):
+        value = value.replace(',', '').replace('$', '').strip()
+        if not value:
+            return None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def coerce_product_rows(chunk: List[tuple]) -> List[tuple]:
+    """Typed product rows (text columns + REAL price) from raw rows; blank rows are dropped"""
+    width = len(PRODUCT_COLUMNS)
+    blank = (None,) * width
+    coerced = []
+    for row in chunk:
+        if len(row) != width:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+        values = tuple(map(_text, row[:-1])) + (_price(row[-1]),)
+        if values != blank:
+            coerced.append(values)
+    return coerced
+
+
+def load_product_market_data(cursor, path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                             progress: Optional[ProgressCallback] = None) -> int:
+    """Append every product in the file to product_market_data, one executemany per chunk.
+
+    Runs inside the caller's transaction; returns the number of rows inserted.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    loaded = 0
+    for chunk, total in iter_row_chunks(path, chunk_rows):
+        rows = coerce_product_rows(chunk)
+        cursor.executemany(INSERT_PRODUCT_QUERY, rows)
+        loaded += len(rows)
+        if progress:
+            progress(loaded, total)
+    return loaded
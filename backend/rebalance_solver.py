@@ -0,0 +1,265 @@
+"""
+Minimum-Turnover Rebalancing Solver
+Computes the smallest set of trades that brings every asset class back inside its band
+(target weight ± the investor's variation_limit) instead of all the way to target.
+Overweight classes are trimmed to the top of their band and underweight classes topped up
+to the bottom of it; because sells must fund buys, any imbalance between the two is
+settled in the classes with the most room towards their target. The class-level solve is
+one set of array operations for the whole book, so a batch costs little more than one
+portfolio.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MIN_TRADE_AMOUNT = 1.0          # smaller asset-class gaps are left alone
+DEFAULT_VARIATION_LIMIT = 5.0   # band (percentage points) for investors without a variation_limit
+
+# investor_ref_data target column for each holdings asset class, in solver column order
+TARGET_COLUMNS = {
+    'Equity': 'equities_percent',
+    'Bond': 'bonds_percent',
+    'Cash': 'cash_percent',
+    'Alternative': 'alternatives_percent'
+}
+ASSET_CLASSES = list(TARGET_COLUMNS)
+
+# MasterAllocationModel fraction column for each asset class, used when the investor's
+# asset_allocation_model names a model
+MODEL_COLUMNS = {
+    'Equity': 'equities',
+    'Bond': 'bonds',
+    'Cash': 'cash_cash_equivalents',
+    'Alternative': 'alternative_investments'
+}
+
+# Same scoring as get_buy_priority in app.py
+BUY_RATING_SCORES = {'Excellent': 10, 'Good': 8, 'Average': 5, 'Below Average': 3, 'Poor': 1}
+
+def holding_priority(performance_rating: Optional[str], returns: Optional[float]) -> float:
+    """Buy priority of a fund or holding; the lowest are sold first"""
+    return BUY_RATING_SCORES.get(performance_rating, 5) + (returns or 0) * 0.2
+
+
+def load_best_funds(conn) -> Dict[str, Dict[str, Any]]:
+    """Highest buy-priority fund in each asset class: asset class -> {fund_symbol, fund_name}"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT fund_symbol, fund_name, asset_class, performance_rating, returns_1year
+        FROM funds_universe
+        ORDER BY id
+    ''')
+    best = {}
+    for row in cursor.fetchall():
+        priority = holding_priority(row['performance_rating'], row['returns_1year'])
+        if row['asset_class'] not in best or priority > best[row['asset_class']][0]:
+            best[row['asset_class']] = (priority, {'fund_symbol': row['fund_symbol'], 'fund_name': row['fund_name']})
+    return {asset_class: fund for asset_class, (_, fund) in best.items()}
+
+
+@dataclass
+class SolverBook:
+    """Targets and holdings for many users; user i's holdings are rows offsets[i]:offsets[i + 1]"""
+    user_ids: List[str]
+    class_values: np.ndarray   # (users, classes) current value per asset class
+    total_values: np.ndarray   # (users,) every holding, including unclassified ones
+    targets: np.ndarray        # (users, classes) target weight in percent
+    bands: np.ndarray          # (users,) allowed drift in percentage points
+    offsets: np.ndarray
+    fund_symbols: List[str]
+    fund_names: List[str]
+    holding_classes: List[str]
+    holding_values: List[float]
+    holding_priorities: List[float]
+
+
+def load_solver_book(conn, user_ids: Optional[List[str]] = None) -> SolverBook:
+    """Targets, bands and holdings for user_ids (every investor when None).
+
+    Targets come from the investor's MasterAllocationModel row when asset_allocation_model
+    names one, else from investor_ref_data.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples, unpacked positionally below
+    where, params = '', ()
+    if user_ids is not None:
+        where, params = 'WHERE user_id IN (SELECT value FROM json_each(?))', (json.dumps(list(user_ids)),)
+
+    models = {}
+    cursor.execute(f"SELECT model_type, {', '.join(MODEL_COLUMNS.values())} FROM MasterAllocationModel ORDER BY id")
+    for model_type, *fractions in cursor.fetchall():
+        models.setdefault(model_type, [(fraction or 0) * 100 for fraction in fractions])
+
+    cursor.execute(f'''
+        SELECT user_id, asset_allocation_model, variation_limit, {', '.join(TARGET_COLUMNS.values())}
+        FROM investor_ref_data {where}
+        ORDER BY user_id
+    ''', params)
+    book_users, targets, bands = [], [], []
+    for user_id, model_type, variation_limit, *investor_targets in cursor.fetchall():
+        if book_users and book_users[-1] == user_id:
+            continue
+        book_users.append(user_id)
+        targets.append(models.get(model_type) or [target or 0 for target in investor_targets])
+        bands.append(DEFAULT_VARIATION_LIMIT if variation_limit is None else variation_limit)
+
+    # One scan of the holdings, bucketed by owner in id order
+    holdings_by_user = {user_id: [] for user_id in book_users}
+    cursor.execute(f'''
+        SELECT user_id, fund_symbol, fund_name, asset_class, current_value, performance_rating, return_percent
+        FROM user_holdings {where}
+        ORDER BY id
+    ''', params)
+    for row in cursor.fetchall():
+        holdings = holdings_by_user.get(row[0])
+        if holdings is not None:
+            holdings.append(row)
+    rows = [row for user_id in book_users for row in holdings_by_user[user_id]]
+    counts = [len(holdings_by_user[user_id]) for user_id in book_users]
+
+    class_index = {asset_class: c for c, asset_class in enumerate(ASSET_CLASSES)}
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    owner = np.repeat(np.arange(len(book_users)), counts)
+    columns = np.array([class_index.get(row[3], -1) for row in rows], dtype=np.int64)
+    values = np.array([row[4] or 0 for row in rows], dtype=float)
+    classified = columns >= 0
+    class_values = np.zeros((len(book_users), len(ASSET_CLASSES)))
+    np.add.at(class_values, (owner[classified], columns[classified]), values[classified])
+
+    return SolverBook(
+        user_ids=book_users,
+        class_values=class_values,
+        total_values=np.bincount(owner, weights=values, minlength=len(book_users)),
+        targets=np.array(targets, dtype=float).reshape(len(book_users), len(ASSET_CLASSES)),
+        bands=np.array(bands, dtype=float),
+        offsets=offsets,
+        fund_symbols=[row[1] for row in rows],
+        fund_names=[row[2] for row in rows],
+        holding_classes=[row[3] for row in rows],
+        holding_values=values.tolist(),
+        holding_priorities=[holding_priority(row[5], row[6]) for row in rows]
+    )
+
+
+def _fill(remaining: np.ndarray, room: np.ndarray) -> np.ndarray:
+    """Spread each user's remaining amount over their classes in proportion to room, capped at room"""
+    total_room = room.sum(axis=1)
+    share = np.divide(remaining, total_room, out=np.zeros_like(remaining), where=total_room > 0)
+    return room * np.minimum(share, 1)[:, None]
+
+
+def solve_class_values(class_values: np.ndarray, total_values: np.ndarray, targets: np.ndarray,
+                       bands: np.ndarray, buyable: np.ndarray) -> np.ndarray:
+    """Post-trade value of every asset class for every user, with minimum turnover.
+
+    buyable[c] is False for classes without a fund to buy; those can only shrink. Where the
+    bands cannot all be met (targets not summing to 100, nothing to buy) the nearest
+    self-financing allocation is returned. Targets are shares of total_values, which also
+    counts holdings outside the asset classes; those are never traded.
+    """
+    target_values = targets / 100 * total_values[:, None]
+    band_values = (bands / 100 * total_values)[:, None]
+    upper = np.where(buyable, target_values + band_values, np.minimum(target_values + band_values, class_values))
+    lower = np.minimum(np.maximum(target_values - band_values, 0), upper)
+
+    # Every class to its nearest band edge; sells and buys then differ by `imbalance`
+    solved = np.clip(class_values, lower, upper)
+    imbalance = class_values.sum(axis=1) - solved.sum(axis=1)
+
+    # Surplus sale proceeds buy more, first towards target, then up to the band edge, and
+    # whatever is left is simply not sold; a shortfall is raised the same way in reverse
+    surplus = np.maximum(imbalance, 0)
+    for room in (lambda: np.clip(np.minimum(target_values, upper) - solved, 0, None),
+                 lambda: np.clip(upper - solved, 0, None),
+                 lambda: np.clip(class_values - solved, 0, None)):
+        allocated = _fill(surplus, room())
+        solved += allocated
+        surplus -= allocated.sum(axis=1)
+
+    shortfall = np.maximum(-imbalance, 0)
+    for room in (lambda: np.clip(solved - np.maximum(target_values, lower), 0, None),
+                 lambda: np.clip(solved - lower, 0, None),
+                 lambda: np.clip(solved - class_values, 0, None)):
+        allocated = _fill(shortfall, room())
+        solved -= allocated
+        shortfall -= allocated.sum(axis=1)
+
+    return solved
+
+
+def _weights(values: np.ndarray, total_values: np.ndarray) -> List[Dict[str, float]]:
+    """Per-user {asset_class: percent of total value}, rounded to 2 places"""
+    safe_totals = np.where(total_values > 0, total_values, np.inf)[:, None]
+    return [dict(zip(ASSET_CLASSES, weights)) for weights in np.round(values / safe_totals * 100, 2).tolist()]
+
+
+def solve_min_turnover(book: SolverBook, buy_candidates: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Minimum-turnover trade plans for every user in the book: {user_id: plan}.
+
+    Each plan's sells and buys are {'fund_symbol', 'amount', ...} orders ready for
+    order_engine.apply_orders. Within an asset class the lowest-priority holdings are sold
+    first, so a trim touches as few positions as possible; buys go to the class's best fund.
+    """
+    buyable = np.array([asset_class in buy_candidates for asset_class in ASSET_CLASSES])
+    solved = solve_class_values(book.class_values, book.total_values, book.targets, book.bands, buyable)
+    trades = solved - book.class_values
+    trades[np.abs(trades) < MIN_TRADE_AMOUNT] = 0
+
+    proposed_values = book.class_values + trades
+    safe_totals = np.where(book.total_values > 0, book.total_values, 1)[:, None]
+    final_drift = np.abs(proposed_values / safe_totals * 100 - book.targets)
+    within_band = ((final_drift <= book.bands[:, None] + 0.01).all(axis=1) | (book.total_values <= 0)).tolist()
+
+    current = _weights(book.class_values, book.total_values)
+    proposed = _weights(proposed_values, book.total_values)
+    turnover = np.round(np.abs(trades).sum(axis=1), 2).tolist()
+    total_values = np.round(book.total_values, 2).tolist()
+    bands = book.bands.tolist()
+    targets = book.targets.tolist()
+    offsets = book.offsets.tolist()
+
+    plans = {}
+    for u, user_id in enumerate(book.user_ids):
+        sells, buys = [], []
+        for c, amount in enumerate(trades[u].tolist()):
+            asset_class = ASSET_CLASSES[c]
+            if amount < 0:
+                # Worst holdings first, each sold out before the next is touched
+                positions = sorted((h for h in range(offsets[u], offsets[u + 1])
+                                    if book.holding_classes[h] == asset_class),
+                                   key=book.holding_priorities.__getitem__)
+                to_sell = -amount
+                for h in positions:
+                    if to_sell < MIN_TRADE_AMOUNT:
+                        break
+                    sell = min(to_sell, book.holding_values[h])
+                    sells.append({'fund_symbol': book.fund_symbols[h], 'fund_name': book.fund_names[h],
+                                  'asset_class': asset_class, 'amount': round(sell, 2)})
+                    to_sell -= sell
+            elif amount > 0:
+                fund = buy_candidates[asset_class]
+                buys.append({'fund_symbol': fund['fund_symbol'], 'fund_name': fund['fund_name'],
+                             'asset_class': asset_class, 'amount': round(amount, 2)})
+
+        plans[user_id] = {
+            'user_id': user_id,
+            'total_value': total_values[u],
+            'variation_limit': bands[u],
+            'target': dict(zip(ASSET_CLASSES, targets[u])),
+            'current': current[u],
+            'proposed': proposed[u],
+            'within_band': within_band[u],
+            'turnover': turnover[u],
+            'sells': sells,
+            'buys': buys
+        }
+    return plans
+
+
+def solve_rebalancing(conn, user_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Load and solve minimum-turnover plans for user_ids (the whole book when None)"""
+    book = load_solver_book(conn, user_ids)
+    return solve_min_turnover(book, load_best_funds(conn))
@@ -0,0 +1,193 @@
+"""
+Mark-to-Market Revaluation
+Reprices user_holdings from the latest fund prices in one set-based UPDATE. Only holdings
+whose price actually moved are written; their current_value and return_percent are
+recomputed, the portfolio snapshots of the affected users refreshed and the prices recorded
+as today's close in fund_price_history, all in the same transaction.
+
+Run from the backend directory: python revaluation.py [--dry-run] [--sources funds,market]
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from db import get_db_connection
+from migrations import apply_migrations
+from portfolio_snapshot import refresh_portfolio_snapshots
+
+# Price feeds by name, each yielding (symbol, price) newest first; a symbol takes its price
+# from the first source in the requested order that quotes it
+PRICE_SOURCES = {
+    'funds': '''
+        SELECT fund_symbol, current_price FROM funds_universe
+        WHERE current_price > 0
+    ''',
+    'market': '''
+        SELECT symbol, market_price_usd FROM product_market_data
+        WHERE symbol IS NOT NULL AND market_price_usd > 0
+        ORDER BY id DESC
+    '''
+}
+# funds_universe is the price buys are executed at, so it wins where both quote a symbol
+DEFAULT_PRICE_SOURCES = ('funds', 'market')
+
+# Past this share of investors affected, one full snapshot rebuild beats a keyed refresh
+FULL_SNAPSHOT_REFRESH_SHARE = 0.5
+
+# Every holding whose price moved, repriced in one statement; the owners come back via RETURNING
+REVALUE_QUERY = '''
+    UPDATE user_holdings AS h
+    SET current_price = p.price,
+        current_value = h.units_held * p.price,
+        return_percent = CASE
+            WHEN h.invested_amount > 0
+            THEN ROUND((h.units_held * p.price - h.invested_amount) * 100.0 / h.invested_amount, 2)
+            ELSE h.return_percent
+        END,
+        last_updated = CURRENT_DATE
+    FROM temp.revaluation_prices p
+    WHERE p.symbol = h.fund_symbol AND h.current_price IS NOT p.price {holdings_filter}
+    RETURNING user_id
+'''
+
+
+def _book_value(cursor) -> float:
+    cursor.execute('SELECT COALESCE(SUM(total_value), 0) FROM portfolio_snapshot')
+    return cursor.fetchone()[0]
+
+
+def _create_price_table(cursor):
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS revaluation_prices (
+            symbol TEXT PRIMARY KEY,
+            price REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('DELETE FROM temp.revaluation_prices')
+
+
+def _load_prices(cursor, sources: Sequence[str]) -> int:
+    """Fill temp.revaluation_prices with one price per symbol; returns the symbol count"""
+    _create_price_table(cursor)
+    for source in sources:
+        # OR IGNORE keeps the first price seen per symbol: earlier sources, then newer rows
+        cursor.execute(f'INSERT OR IGNORE INTO temp.revaluation_prices (symbol, price) {PRICE_SOURCES[source]}')
+    cursor.execute('SELECT COUNT(*) FROM temp.revaluation_prices')
+    return cursor.fetchone()[0]
+
+
+def stage_prices(cursor, prices: Dict[str, float]):
+    """Fill temp.revaluation_prices with explicit symbol -> price quotes"""
+    _create_price_table(cursor)
+    cursor.executemany('INSERT INTO temp.revaluation_prices (symbol, price) VALUES (?, ?)', prices.items())
+
+
+def record_price_history(cursor):
+    """Record the staged prices as today's close in fund_price_history"""
+    cursor.execute('''
+        INSERT INTO fund_price_history (fund_symbol, price_date, price)
+        SELECT symbol, CURRENT_DATE, price FROM temp.revaluation_prices WHERE true
+        ON CONFLICT (price_date, fund_symbol) DO UPDATE SET price = excluded.price
+    ''')
+
+
+def reprice_staged(cursor, holding_ids: Optional[List[int]] = None) -> List[str]:
+    """Reprice holdings from temp.revaluation_prices (only holding_ids when given); one owner per holding changed"""
+    if holding_ids is None:
+        cursor.execute(REVALUE_QUERY.format(holdings_filter=''))
+    else:
+        cursor.execute(REVALUE_QUERY.format(holdings_filter='AND h.id IN (SELECT value FROM json_each(?))'),
+                       (json.dumps(holding_ids),))
+    owners = [row[0] for row in cursor.fetchall()]
+    if owners:
+        # Price-only updates skip the per-row version trigger (migration 12); bump it once here
+        cursor.execute('''
+            UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = 'user_holdings'
+        ''')
+    return owners
+
+
+def refresh_affected_snapshots(cursor, user_ids: List[str]):
+    """Refresh the snapshots of user_ids, rebuilding them all when most of the book is affected"""
+    if not user_ids:
+        return
+    cursor.execute('SELECT COUNT(*) FROM investor_ref_data')
+    if len(user_ids) >= cursor.fetchone()[0] * FULL_SNAPSHOT_REFRESH_SHARE:
+        refresh_portfolio_snapshots(cursor)
+    else:
+        refresh_portfolio_snapshots(cursor, user_ids)
+
+
+def revalue_holdings(conn, sources: Sequence[str] = DEFAULT_PRICE_SOURCES, dry_run: bool = False) -> Dict[str, Any]:
+    """Mark every holding to its latest price.
+
+    Returns symbols priced, holdings revalued, the affected user ids and the book value
+    before and after. dry_run does the same work and rolls it back.
+    """
+    unknown = [source for source in sources if source not in PRICE_SOURCES]
+    if unknown or not sources:
+        raise ValueError(f"Unknown price source(s) {', '.join(unknown) or '(none)'}. "
+                         f"Available: {', '.join(PRICE_SOURCES)}")
+
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        symbols_priced = _load_prices(cursor, sources)
+        record_price_history(cursor)
+        value_before = _book_value(cursor)
+
+        owners = reprice_staged(cursor)
+        user_ids: List[str] = list(dict.fromkeys(owners))
+        refresh_affected_snapshots(cursor, user_ids)
+        value_after = _book_value(cursor)
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'symbols_priced': symbols_priced,
+        'holdings_revalued': len(owners),
+        'users_affected': len(user_ids),
+        'user_ids': user_ids,
+        'book_value_before': round(value_before, 2),
+        'book_value_after': round(value_after, 2),
+        'value_change': round(value_after - value_before, 2),
+        'dry_run': dry_run,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mark user holdings to their latest fund prices')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--sources', default=','.join(DEFAULT_PRICE_SOURCES),
+                        help=f"price sources in priority order (available: {', '.join(PRICE_SOURCES)})")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        apply_migrations(conn)
+        result = revalue_holdings(conn, args.sources.split(','), dry_run=args.dry_run)
+        print(f"{'🔎' if args.dry_run else '✅'} {result['holdings_revalued']} holdings of "
+              f"{result['users_affected']} investors revalued from {result['symbols_priced']} prices: "
+              f"book value ${result['book_value_before']:,.2f} -> ${result['book_value_after']:,.2f} "
+              f"in {result['seconds']}s")
+    except Exception as e:
+        print(f"❌ Revaluation failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
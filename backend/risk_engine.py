@@ -0,0 +1,309 @@
+"""
+Portfolio Risk Analytics
+Volatility, parametric value at risk and per-fund risk contributions from a fund-level
+covariance matrix of daily log returns in fund_price_history.
+
+The covariance is kept as running sums over the last COVARIANCE_WINDOW_DAYS complete days,
+so a refresh only reads the days recorded since the previous one. Fund pairs with too
+little shared history fall back to a volatility from the fund's risk_rating and an
+asset-class correlation. Portfolio figures for any number of users come from one matrix
+product of the (users x funds) position values with the covariance.
+"""
+
+import datetime
+import json
+import math
+import threading
+import time
+from collections import deque
+from statistics import NormalDist
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from goal_projection import CORRELATIONS
+from rebalance_solver import ASSET_CLASSES
+
+COVARIANCE_WINDOW_DAYS = 252       # one year of trading days
+COVARIANCE_REFRESH_SECONDS = 60    # how often a lookup checks for newly completed days
+MIN_OBSERVATIONS = 20              # shared daily returns needed to trust an estimated (co)variance
+TRADING_DAYS = 252
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_HORIZON_DAYS = 1
+TOP_CONTRIBUTORS = 5
+
+# Annual volatility assumed for funds without enough price history
+RATING_VOLATILITY = {'Very Low': 0.03, 'Low': 0.06, 'Medium': 0.12, 'High': 0.20, 'Very High': 0.30}
+DEFAULT_VOLATILITY = 0.15
+SAME_CLASS_CORRELATION = 0.85      # two funds of one asset class
+UNKNOWN_CLASS_CORRELATION = 0.5
+
+
+class FundCovariance:
+    """Rolling covariance of daily fund returns, updated one completed day at a time"""
+
+    def __init__(self, window_days: int = COVARIANCE_WINDOW_DAYS,
+                 refresh_seconds: float = COVARIANCE_REFRESH_SECONDS):
+        self.window_days = window_days
+        self.refresh_seconds = refresh_seconds
+        self.symbols: List[str] = []
+        self._columns: Dict[str, int] = {}
+        # Pairwise sums over the window: returns cross-products, returns of i where j is
+        # also priced, and the number of days both are priced
+        self._cross = np.zeros((0, 0))
+        self._sums = np.zeros((0, 0))
+        self._counts = np.zeros((0, 0))
+        self._days: Deque[Tuple[str, np.ndarray, np.ndarray]] = deque()  # (date, columns, returns)
+        self._last_prices: Dict[str, float] = {}
+        self._watermark = ''  # last price_date folded in
+        self._refreshed_at: Optional[float] = None
+        self._annualized: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _grow(self, symbols: Sequence[str]):
+        """Add columns for symbols not seen before (lock held)"""
+        new = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._columns]
+        if not new:
+            return
+        for symbol in new:
+            self._columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        pad = ((0, len(new)), (0, len(new)))
+        self._cross, self._sums, self._counts = (np.pad(m, pad) for m in (self._cross, self._sums, self._counts))
+
+    def _accumulate(self, days: List[Tuple[str, np.ndarray, np.ndarray]], sign: int):
+        """Add (sign 1) or remove (sign -1) whole days from the running sums (lock held)"""
+        if not days:
+            return
+        returns = np.zeros((len(days), len(self.symbols)))
+        priced = np.zeros_like(returns)
+        for d, (_, columns, day_returns) in enumerate(days):
+            returns[d, columns] = day_returns
+            priced[d, columns] = 1
+        self._cross += sign * (returns.T @ returns)
+        self._sums += sign * (returns.T @ priced)
+        self._counts += sign * (priced.T @ priced)
+
+    def _read(self, conn) -> List[Tuple[str, str, float]]:
+        """Complete days of history after the watermark (the last window_days + 1 on the first read)"""
+        today = datetime.date.today().isoformat()
+        cursor = conn.cursor()
+        since = self._watermark
+        if not since:
+            cursor.execute('''
+                SELECT MIN(price_date) FROM (
+                    SELECT DISTINCT price_date FROM fund_price_history
+                    WHERE price_date < ? ORDER BY price_date DESC LIMIT ?
+                )
+            ''', (today, self.window_days + 1))
+            first = cursor.fetchone()[0]
+            if first is None:
+                return []
+            since = (datetime.date.fromisoformat(first) - datetime.timedelta(days=1)).isoformat()
+        cursor.execute('''
+            SELECT price_date, fund_symbol, price FROM fund_price_history
+            WHERE price_date > ? AND price_date < ? AND price > 0
+            ORDER BY price_date
+        ''', (since, today))
+        return [tuple(row) for row in cursor.fetchall()]
+
+    def refresh(self, conn, force: bool = False):
+        """Fold in the days completed since the last refresh (at most every refresh_seconds)"""
+        refreshed_at = self._refreshed_at
+        if not force and refreshed_at is not None and time.monotonic() - refreshed_at < self.refresh_seconds:
+            return
+        rows = self._read(conn)
+        with self._lock:
+            rows = [row for row in rows if row[0] > self._watermark]  # another thread may have got there first
+            self._grow([symbol for _, symbol, _ in rows])
+            new_days = []
+            for price_date, symbol, price in rows:
+                if not new_days or new_days[-1][0] != price_date:
+                    new_days.append((price_date, [], []))
+                previous = self._last_prices.get(symbol)
+                self._last_prices[symbol] = price
+                if previous:
+                    new_days[-1][1].append(self._columns[symbol])
+                    new_days[-1][2].append(math.log(price / previous))
+            new_days = [(price_date, np.array(columns, dtype=np.int64), np.array(returns))
+                        for price_date, columns, returns in new_days if columns]
+            self._days.extend(new_days)
+            dropped = [self._days.popleft() for _ in range(max(0, len(self._days) - self.window_days))]
+            self._accumulate(new_days, 1)
+            self._accumulate(dropped, -1)
+            if rows:
+                self._watermark = rows[-1][0]
+                self._annualized = None
+            self._refreshed_at = time.monotonic()
+
+    def rebuild(self, conn):
+        """Recompute from scratch, e.g. after price history was rewritten"""
+        with self._lock:
+            self.symbols, self._columns = [], {}
+            self._cross, self._sums, self._counts = np.zeros((0, 0)), np.zeros((0, 0)), np.zeros((0, 0))
+            self._days.clear()
+            self._last_prices, self._watermark, self._annualized = {}, '', None
+        self.refresh(conn, force=True)
+
+    def estimated(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Symbols, annualized covariance and the shared-day counts behind each entry"""
+        with self._lock:
+            if self._annualized is None:
+                counts = self._counts
+                safe = np.maximum(counts, 2)
+                centered = self._cross - self._sums * self._sums.T / safe
+                self._annualized = np.where(counts >= 2, centered / (safe - 1), 0) * TRADING_DAYS
+            return list(self.symbols), self._annualized, self._counts.copy()
+
+    def matrix(self, symbols: Sequence[str], asset_classes: Sequence[Optional[str]],
+               risk_ratings: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Annualized covariance for symbols, plus which of them have enough history of their own.
+
+        Pairs with fewer than MIN_OBSERVATIONS shared days use each fund's estimated
+        volatility (else its risk_rating's) and an asset-class correlation.
+        """
+        known, estimated, counts = self.estimated()
+        columns = {symbol: c for c, symbol in enumerate(known)}
+        index = np.array([columns.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        has_column = index >= 0
+        if known:
+            rows = np.where(has_column, index, 0)
+            pair_counts = np.where(np.outer(has_column, has_column), counts[np.ix_(rows, rows)], 0)
+            pair_estimates = estimated[np.ix_(rows, rows)]
+        else:
+            pair_counts = pair_estimates = np.zeros((len(symbols), len(symbols)))
+        has_history = np.diag(pair_counts) >= MIN_OBSERVATIONS
+
+        vols = np.array([RATING_VOLATILITY.get(rating, DEFAULT_VOLATILITY) for rating in risk_ratings])
+        vols = np.where(has_history, np.sqrt(np.clip(np.diag(pair_estimates), 0, None)), vols)
+        class_index = {asset_class: c for c, asset_class in enumerate(ASSET_CLASSES)}
+        classes = np.array([class_index.get(asset_class, -1) for asset_class in asset_classes], dtype=np.int64)
+        correlations = np.where(np.equal.outer(classes, classes), SAME_CLASS_CORRELATION,
+                                CORRELATIONS[np.ix_(np.maximum(classes, 0), np.maximum(classes, 0))])
+        unknown = classes < 0
+        correlations[unknown, :] = UNKNOWN_CLASS_CORRELATION
+        correlations[:, unknown] = UNKNOWN_CLASS_CORRELATION
+        np.fill_diagonal(correlations, 1)
+
+        covariance = np.where(pair_counts >= MIN_OBSERVATIONS, pair_estimates, correlations * np.outer(vols, vols))
+        return covariance, has_history
+
+    def stats(self) -> Dict[str, Any]:
+        """Window size and freshness of the estimate"""
+        with self._lock:
+            return {
+                'symbols': len(self.symbols),
+                'days': len(self._days),
+                'window_days': self.window_days,
+                'through': self._watermark or None,
+                'age_seconds': round(time.monotonic() - self._refreshed_at, 1) if self._refreshed_at is not None else None
+            }
+
+
+_fund_covariances: Dict[Optional[str], FundCovariance] = {}
+_fund_covariances_lock = threading.Lock()
+
+
+def get_fund_covariance(db_path: Optional[str] = None) -> FundCovariance:
+    """The process-wide covariance estimate for a database (the portal database by default)"""
+    with _fund_covariances_lock:
+        return _fund_covariances.setdefault(db_path, FundCovariance())
+
+
+def _load_positions(conn, user_ids: Optional[List[str]]):
+    """Position values as a (users x funds) matrix, with each fund's asset class and risk rating"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    where, params = '', ()
+    if user_ids is not None:
+        where, params = 'WHERE user_id IN (SELECT value FROM json_each(?))', (json.dumps(list(user_ids)),)
+    cursor.execute(f'SELECT user_id, fund_symbol, current_value FROM user_holdings {where}', params)
+    rows = cursor.fetchall()
+    if not rows:
+        return [], [], [], [], np.zeros((0, 0))
+
+    # funds_universe describes a fund; the holdings' own columns cover funds outside it
+    cursor.execute(f'''
+        SELECT fund_symbol, asset_class, risk_rating FROM funds_universe
+        UNION ALL
+        SELECT fund_symbol, asset_class, risk_rating FROM user_holdings
+        {where or 'WHERE true'} AND fund_symbol NOT IN (SELECT fund_symbol FROM funds_universe)
+    ''', params)
+    described = {}
+    for symbol, asset_class, risk_rating in cursor.fetchall():
+        described.setdefault(symbol, (asset_class, risk_rating))
+
+    holders, held_symbols, amounts = zip(*rows)
+    users, owner = np.unique(np.array(holders), return_inverse=True)
+    symbols, fund = np.unique(np.array(held_symbols), return_inverse=True)
+    values = np.zeros((len(users), len(symbols)))
+    np.add.at(values, (owner, fund), np.array([amount or 0 for amount in amounts], dtype=float))
+    symbols = symbols.tolist()
+    return (users.tolist(), symbols, [described[symbol][0] for symbol in symbols],
+            [described[symbol][1] for symbol in symbols], values)
+
+
+def portfolio_risk(conn, user_ids: Optional[List[str]] = None, confidence: float = DEFAULT_CONFIDENCE,
+                   horizon_days: int = DEFAULT_HORIZON_DAYS,
+                   covariance: Optional[FundCovariance] = None) -> Dict[str, Dict[str, Any]]:
+    """user_id -> volatility, parametric VaR and risk contributions for every holder (or just user_ids).
+
+    Volatility is annual; value_at_risk is the loss not exceeded with `confidence` over
+    horizon_days, assuming normally distributed returns with zero mean.
+    """
+    if not 0.5 <= confidence < 1:
+        raise ValueError('confidence must be between 0.5 and 1, e.g. 0.95')
+    if not 1 <= horizon_days <= TRADING_DAYS:
+        raise ValueError(f'horizon_days must be between 1 and {TRADING_DAYS}')
+    if user_ids is not None and not user_ids:
+        return {}
+
+    covariance = covariance or get_fund_covariance()
+    covariance.refresh(conn)
+    users, symbols, fund_classes, fund_ratings, values = _load_positions(conn, user_ids)
+    sigma, has_history = covariance.matrix(symbols, fund_classes, fund_ratings)
+
+    # Every portfolio at once: variance = rowsum((V Sigma) * V)
+    marginal = values @ sigma
+    variance = np.clip((marginal * values).sum(axis=1), 0, None)
+    volatility = np.sqrt(variance)
+    totals = values.sum(axis=1)
+    safe_totals = np.where(totals > 0, totals, np.inf)
+    contributions = values * marginal / np.where(variance > 0, variance, np.inf)[:, None]
+    z = NormalDist().inv_cdf(confidence)
+    value_at_risk = z * volatility * math.sqrt(horizon_days / TRADING_DAYS)
+    covered = (values * has_history).sum(axis=1) / safe_totals
+
+    # The largest contributors per user, picked and rounded for everyone at once
+    top = np.argsort(np.where(values != 0, -contributions, np.inf), axis=1)[:, :TOP_CONTRIBUTORS]
+    top_held = (np.take_along_axis(values, top, axis=1) != 0).tolist()
+    top_weights = np.round(np.take_along_axis(values, top, axis=1) / safe_totals[:, None] * 100, 2).tolist()
+    top_shares = np.round(np.take_along_axis(contributions, top, axis=1) * 100, 2).tolist()
+    safe_volatility = np.where(volatility > 0, volatility, np.nan)[:, None]
+    top_marginal = np.round(np.take_along_axis(marginal, top, axis=1) / safe_volatility, 4).tolist()
+    top = top.tolist()
+    columns = {
+        'total_value': np.round(totals, 2).tolist(),
+        'annual_volatility': np.round(volatility / safe_totals, 4).tolist(),
+        'annual_volatility_value': np.round(volatility, 2).tolist(),
+        'value_at_risk': np.round(value_at_risk, 2).tolist(),
+        'value_at_risk_percent': np.round(value_at_risk / safe_totals * 100, 2).tolist(),
+        'history_coverage': np.round(covered, 4).tolist()
+    }
+
+    results = {}
+    for u, user_id in enumerate(users):
+        results[user_id] = {
+            'user_id': user_id,
+            **{name: column[u] for name, column in columns.items()},
+            'confidence': confidence,
+            'horizon_days': horizon_days,
+            'risk_contributions': [{
+                'fund_symbol': symbols[f],
+                'weight': top_weights[u][k],
+                'risk_contribution': top_shares[u][k],
+                'marginal_volatility': None if math.isnan(top_marginal[u][k]) else top_marginal[u][k]
+            } for k, f in enumerate(top[u]) if top_held[u][k]]
+        }
+    return results
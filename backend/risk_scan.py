@@ -0,0 +1,86 @@
+"""
+Portfolio Risk Scan
+Concentration, high-risk-rating exposure and deep-loss alerts for any number of users from
+one pass over user_holdings, grouped by user. Portfolio totals and risk-level values come
+from portfolio_snapshot, so nothing is re-aggregated per user.
+"""
+
+import datetime
+from typing import Any, Dict, List, Optional
+
+CONCENTRATION_PERCENT = 30        # one holding above this share of the portfolio
+HIGH_RISK_EXPOSURE_PERCENT = 50   # High + Very High rated holdings above this share
+DEEP_LOSS_RETURN_PERCENT = -25    # a holding's return at or below this
+HIGH_RISK_RATINGS = "('High', 'Very High')"
+
+# Each holding with its portfolio weight and its owner's high-risk exposure; only rows
+# that trigger an alert leave the query
+RISK_SCAN_QUERY = f'''
+    SELECT h.user_id, h.fund_name, h.return_percent,
+           h.current_value * 100.0 / s.total_value as weight,
+           (s.high_risk_value + s.very_high_risk_value) * 100.0 / s.total_value as high_risk_exposure,
+           h.risk_rating IN {HIGH_RISK_RATINGS} as is_high_risk
+    FROM user_holdings h
+    JOIN portfolio_snapshot s ON s.user_id = h.user_id
+    WHERE (h.current_value * 100.0 > {CONCENTRATION_PERCENT} * s.total_value
+           OR h.return_percent <= {DEEP_LOSS_RETURN_PERCENT}
+           OR (h.risk_rating IN {HIGH_RISK_RATINGS}
+               AND (s.high_risk_value + s.very_high_risk_value) * 100.0 > {HIGH_RISK_EXPOSURE_PERCENT} * s.total_value))
+    {{user_filter}}
+'''
+
+
+def _alert(level: str, alert_type: str, message: str, recommendations: List[str],
+           affected_holdings: List[str], timestamp: str) -> Dict[str, Any]:
+    return {
+        'level': level,
+        'type': alert_type,
+        'message': message,
+        'recommendations': recommendations,
+        'affected_holdings': affected_holdings,
+        'timestamp': timestamp
+    }
+
+
+def scan_risk_alerts(cursor, user_ids: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """user_id -> alerts (concentration, high-risk exposure, deep loss) for every user, or just user_ids.
+
+    Users without alerts are omitted.
+    """
+    user_filter = ''
+    params: List[str] = []
+    if user_ids is not None:
+        if not user_ids:
+            return {}
+        user_filter = f"AND h.user_id IN ({', '.join('?' * len(user_ids))})"
+        params = list(user_ids)
+    cursor.execute(RISK_SCAN_QUERY.format(user_filter=user_filter), params)
+
+    # Largest positions first within each user (sorting the few alert rows here is cheaper than in SQL)
+    rows = sorted(cursor.fetchall(), key=lambda row: (row[0], -(row[3] or 0)))
+
+    timestamp = datetime.datetime.now().isoformat()
+    alerts_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    high_risk: Dict[str, List] = {}
+    for user_id, fund_name, return_percent, weight, exposure, is_high_risk in rows:
+        alerts = alerts_by_user.setdefault(user_id, [])
+        if weight is not None and weight > CONCENTRATION_PERCENT:
+            alerts.append(_alert('medium', 'concentration_risk', f'{fund_name} represents {weight:.1f}% of your portfolio',
+                                 ['Consider reducing position size', 'Diversify into other assets'],
+                                 [fund_name], timestamp))
+        if return_percent is not None and return_percent <= DEEP_LOSS_RETURN_PERCENT:
+            alerts.append(_alert('high', 'deep_loss', f'{fund_name} is down {abs(return_percent):.1f}%',
+                                 ['Review whether the original investment case still holds',
+                                  'Consider harvesting the loss and switching to a comparable fund'],
+                                 [fund_name], timestamp))
+        if is_high_risk and exposure is not None and exposure > HIGH_RISK_EXPOSURE_PERCENT:
+            high_risk.setdefault(user_id, [exposure, []])[1].append(fund_name)
+
+    # One exposure alert per user, naming every high-risk holding
+    for user_id, (exposure, funds) in high_risk.items():
+        alerts_by_user[user_id].append(_alert(
+            'high', 'high_risk_exposure', f'{exposure:.1f}% of your portfolio is in High or Very High risk funds',
+            ['Shift part of these positions into lower-risk funds', 'Check the mix against your risk capacity'],
+            funds, timestamp))
+
+    return {user_id: alerts for user_id, alerts in alerts_by_user.items() if alerts}
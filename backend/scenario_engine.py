@@ -0,0 +1,303 @@
+"""
+Vectorized Scenario Engine
+Builds the conservative / moderate / aggressive rebalancing scenarios (or any other
+ScenarioSpec) for one or many users in a single array pass over their holdings
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# performance_rating -> column in a SellRule fraction table (last column = unrated)
+RATING_CODES = {'Excellent': 0, 'Good': 1, 'Average': 2, 'Below Average': 3, 'Poor': 4}
+UNRATED_CODE = len(RATING_CODES)
+
+# (asset_class value, allocation_change key) paired with ScenarioSpec.allocation_shift
+ALLOCATION_CHANGE_KEYS = [('equities', 'equity_change'), ('bonds', 'bond_change'), ('cash', 'cash_change')]
+
+
+@dataclass
+class SellRule:
+    fractions: Dict[str, float]  # performance_rating -> share of the holding to sell
+    min_value: float             # only holdings worth more than this
+    max_amount: float            # cap per sell order
+    reason: str                  # format string, receives return_percent
+    only_if_fewer_than: Optional[int] = None  # skip unless earlier rules produced fewer actions
+    max_actions: Optional[int] = None         # stop once the scenario has this many actions
+
+
+@dataclass
+class ScenarioSpec:
+    id: int
+    name: str
+    description: str
+    risk_level: str
+    expected_return: str
+    timeframe: str
+    cost: str
+    sell_rules: List[SellRule]
+    buy_count: int          # top recommended funds to buy
+    min_budget: float       # sell proceeds below this are replaced by fallback_budget
+    fallback_budget: float
+    min_buy: float          # buy orders must be larger than this
+    buy_reason: str         # format string, receives returns_1year and performance_rating
+    allocation_shift: Tuple[float, float, float] = (0, 0, 0)  # equity, bond, cash
+
+
+DEFAULT_SCENARIOS = [
+    ScenarioSpec(
+        id=1,
+        name='Conservative Rebalancing',
+        description='Gradual rebalancing with minimal risk, focusing on reducing underperforming assets',
+        risk_level='Low',
+        expected_return='+2.5% annually',
+        timeframe='6-12 months',
+        cost='$25-40',
+        sell_rules=[
+            # Sell 30% (max $3000) of underperformers
+            SellRule({'Poor': 0.3, 'Below Average': 0.3}, 1000, 3000,
+                     'Underperforming with {return_percent:.1f}% return'),
+            # Ensure minimum sell actions by including average performers if needed
+            SellRule({'Average': 0.2}, 1500, 2000,
+                     'Rebalancing average performer ({return_percent:.1f}% return)',
+                     only_if_fewer_than=2, max_actions=3)
+        ],
+        buy_count=3, min_budget=1000, fallback_budget=2000, min_buy=300,
+        buy_reason='Strong performer: {returns_1year:.1f}% annual return',
+        allocation_shift=(2, 1, -3)
+    ),
+    ScenarioSpec(
+        id=2,
+        name='Moderate Rebalancing',
+        description='Balanced approach with strategic reallocation to optimize performance',
+        risk_level='Medium',
+        expected_return='+4.2% annually',
+        timeframe='3-6 months',
+        cost='$40-65',
+        sell_rules=[
+            SellRule({'Poor': 0.6, 'Below Average': 0.6}, 800, 5000,
+                     'Poor performance ({return_percent:.1f}%), better opportunities available'),
+            SellRule({'Average': 0.4}, 2000, 3000,
+                     'Reallocating from average performer to optimize returns',
+                     max_actions=5)
+        ],
+        buy_count=4, min_budget=1500, fallback_budget=3000, min_buy=400,
+        buy_reason='Excellent growth potential: {returns_1year:.1f}% return, {performance_rating} rated',
+        allocation_shift=(3, 2, -5)
+    ),
+    ScenarioSpec(
+        id=3,
+        name='Aggressive Rebalancing',
+        description='Maximum optimization for growth, substantial portfolio restructuring',
+        risk_level='High',
+        expected_return='+6.8% annually',
+        timeframe='1-3 months',
+        cost='$65-100',
+        sell_rules=[
+            # Sell 50-80% (max $8000) of everything that is not Good or Excellent
+            SellRule({'Poor': 0.8, 'Below Average': 0.8, 'Average': 0.5}, 500, 8000,
+                     'Maximizing portfolio optimization ({return_percent:.1f}% → targeting 15%+ returns)')
+        ],
+        buy_count=5, min_budget=2000, fallback_budget=5000, min_buy=500,
+        buy_reason='Top-tier opportunity: {returns_1year:.1f}% annual returns, {performance_rating} rating',
+        allocation_shift=(5, 3, -8)
+    )
+]
+
+
+@dataclass
+class HoldingsBook:
+    """Holdings of many users in flat arrays; user i owns rows offsets[i]:offsets[i + 1]"""
+    user_ids: List[str]
+    offsets: np.ndarray
+    value: np.ndarray
+    units: np.ndarray
+    return_percent: np.ndarray
+    rating_code: np.ndarray
+    fund_symbols: List[str] = field(default_factory=list)
+    fund_names: List[str] = field(default_factory=list)
+
+    @property
+    def owner(self) -> np.ndarray:
+        """User index of every holding row"""
+        return np.repeat(np.arange(len(self.user_ids)), np.diff(self.offsets))
+
+
+def load_holdings_book(conn, asset_class: str, user_ids: List[str]) -> HoldingsBook:
+    """Holdings in one asset class for every user in user_ids, read in one query"""
+    user_ids = list(dict.fromkeys(user_ids))
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT uh.user_id, uh.fund_symbol, uh.fund_name, uh.units_held, uh.current_value,
+               uh.return_percent, uh.performance_rating
+        FROM user_holdings uh
+        JOIN funds_universe fu ON uh.fund_symbol = fu.fund_symbol
+        WHERE uh.user_id IN (SELECT value FROM json_each(?)) AND fu.asset_class = ?
+        ORDER BY uh.id
+    ''', (json.dumps(user_ids), asset_class))
+
+    rows_by_user = {user_id: [] for user_id in user_ids}
+    for row in cursor.fetchall():
+        rows_by_user[row[0]].append(row)
+
+    rows = [row for user_id in user_ids for row in rows_by_user[user_id]]
+    counts = [len(rows_by_user[user_id]) for user_id in user_ids]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    return HoldingsBook(
+        user_ids=list(user_ids),
+        offsets=offsets,
+        value=np.array([row[4] for row in rows], dtype=float),
+        units=np.array([row[3] for row in rows], dtype=float),
+        return_percent=np.array([np.nan if row[5] is None else row[5] for row in rows], dtype=float),
+        rating_code=np.array([RATING_CODES.get(row[6], UNRATED_CODE) for row in rows], dtype=np.int64),
+        fund_symbols=[row[1] for row in rows],
+        fund_names=[row[2] for row in rows]
+    )
+
+
+def load_recommended_funds(conn, asset_class: str, limit: int = 8):
+    """Top performers in the asset class, best first"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM funds_universe
+        WHERE asset_class = ? AND performance_rating IN ('Excellent', 'Good')
+        ORDER BY returns_1year DESC, performance_rating DESC, id
+        LIMIT ?
+    ''', (asset_class, limit))
+    return cursor.fetchall()
+
+
+def _segment_sum(values: np.ndarray, owner: np.ndarray, num_users: int) -> np.ndarray:
+    return np.bincount(owner, weights=values, minlength=num_users)
+
+
+def compute_scenarios(book: HoldingsBook, recommended_funds, asset_class: str,
+                      specs: List[ScenarioSpec] = DEFAULT_SCENARIOS) -> Dict[str, List[Dict[str, Any]]]:
+    """Scenarios for every user in the book: {user_id: [scenario, ...]}"""
+    num_users = len(book.user_ids)
+    owner = book.owner
+    segment_start = book.offsets[:-1][owner]
+
+    # One row per sell rule across all scenarios
+    rules = [(s, rule) for s, spec in enumerate(specs) for rule in spec.sell_rules]
+    fraction_table = np.zeros((len(rules), UNRATED_CODE + 1))
+    for k, (_, rule) in enumerate(rules):
+        for rating, fraction in rule.fractions.items():
+            fraction_table[k, RATING_CODES[rating]] = fraction
+    min_value = np.array([rule.min_value for _, rule in rules])
+    max_amount = np.array([rule.max_amount for _, rule in rules])
+
+    # (rules x holdings) matrices, computed once for every scenario and user
+    fractions = fraction_table[:, book.rating_code]
+    eligible = (fractions > 0) & (book.value[None, :] > min_value[:, None])
+    amounts = np.minimum(book.value[None, :] * fractions, max_amount[:, None])
+    units = book.units[None, :] * fractions
+
+    # 1-based rank of each eligible holding within its user's segment, per rule
+    running = np.concatenate((np.zeros((len(rules), 1), dtype=np.int64), np.cumsum(eligible, axis=1)), axis=1)
+    rank = running[:, 1:] - running[:, segment_start]
+
+    action_counts = np.zeros((len(specs), num_users), dtype=np.int64)
+    sell_totals = np.zeros((len(specs), num_users))
+    selected = np.zeros_like(eligible)
+    for k, (s, rule) in enumerate(rules):
+        chosen = eligible[k].copy()
+        if rule.only_if_fewer_than is not None:
+            chosen &= (action_counts[s] < rule.only_if_fewer_than)[owner]
+        if rule.max_actions is not None:
+            chosen &= rank[k] + action_counts[s][owner] <= rule.max_actions
+        selected[k] = chosen
+        action_counts[s] += np.bincount(owner[chosen], minlength=num_users)
+        sell_totals[s] += _segment_sum(np.where(chosen, amounts[k], 0.0), owner, num_users)
+
+    # Buy budgets for every (scenario, user) at once
+    buy_counts = np.array([spec.buy_count for spec in specs], dtype=float)[:, None]
+    budgets = np.where(sell_totals < np.array([spec.min_budget for spec in specs])[:, None],
+                       np.array([spec.fallback_budget for spec in specs])[:, None], sell_totals)
+    buy_amounts = budgets / buy_counts
+    buy_enabled = buy_amounts > np.array([spec.min_buy for spec in specs])[:, None]
+    if not recommended_funds:
+        buy_enabled[:] = False
+
+    # Selected sell orders as flat lists ordered by user, then rule, then holding, so the
+    # per-user loop below only builds dicts
+    rule_idx, holding_idx = np.nonzero(selected)
+    order = np.lexsort((holding_idx, rule_idx, owner[holding_idx]))
+    rule_idx, holding_idx = rule_idx[order], holding_idx[order]
+    sell_owner = owner[holding_idx].tolist()
+    sell_amounts = amounts[rule_idx, holding_idx].tolist()
+    sell_units = units[rule_idx, holding_idx].tolist()
+    rule_idx, holding_idx = rule_idx.tolist(), holding_idx.tolist()
+    returns = book.return_percent.tolist()
+    rule_scenario = [s for s, _ in rules]
+    rule_reason = [rule.reason for _, rule in rules]
+
+    buy_funds = [[(fund['fund_name'], fund['fund_symbol'], fund['returns_1year'], fund['current_price'],
+                   spec.buy_reason.format(returns_1year=fund['returns_1year'],
+                                          performance_rating=fund['performance_rating']))
+                  for fund in recommended_funds[:spec.buy_count]]
+                 for spec in specs]
+    allocation_changes = [{change_key: shift if asset_class == class_key else 0
+                           for (class_key, change_key), shift in zip(ALLOCATION_CHANGE_KEYS, spec.allocation_shift)}
+                          for spec in specs]
+    buy_amounts = buy_amounts.tolist()
+    buy_enabled = buy_enabled.tolist()
+
+    results = {}
+    position = 0
+    for u, user_id in enumerate(book.user_ids):
+        actions_by_scenario = [[] for _ in specs]
+        while position < len(sell_owner) and sell_owner[position] == u:
+            k, h = rule_idx[position], holding_idx[position]
+            actions_by_scenario[rule_scenario[k]].append({
+                'type': 'sell',
+                'fund_name': book.fund_names[h],
+                'fund_symbol': book.fund_symbols[h],
+                'amount': sell_amounts[position],
+                'reason': rule_reason[k].format(return_percent=returns[h]),
+                'current_performance': returns[h],
+                'units': sell_units[position]
+            })
+            position += 1
+
+        scenarios = []
+        for s, spec in enumerate(specs):
+            actions = actions_by_scenario[s]
+            if buy_enabled[s][u]:
+                buy_amount = buy_amounts[s][u]
+                for fund_name, fund_symbol, returns_1year, price, reason in buy_funds[s]:
+                    actions.append({
+                        'type': 'buy',
+                        'fund_name': fund_name,
+                        'fund_symbol': fund_symbol,
+                        'amount': buy_amount,
+                        'reason': reason,
+                        'current_performance': returns_1year,
+                        'expected_units': buy_amount / price
+                    })
+
+            scenarios.append({
+                'id': spec.id,
+                'name': spec.name,
+                'description': spec.description,
+                'risk_level': spec.risk_level,
+                'expected_return': spec.expected_return,
+                'timeframe': spec.timeframe,
+                'cost': spec.cost,
+                'actions': actions,
+                'allocation_change': dict(allocation_changes[s])
+            })
+        results[user_id] = scenarios
+
+    return results
+
+
+def generate_scenarios(conn, user_ids: List[str], asset_class: str,
+                       specs: List[ScenarioSpec] = DEFAULT_SCENARIOS) -> Dict[str, List[Dict[str, Any]]]:
+    """Load holdings and recommendations for many users and build their scenarios in one pass"""
+    book = load_holdings_book(conn, asset_class, user_ids)
+    recommended_funds = load_recommended_funds(conn, asset_class)
+    return compute_scenarios(book, recommended_funds, asset_class, specs)
@@ -0,0 +1,111 @@
+"""
+JSON Serializers
+Pluggable JSON encoders for the bulk API responses: orjson when it is installed, the
+standard library otherwise (choose one with PORTFOLIO_JSON_ENCODER=orjson|stdlib).
+Table rows are encoded straight from the SQLite cursor in chunks, column by column into
+a template of pre-encoded keys, so no dict is ever built per row.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is always available
+    orjson = None
+
+ENCODE_CHUNK_ROWS = 1000  # rows turned into JSON per encoder call
+
+# An encoder turns a JSON-compatible object into UTF-8 bytes
+Encoder = Callable[[Any], bytes]
+
+_stdlib_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _stdlib_encoder(obj: Any) -> bytes:
+    return _stdlib_encode(obj).encode('utf-8')
+
+
+ENCODERS: Dict[str, Encoder] = {'stdlib': _stdlib_encoder}
+if orjson is not None:
+    ENCODERS['orjson'] = orjson.dumps
+
+
+def register_encoder(name: str, encoder: Encoder):
+    """Make another encoder selectable by name"""
+    ENCODERS[name] = encoder
+
+
+def get_encoder(name: Optional[str] = None) -> Encoder:
+    """The named encoder, else PORTFOLIO_JSON_ENCODER, else the fastest one installed"""
+    name = name or os.environ.get('PORTFOLIO_JSON_ENCODER') or ('orjson' if 'orjson' in ENCODERS else 'stdlib')
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown JSON encoder '{name}'. Available: {', '.join(ENCODERS)}")
+    return ENCODERS[name]
+
+
+def _chunks(rows: Iterable, size: int):
+    fetchmany = getattr(rows, 'fetchmany', None)
+    if fetchmany is not None:
+        while True:
+            chunk = fetchmany(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        rows = list(rows)
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+
+def _row_template(columns: List[str], encoder: Encoder) -> bytes:
+    """A bytes %-template for one row object: the column keys encoded once, a %b per value"""
+    return b'{' + b','.join(encoder(column).replace(b'%', b'%%') + b':%b' for column in columns) + b'}'
+
+
+def _encode_column(values: Tuple, encoder: Encoder) -> List[bytes]:
+    """The JSON of each value in a column, from one encoder call on the whole column"""
+    encoded = encoder(values)[1:-1].split(b',')
+    if len(encoded) != len(values):
+        # A string containing a comma split in two; encode this column's values one by one
+        encoded = [encoder(value) for value in values]
+    return encoded
+
+
+def encoded_row_chunks(columns: List[str], rows: Iterable, encoder: Optional[Encoder] = None,
+                       chunk_rows: int = ENCODE_CHUNK_ROWS) -> Iterator[List[bytes]]:
+    """The JSON object of each row, a chunk at a time, from a cursor or list of rows.
+
+    Row values are paired with columns by position; extra trailing values are ignored.
+    Each chunk is encoded column by column and the values are dropped into a row template,
+    so no dict is built per row.
+    """
+    encoder = encoder or get_encoder()
+    template = _row_template(columns, encoder)
+    for chunk in _chunks(rows, chunk_rows):
+        encoded = [_encode_column(values, encoder) for values in list(zip(*chunk))[:len(columns)]]
+        yield [template % row for row in zip(*encoded)]
+
+
+def encode_rows(columns: List[str], rows: Iterable, encoder: Optional[Encoder] = None,
+                chunk_rows: int = ENCODE_CHUNK_ROWS) -> Tuple[bytes, int]:
+    """(JSON array of row objects, row count) from a cursor or list of rows"""
+    parts = []
+    count = 0
+    for chunk in encoded_row_chunks(columns, rows, encoder, chunk_rows):
+        parts.append(b','.join(chunk))
+        count += len(chunk)
+    return b'[' + b','.join(parts) + b']', count
+
+
+def rows_response(columns: List[str], rows: Iterable, extra: Optional[Dict[str, Any]] = None,
+                  encoder: Optional[Encoder] = None) -> Response:
+    """{"success": true, "data": [...], "count": n, **extra} encoded straight from rows"""
+    encoder = encoder or get_encoder()
+    data, count = encode_rows(columns, rows, encoder)
+    tail = encoder({'count': count, **(extra or {})})
+    body = b'{"success":true,"data":' + data + b',' + tail[1:]
+    return Response(body, mimetype='application/json')
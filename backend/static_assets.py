@@ -0,0 +1,150 @@
+"""
+Static Asset Pipeline
+Builds content-hashed copies of the CSS/JS assets (with precompressed gzip and, when the
+brotli package is installed, brotli variants) plus HTML pages that reference them, and
+serves them with immutable one-year caching. Without a build, or with
+PORTFOLIO_ASSET_MODE=dev, assets are served from source with no-cache headers.
+
+Build from the backend directory: python static_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from typing import Dict, Optional
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants are always built
+    brotli = None
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(BASE_PATH, 'frontend', 'src')
+BUILD_DIR = os.path.join(BASE_PATH, 'frontend', 'dist')
+MANIFEST_FILE = 'manifest.json'
+
+ASSET_DIRS = ['styles', 'components']
+ASSET_EXTENSIONS = ('.css', '.js')
+HTML_PAGES = ['index.html', 'ai-assistant.html']
+HASH_LENGTH = 12
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+# Accept-Encoding token -> file suffix, in order of preference
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+ASSET_REFERENCE = re.compile(r'''((?:href|src)=["'])/((?:styles|components)/[^"'?#]+)(["'])''')
+
+
+def hashed_name(relative_path: str, content: bytes) -> str:
+    """styles/main.css -> styles/main.<content hash>.css"""
+    stem, extension = os.path.splitext(relative_path)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}'
+
+
+def build_assets(source_dir: str = SOURCE_DIR, build_dir: str = BUILD_DIR) -> Dict[str, str]:
+    """Write hashed + precompressed assets and rewritten HTML pages; returns the manifest"""
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        os.makedirs(os.path.join(build_dir, asset_dir))
+        for filename in sorted(os.listdir(os.path.join(source_dir, asset_dir))):
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            relative_path = f'{asset_dir}/{filename}'
+            with open(os.path.join(source_dir, relative_path), 'rb') as handle:
+                content = handle.read()
+
+            target = hashed_name(relative_path, content)
+            target_path = os.path.join(build_dir, target)
+            with open(target_path, 'wb') as handle:
+                handle.write(content)
+            with open(target_path + '.gz', 'wb') as handle:
+                handle.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target_path + '.br', 'wb') as handle:
+                    handle.write(brotli.compress(content, quality=11))
+            manifest[relative_path] = target
+
+    # Pages are rewritten to the hashed names; they are served with no-cache so a new build shows up at once
+    for page in HTML_PAGES:
+        with open(os.path.join(source_dir, page), encoding='utf-8') as handle:
+            html = handle.read()
+        html = ASSET_REFERENCE.sub(
+            lambda match: f'{match.group(1)}/{manifest.get(match.group(2), match.group(2))}{match.group(3)}', html)
+        with open(os.path.join(build_dir, page), 'w', encoding='utf-8') as handle:
+            handle.write(html)
+
+    with open(os.path.join(build_dir, MANIFEST_FILE), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(build_dir: str = BUILD_DIR) -> Optional[Dict[str, str]]:
+    """The build manifest, or None when serving from source (no build or PORTFOLIO_ASSET_MODE=dev)"""
+    if os.environ.get('PORTFOLIO_ASSET_MODE', '').lower() == 'dev':
+        return None
+    try:
+        with open(os.path.join(build_dir, MANIFEST_FILE)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+_manifest = load_manifest()
+_hashed_files = set(_manifest.values()) if _manifest else set()
+
+
+def _no_cache(response):
+    response.headers.update(NO_CACHE_HEADERS)
+    return response
+
+
+def send_page(page: str):
+    """An HTML page: the rewritten copy from the build, else the source page"""
+    directory = BUILD_DIR if _manifest is not None else SOURCE_DIR
+    response = send_from_directory(directory, page)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def send_asset(asset_dir: str, filename: str):
+    """A CSS/JS asset: hashed names get immutable caching and a precompressed body when accepted"""
+    relative_path = f'{asset_dir}/{filename}'
+    if relative_path not in _hashed_files:
+        # Dev mode, or an unhashed name: serve the source file and never cache it
+        return _no_cache(send_from_directory(os.path.join(SOURCE_DIR, asset_dir), filename))
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(BUILD_DIR, relative_path + suffix)):
+            response = send_from_directory(BUILD_DIR, relative_path + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(BUILD_DIR, relative_path, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    for source, target in sorted(built.items()):
+        print(f"✅ {source} -> {target}")
+    print(f"🎯 Built {len(built)} assets into {os.path.relpath(BUILD_DIR, BASE_PATH)}"
+          f"{'' if brotli else ' (gzip only; install brotli for .br variants)'}")
@@ -0,0 +1,402 @@
+"""
+Table Query Builder
+Keyset pagination, server-side sorting, column filters and search for the table APIs
+(investor data, portfolio allocation, product market data, master allocation model)
+and the streaming exports
+"""
+
+import base64
+import json
+import math
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Investor overview: (age group, oldest age in it), the last group open-ended; and how many
+# of the largest portfolios to list
+INVESTOR_AGE_GROUPS = [('Under 30', 29), ('30-45', 45), ('46-60', 60), ('Over 60', None)]
+TOP_INVESTORS = 5
+
+# Query parameters with a fixed meaning; any other parameter naming a column is a filter
+PAGING_PARAMS = ('limit', 'after')
+RESERVED_PARAMS = PAGING_PARAMS + ('sort', 'order', 'q', 'format', '_cb')
+
+
+@dataclass
+class TableSpec:
+    """How one table API selects, sorts, filters and searches its rows"""
+    columns: Dict[str, str]           # output column -> SQL expression, in output order
+    from_clause: str
+    key: str                          # unique, non-NULL tiebreak expression for the keyset
+    default_sort: List[Tuple[str, bool]]  # (column, descending)
+    search_columns: List[str]
+
+
+TABLE_SPECS: Dict[str, TableSpec] = {
+    'investor-data': TableSpec(
+        columns={
+            'user_id': 'i.user_id',
+            'full_name': 'i.full_name',
+            'age': 'i.age',
+            'city': 'i.city',
+            'risk_capacity': 'i.risk_capacity',
+            'spending_score': 'i.spending_score',
+            'annual_income': 'i.annual_income',
+            'investor_category': 'i.investor_category',
+            'asset_allocation_model': 'i.asset_allocation_model',
+            'equities_percent': 'i.equities_percent',
+            'bonds_percent': 'i.bonds_percent',
+            'cash_percent': 'i.cash_percent',
+            'alternatives_percent': 'i.alternatives_percent',
+            'investment_preference_sectors': 'i.investment_preference_sectors',
+            'rebalancing_frequency': 'i.rebalancing_frequency',
+            'last_rebalancing_date': 'i.last_rebalancing_date',
+            'variation_limit': 'i.variation_limit',
+            'total_portfolio_value': 'COALESCE(p.total_investment_amount, 0)',
+            'current_equities_percent': 'COALESCE(p.equities_percent, i.equities_percent)',
+            'current_bonds_percent': 'COALESCE(p.bonds_percent, i.bonds_percent)',
+            'current_cash_percent': 'COALESCE(p.cash_percent, i.cash_percent)',
+            'current_alternatives_percent': 'COALESCE(p.alternatives_percent, i.alternatives_percent)'
+        },
+        from_clause='investor_ref_data i LEFT JOIN portfolios_cur_allocation p ON i.user_id = p.user_id',
+        key='i.id',
+        default_sort=[('user_id', False)],
+        search_columns=['user_id', 'full_name', 'city', 'risk_capacity', 'investor_category',
+                        'asset_allocation_model', 'investment_preference_sectors', 'rebalancing_frequency']
+    ),
+    'portfolio-allocation': TableSpec(
+        columns={
+            'id': 'id',
+            'user_id': 'user_id',
+            'full_name': 'full_name',
+            'total_investment_amount': 'total_investment_amount',
+            'equities_percent': 'equities_percent',
+            'bonds_percent': 'bonds_percent',
+            'cash_percent': 'cash_percent',
+            'alternatives_percent': 'alternatives_percent',
+            'last_rebalance_date': 'last_rebalance_date'
+        },
+        from_clause='portfolios_cur_allocation',
+        key='id',
+        default_sort=[('user_id', False)],
+        search_columns=['user_id', 'full_name']
+    ),
+    'product-market-data': TableSpec(
+        columns={
+            'investment_type': 'investment_type',
+            'industry_sector': 'industry_sector',
+            'market_segment': 'market_segment',
+            'investment_strategies': 'investment_strategies',
+            'investment_product': 'investment_product',
+            'symbol': 'symbol',
+            'market_price_usd': 'market_price_usd'
+        },
+        from_clause='product_market_data',
+        key='id',
+        default_sort=[('investment_type', False)],
+        search_columns=['investment_type', 'industry_sector', 'market_segment',
+                        'investment_strategies', 'investment_product', 'symbol']
+    ),
+    'master-allocation-model': TableSpec(
+        columns={
+            'id': 'id',
+            'category': 'category',
+            'model_no': 'model_no',
+            'model_type': 'model_type',
+            'model_desc': 'model_desc',
+            'equities': 'equities',
+            'domestic_equities': 'domestic_equities',
+            'emerging_market': 'emerging_market',
+            'bonds': 'bonds',
+            'cash_cash_equivalents': 'cash_cash_equivalents',
+            'alternative_investments': 'alternative_investments'
+        },
+        from_clause='MasterAllocationModel',
+        key='id',
+        default_sort=[('category', False), ('model_no', False)],
+        search_columns=['category', 'model_type', 'model_desc']
+    ),
+    # Export-only tables default to rowid order so large extracts never need a sort
+    'holdings': TableSpec(
+        columns={name: name for name in (
+            'id', 'user_id', 'fund_symbol', 'fund_name', 'asset_class', 'units_held', 'current_price',
+            'invested_amount', 'current_value', 'return_percent', 'performance_rating', 'risk_rating',
+            'expense_ratio', 'last_updated')},
+        from_clause='user_holdings',
+        key='id',
+        default_sort=[('id', False)],
+        search_columns=['user_id', 'fund_symbol', 'fund_name', 'asset_class']
+    ),
+    'rebalancing-log': TableSpec(
+        columns={name: name for name in (
+            'id', 'user_id', 'execution_date', 'total_sell_amount', 'total_buy_amount',
+            'num_sells', 'num_buys', 'status')},
+        from_clause='custom_rebalancing_log',
+        key='id',
+        default_sort=[('id', False)],
+        search_columns=['user_id', 'status']
+    )
+}
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque token for the sort values (plus key) of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> List[Any]:
+    """Inverse of encode_cursor; raises ValueError on a malformed token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _parse_sort(spec: TableSpec, sort: Optional[str], order: Optional[str]) -> List[Tuple[str, bool]]:
+    """?sort=col1,-col2 (a leading '-' means descending); ?order=desc flips a single column"""
+    if not sort:
+        return spec.default_sort
+
+    descending_default = (order or 'asc').lower() == 'desc'
+    sort_columns = []
+    for name in sort.split(','):
+        name = name.strip()
+        descending = descending_default
+        if name.startswith('-'):
+            name, descending = name[1:], True
+        if name not in spec.columns:
+            raise ValueError(f'Cannot sort by {name}')
+        sort_columns.append((name, descending))
+    return sort_columns
+
+
+def _parse_filters(spec: TableSpec, args) -> Tuple[List[str], List[Any]]:
+    """Column filters: ?col=a&col=b (IN), ?col_min=x / ?col_max=y (inclusive numeric range)"""
+    clauses = []
+    params = []
+    for name in args.keys():
+        if name in RESERVED_PARAMS:
+            continue
+        if name in spec.columns:
+            values = args.getlist(name)
+            clauses.append(f"{spec.columns[name]} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        elif name.endswith(('_min', '_max')) and name[:-4] in spec.columns:
+            operator = '>=' if name.endswith('_min') else '<='
+            clauses.append(f'{spec.columns[name[:-4]]} {operator} ?')
+            params.append(_range_bound(name, args.get(name)))
+    return clauses, params
+
+
+def _range_bound(name: str, value: str) -> float:
+    """A range filter's bound as a number; bound as text it would never match computed
+    columns, which have no type affinity to convert it"""
+    try:
+        bound = float(value)
+    except (TypeError, ValueError):
+        bound = math.nan
+    if not math.isfinite(bound):
+        raise ValueError(f'{name} must be a number')
+    return bound
+
+
+def _search_clauses(spec: TableSpec, q: Optional[str]) -> Tuple[List[str], List[Any]]:
+    """Every whitespace-separated term must appear (case-insensitively) in some searchable column"""
+    clauses = []
+    params = []
+    for term in (q or '').split():
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append('(' + ' OR '.join(f"{spec.columns[name]} LIKE ? ESCAPE '\\'"
+                                         for name in spec.search_columns) + ')')
+        params.extend([pattern] * len(spec.search_columns))
+    return clauses, params
+
+
+def _keyset_clause(expressions: List[Tuple[str, bool]], values: List[Any]) -> Tuple[str, List[Any]]:
+    """Rows strictly after `values` in the (expression, descending) ordering.
+
+    SQLite sorts NULLs first ascending and last descending, so NULL sort values are
+    handled explicitly rather than with a row-value comparison.
+    """
+    branches = []
+    params = []
+    for i, (expression, descending) in enumerate(expressions):
+        value = values[i]
+        if value is None:
+            if descending:
+                continue  # nothing sorts after NULL in a descending column
+            after, after_params = f'{expression} IS NOT NULL', []
+        elif descending:
+            after, after_params = f'({expression} < ? OR {expression} IS NULL)', [value]
+        else:
+            after, after_params = f'{expression} > ?', [value]
+
+        equal = [f'{previous} IS ?' for previous, _ in expressions[:i]]
+        branches.append('(' + ' AND '.join(equal + [after]) + ')')
+        params.extend(values[:i] + after_params)
+
+    return '(' + (' OR '.join(branches) or '0') + ')', params
+
+
+def _where_clause(spec: TableSpec, args) -> Tuple[List[str], List[Any]]:
+    """Column filters and search terms from the request args"""
+    filter_clauses, filter_params = _parse_filters(spec, args)
+    search_clauses, search_params = _search_clauses(spec, args.get('q'))
+    return filter_clauses + search_clauses, filter_params + search_params
+
+
+def _select_query(spec: TableSpec, where: List[str], order_expressions: List[Tuple[str, bool]],
+                  include_key: bool = False, limit: bool = False) -> str:
+    """SELECT text for spec; include_key adds the _row_key column the keyset cursor needs"""
+    select_list = ', '.join(f'{expression} as {name}' for name, expression in spec.columns.items())
+    order_by = ', '.join(f"{expression} {'DESC' if descending else 'ASC'}" for expression, descending in order_expressions)
+    return f'''
+        SELECT {select_list}{f', {spec.key} as _row_key' if include_key else ''}
+        FROM {spec.from_clause}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order_by}
+        {'LIMIT ?' if limit else ''}
+    '''
+
+
+def _order_expressions(spec: TableSpec, sort_columns: List[Tuple[str, bool]]) -> List[Tuple[str, bool]]:
+    # The unique key follows the direction of the last sort column so the order is total
+    order_expressions = [(spec.columns[name], descending) for name, descending in sort_columns]
+    order_expressions.append((spec.key, sort_columns[-1][1]))
+    return order_expressions
+
+
+def build_export_query(table: str, args) -> Tuple[str, List[Any]]:
+    """(sql, params) selecting every row that matches args, in the same order as the table API"""
+    spec = TABLE_SPECS[table]
+    sort_columns = _parse_sort(spec, args.get('sort'), args.get('order'))
+    where, params = _where_clause(spec, args)
+    return _select_query(spec, where, _order_expressions(spec, sort_columns)), params
+
+
+def is_paged_request(args) -> bool:
+    """Whether the caller asked for a page rather than the whole (filtered) table"""
+    return any(name in args for name in PAGING_PARAMS)
+
+
+def open_table_query(conn, table: str, args) -> Dict[str, Any]:
+    """Run a table API query described by request args without building row dicts.
+
+    Returns {'columns', 'rows', 'total', 'next_cursor'}. rows are sqlite3 rows whose
+    values line up with columns (a trailing _row_key value is left for zip to drop); for
+    a whole-table request they are the live cursor, so the caller must consume them
+    before closing conn. Without limit/after every matching row is returned; otherwise
+    one page of at most limit rows starting after the cursor.
+    Raises ValueError for an unknown sort column, non-numeric range bound, bad limit or
+    malformed cursor.
+    """
+    spec = TABLE_SPECS[table]
+    sort_columns = _parse_sort(spec, args.get('sort'), args.get('order'))
+    where, params = _where_clause(spec, args)
+    order_expressions = _order_expressions(spec, sort_columns)
+
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {spec.from_clause} {'WHERE ' + ' AND '.join(where) if where else ''}",
+                   params)
+    total = cursor.fetchone()[0]
+
+    paged = is_paged_request(args)
+    limit = None
+    if paged:
+        try:
+            limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        if args.get('after'):
+            values = decode_cursor(args['after'])
+            if len(values) != len(order_expressions):
+                raise ValueError('Cursor does not match the sort order')
+            keyset, keyset_params = _keyset_clause(order_expressions, values)
+            where = where + [keyset]
+            params = params + keyset_params
+
+    query = _select_query(spec, where, order_expressions, include_key=True, limit=paged)
+    cursor.execute(query, params + ([limit + 1] if paged else []))
+    rows = cursor
+
+    next_cursor = None
+    if paged:
+        rows = cursor.fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([last[name] for name, _ in sort_columns] + [last['_row_key']])
+
+    return {
+        'columns': list(spec.columns),
+        'rows': rows,
+        'total': total,
+        'next_cursor': next_cursor
+    }
+
+
+def query_table(conn, table: str, args) -> Dict[str, Any]:
+    """Run a table API query described by request args.
+
+    Returns {'data', 'total', 'next_cursor'} with each row as a dict; see open_table_query.
+    """
+    result = open_table_query(conn, table, args)
+    columns = result['columns']
+    data = [dict(zip(columns, row)) for row in result['rows']]
+
+    return {
+        'data': data,
+        'total': result['total'],
+        'next_cursor': result['next_cursor']
+    }
+
+
+def investor_overview(conn, args) -> Dict[str, Any]:
+    """Aggregates for the investor data view over every investor matching args' filters and search.
+
+    Returns {'total_clients', 'total_aum', 'avg_portfolio_value', 'risk_profiles',
+    'age_groups', 'top_investors'}, so the overview never depends on which page is loaded.
+    Raises ValueError for a non-numeric range bound.
+    """
+    spec = TABLE_SPECS['investor-data']
+    where, params = _where_clause(spec, args)
+    from_where = f"FROM {spec.from_clause} {'WHERE ' + ' AND '.join(where) if where else ''}"
+    value = spec.columns['total_portfolio_value']
+    age = f"COALESCE({spec.columns['age']}, 0)"
+    age_group = ('CASE ' + ' '.join(f"WHEN {age} <= {oldest} THEN '{label}'"
+                                    for label, oldest in INVESTOR_AGE_GROUPS[:-1])
+                 + f" ELSE '{INVESTOR_AGE_GROUPS[-1][0]}' END")
+
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT COUNT(*), COALESCE(SUM({value}), 0) {from_where}', params)
+    total_clients, total_aum = cursor.fetchone()
+
+    cursor.execute(f"SELECT COALESCE({spec.columns['risk_capacity']}, 'Unknown') as risk, COUNT(*) {from_where} "
+                   f'GROUP BY risk ORDER BY COUNT(*) DESC, risk', params)
+    risk_profiles = {row[0]: row[1] for row in cursor.fetchall()}
+
+    cursor.execute(f'SELECT {age_group} as age_group, COUNT(*) {from_where} GROUP BY age_group', params)
+    age_groups = dict.fromkeys((label for label, _ in INVESTOR_AGE_GROUPS), 0)
+    age_groups.update((row[0], row[1]) for row in cursor.fetchall())
+
+    cursor.execute(_select_query(spec, where, [(value, True), (spec.key, False)], limit=True),
+                   params + [TOP_INVESTORS])
+    columns = list(spec.columns)
+    top_investors = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    return {
+        'total_clients': total_clients,
+        'total_aum': total_aum,
+        'avg_portfolio_value': total_aum / total_clients if total_clients else 0,
+        'risk_profiles': risk_profiles,
+        'age_groups': age_groups,
+        'top_investors': top_investors
+    }
@@ -0,0 +1,94 @@
+"""
+Table Versions and HTTP Validators
+Per-table version counters (bumped by the triggers in migration 7, and once per statement by
+holdings revaluation), cached in process so polling read routes can answer If-None-Match /
+If-Modified-Since with a 304 without touching the database
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import make_response, request
+
+from db import get_pool
+
+# External writers (ingest, database_setup) are noticed within this many seconds;
+# writes made by this process invalidate the cache immediately
+VERSION_CHECK_SECONDS = 1.0
+
+
+class TableVersionCache:
+    """In-memory copy of table_versions, re-read at most every VERSION_CHECK_SECONDS"""
+
+    def __init__(self, check_seconds: float = VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._versions: Dict[str, Tuple[int, datetime]] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Force the next lookup to re-read the versions (call after this process writes)"""
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        with get_pool().connection() as conn:
+            rows = conn.execute('SELECT table_name, version, updated_at FROM table_versions').fetchall()
+        self._versions = {
+            row[0]: (row[1], datetime.strptime(row[2], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc))
+            for row in rows
+        }
+
+    def versions(self) -> Dict[str, Tuple[int, datetime]]:
+        """table -> (version, last modified), refreshed from the database only when stale"""
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_seconds:
+                    self._refresh()
+                    self._checked_at = time.monotonic()
+        return self._versions
+
+    def validators(self, tables: Iterable[str], resource: str) -> Tuple[str, Optional[datetime]]:
+        """(ETag, Last-Modified) for a resource built from tables"""
+        versions = self.versions()
+        parts = [resource] + [f'{table}:{versions[table][0]}:{int(versions[table][1].timestamp())}'
+                              for table in tables if table in versions]
+        etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+        modified = [versions[table][1] for table in tables if table in versions]
+        return etag, max(modified) if modified else None
+
+
+_version_cache = TableVersionCache()
+
+
+def get_version_cache() -> TableVersionCache:
+    """The process-wide table version cache"""
+    return _version_cache
+
+
+def versioned(*tables: str):
+    """Route decorator: ETag/Last-Modified from the tables' versions, 304 when the client is current"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = get_version_cache().validators(tables, request.full_path)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since)
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                if last_modified:
+                    response.last_modified = last_modified
+                # Cache, but revalidate on every use
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
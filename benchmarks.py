@@ -0,0 +1,910 @@
+#!/usr/bin/env python3
+"""
+Portfolio Management Web Portal - Performance Benchmarks
+Run from the project root: python benchmarks.py [drift] [scenarios] [product_load] [json] [intents] [risk_scan] [monitoring] [solver] [revaluation] [ticks] [projections] [risk_engine]
+Each benchmark builds a synthetic in-memory database so the real one is never touched.
+"""
+
+import os
+import sys
+import csv
+import datetime
+import json
+import math
+import time
+import random
+import sqlite3
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from ai_agents import AutoRebalancingAgent
+from bulk_rebalance import load_batch_positions, load_buy_candidates, plan_target_orders
+from drift_engine import compute_portfolio_drift
+from goal_projection import (CORRELATIONS, RETURN_ASSUMPTIONS, Goal, ProjectionCache, make_inputs,
+                             project_many, simulate_projection)
+from intent_router import IntentRouter
+from migrations import apply_migrations
+from portfolio_snapshot import refresh_portfolio_snapshots
+from rebalance_solver import solve_rebalancing
+from revaluation import revalue_holdings
+from price_ticks import apply_ticks
+from holdings_index import HoldingsIndex
+from product_loader import load_product_market_data, PRODUCT_COLUMNS
+from risk_engine import FundCovariance, portfolio_risk
+from risk_scan import scan_risk_alerts
+from scenario_engine import generate_scenarios
+from serializers import ENCODERS, encode_rows
+from table_query import open_table_query, query_table
+
+ASSET_CLASSES = ['Equity', 'Bond', 'Cash', 'Alternative']
+RATINGS = ['Excellent', 'Good', 'Average', 'Below Average', 'Poor']
+NUM_SYNTHETIC_FUNDS = 40
+COVARIANCE_DAYS = 253  # a year of daily closes
+
+
+def build_synthetic_db(num_users, holdings_per_user=6, seed=42):
+    """Create an in-memory database with num_users investors and their holdings"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    # Same tables and indexes as the portal database
+    apply_migrations(conn, verbose=False)
+
+    # Fund j belongs to asset class j % 4, so holdings of F00j line up with funds_universe
+    funds = []
+    for j in range(NUM_SYNTHETIC_FUNDS):
+        funds.append((f'F{j:03d}', f'Fund {j}', ASSET_CLASSES[j % len(ASSET_CLASSES)], rng.uniform(10, 500),
+                      rng.uniform(-10, 25), rng.uniform(-5, 15), 0.1, 'Medium', rng.choice(RATINGS)))
+    cursor.executemany('''
+        INSERT INTO funds_universe (fund_symbol, fund_name, asset_class, current_price, returns_1year,
+            returns_3year, expense_ratio, risk_rating, performance_rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', funds)
+
+    investors = []
+    holdings = []
+    for i in range(num_users):
+        user_id = f'USR{i:06d}'
+        equities = rng.choice([30.0, 40.0, 50.0, 60.0, 70.0])
+        bonds = 90.0 - equities
+        investors.append((user_id, f'Investor {i}', rng.randint(25, 70), 'City', 'Medium', 'Medium',
+                          rng.uniform(50000, 200000), 'Balanced', 'Moderate', equities, bonds, 5.0, 5.0,
+                          'Diversified', 'Quarterly', '2024-01-01', 5.0))
+        for j in rng.sample(range(NUM_SYNTHETIC_FUNDS), holdings_per_user):
+            price = rng.uniform(10, 500)
+            units = rng.uniform(1, 100)
+            invested = price * units * rng.uniform(0.7, 1.3)
+            holdings.append((user_id, f'F{j:03d}', f'Fund {j}', ASSET_CLASSES[j % len(ASSET_CLASSES)], units, price,
+                             invested, price * units, rng.uniform(-30, 30), rng.choice(RATINGS), 'Medium', 0.1))
+
+    cursor.executemany('''
+        INSERT INTO investor_ref_data (user_id, full_name, age, city, risk_capacity, spending_score,
+            annual_income, investor_category, asset_allocation_model, equities_percent, bonds_percent,
+            cash_percent, alternatives_percent, investment_preference_sectors, rebalancing_frequency,
+            last_rebalancing_date, variation_limit)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', investors)
+    cursor.executemany('''
+        INSERT INTO user_holdings (user_id, fund_symbol, fund_name, asset_class, units_held,
+            current_price, invested_amount, current_value, return_percent, performance_rating,
+            risk_rating, expense_ratio)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', holdings)
+    refresh_portfolio_snapshots(cursor)
+    conn.commit()
+    return conn
+
+
+def legacy_drift(conn):
+    """The original /api/ai-rebalancing loop: one allocation query per customer"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT
+            ir.user_id, ir.full_name, ir.age, ir.city, ir.investor_category, ir.annual_income,
+            ir.risk_capacity, ir.equities_percent as target_equity, ir.bonds_percent as target_bonds,
+            COUNT(uh.fund_symbol) as total_holdings,
+            SUM(uh.current_value) as total_portfolio_value,
+            AVG(uh.return_percent) as avg_return
+        FROM investor_ref_data ir
+        LEFT JOIN user_holdings uh ON ir.user_id = uh.user_id
+        GROUP BY ir.user_id
+        ORDER BY ir.full_name
+    ''')
+    customers = []
+    for row in cursor.fetchall():
+        cursor.execute('''
+            SELECT
+                SUM(CASE WHEN uh.asset_class = 'Equity' THEN uh.current_value ELSE 0 END) as equity_value,
+                SUM(CASE WHEN uh.asset_class = 'Bond' THEN uh.current_value ELSE 0 END) as bond_value,
+                SUM(uh.current_value) as total_value
+            FROM user_holdings uh
+            WHERE uh.user_id = ?
+        ''', (row[0],))
+        allocation = cursor.fetchone()
+        if allocation and allocation[2]:
+            current_equity = (allocation[0] or 0) / allocation[2] * 100
+            equity_drift = abs(current_equity - (row[7] or 0))
+        else:
+            current_equity = 0
+            equity_drift = 0
+        customers.append({
+            'user_id': row[0], 'full_name': row[1], 'age': row[2], 'city': row[3],
+            'investor_category': row[4], 'annual_income': row[5], 'risk_capacity': row[6],
+            'portfolio_value': row[10] or 0, 'holdings_count': row[9] or 0, 'avg_return': row[11] or 0,
+            'equity_drift': round(equity_drift, 1),
+            'rebalancing_priority': 'High' if equity_drift > 10 else 'Medium' if equity_drift > 5 else 'Low',
+            'current_equity': round(current_equity, 1), 'target_equity': row[7]
+        })
+    return customers
+
+
+def legacy_scenarios(conn, user_id, asset_class):
+    """The original /api/rebalance/<user_id>/<asset_class> body: three Python loops per user"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT uh.*, fu.* FROM user_holdings uh
+        JOIN funds_universe fu ON uh.fund_symbol = fu.fund_symbol
+        WHERE uh.user_id = ? AND fu.asset_class = ?
+        ORDER BY uh.id
+    ''', (user_id, asset_class))
+    current_holdings = cursor.fetchall()
+    cursor.execute('''
+        SELECT * FROM funds_universe
+        WHERE asset_class = ? AND performance_rating IN ('Excellent', 'Good')
+        ORDER BY returns_1year DESC, performance_rating DESC, id
+        LIMIT 8
+    ''', (asset_class,))
+    recommended_funds = cursor.fetchall()
+
+    # Generate 3 detailed rebalancing scenarios
+    scenarios = []
+
+    # Scenario 1: Conservative Rebalancing
+    conservative_actions = []
+    # Sell underperforming holdings
+    for holding in current_holdings:
+        if holding['performance_rating'] in ['Poor', 'Below Average'] and holding['current_value'] > 1000:
+            conservative_actions.append({
+                'type': 'sell',
+                'fund_name': holding['fund_name'],
+                'fund_symbol': holding['fund_symbol'],
+                'amount': min(holding['current_value'] * 0.3, 3000),  # Sell 30% or max $3000
+                'reason': f'Underperforming with {holding["return_percent"]:.1f}% return',
+                'current_performance': holding['return_percent'],
+                'units': holding['units_held'] * 0.3
+            })
+
+    # Ensure minimum sell actions by including average performers if needed
+    if len(conservative_actions) < 2:
+        for holding in current_holdings:
+            if holding['performance_rating'] == 'Average' and holding['current_value'] > 1500:
+                conservative_actions.append({
+                    'type': 'sell',
+                    'fund_name': holding['fund_name'],
+                    'fund_symbol': holding['fund_symbol'],
+                    'amount': min(holding['current_value'] * 0.2, 2000),
+                    'reason': f'Rebalancing average performer ({holding["return_percent"]:.1f}% return)',
+                    'current_performance': holding['return_percent'],
+                    'units': holding['units_held'] * 0.2
+                })
+                if len(conservative_actions) >= 3:
+                    break
+
+    # Buy recommended funds
+    if recommended_funds:
+        total_sell_amount = sum(action['amount'] for action in conservative_actions if action['type'] == 'sell')
+        if total_sell_amount < 1000:  # Ensure minimum buying power
+            total_sell_amount = 2000
+
+        for i, fund in enumerate(recommended_funds[:3]):  # Buy top 3 recommended
+            buy_amount = total_sell_amount / 3 if i < 3 else 0
+            if buy_amount > 300:  # Lower minimum buy amount
+                conservative_actions.append({
+                    'type': 'buy',
+                    'fund_name': fund['fund_name'],
+                    'fund_symbol': fund['fund_symbol'],
+                    'amount': buy_amount,
+                    'reason': f'Strong performer: {fund["returns_1year"]:.1f}% annual return',
+                    'current_performance': fund['returns_1year'],
+                    'expected_units': buy_amount / fund['current_price']
+                })
+
+    scenarios.append({
+        'id': 1,
+        'name': 'Conservative Rebalancing',
+        'description': 'Gradual rebalancing with minimal risk, focusing on reducing underperforming assets',
+        'risk_level': 'Low',
+        'expected_return': '+2.5% annually',
+        'timeframe': '6-12 months',
+        'cost': '$25-40',
+        'actions': conservative_actions,
+        'allocation_change': {
+            'equity_change': 0 if asset_class != 'equities' else 2,
+            'bond_change': 0 if asset_class != 'bonds' else 1,
+            'cash_change': 0 if asset_class != 'cash' else -3
+        }
+    })
+
+    # Scenario 2: Moderate Rebalancing
+    moderate_actions = []
+    # More aggressive selling of poor performers
+    for holding in current_holdings:
+        if holding['performance_rating'] in ['Poor', 'Below Average'] and holding['current_value'] > 800:
+            moderate_actions.append({
+                'type': 'sell',
+                'fund_name': holding['fund_name'],
+                'fund_symbol': holding['fund_symbol'],
+                'amount': min(holding['current_value'] * 0.6, 5000),  # Sell 60% or max $5000
+                'reason': f'Poor performance ({holding["return_percent"]:.1f}%), better opportunities available',
+                'current_performance': holding['return_percent'],
+                'units': holding['units_held'] * 0.6
+            })
+
+    # Include some average performers for more comprehensive rebalancing
+    for holding in current_holdings:
+        if holding['performance_rating'] == 'Average' and holding['current_value'] > 2000 and len(moderate_actions) < 5:
+            moderate_actions.append({
+                'type': 'sell',
+                'fund_name': holding['fund_name'],
+                'fund_symbol': holding['fund_symbol'],
+                'amount': min(holding['current_value'] * 0.4, 3000),
+                'reason': f'Reallocating from average performer to optimize returns',
+                'current_performance': holding['return_percent'],
+                'units': holding['units_held'] * 0.4
+            })
+
+    # Buy more recommended funds
+    if recommended_funds:
+        total_sell_amount = sum(action['amount'] for action in moderate_actions if action['type'] == 'sell')
+        if total_sell_amount < 1500:  # Ensure minimum buying power
+            total_sell_amount = 3000
+
+        for i, fund in enumerate(recommended_funds[:4]):  # Buy top 4 recommended
+            buy_amount = total_sell_amount / 4 if i < 4 else 0
+            if buy_amount > 400:
+                moderate_actions.append({
+                    'type': 'buy',
+                    'fund_name': fund['fund_name'],
+                    'fund_symbol': fund['fund_symbol'],
+                    'amount': buy_amount,
+                    'reason': f'Excellent growth potential: {fund["returns_1year"]:.1f}% return, {fund["performance_rating"]} rated',
+                    'current_performance': fund['returns_1year'],
+                    'expected_units': buy_amount / fund['current_price']
+                })
+
+    scenarios.append({
+        'id': 2,
+        'name': 'Moderate Rebalancing',
+        'description': 'Balanced approach with strategic reallocation to optimize performance',
+        'risk_level': 'Medium',
+        'expected_return': '+4.2% annually',
+        'timeframe': '3-6 months',
+        'cost': '$40-65',
+        'actions': moderate_actions,
+        'allocation_change': {
+            'equity_change': 0 if asset_class != 'equities' else 3,
+            'bond_change': 0 if asset_class != 'bonds' else 2,
+            'cash_change': 0 if asset_class != 'cash' else -5
+        }
+    })
+
+    # Scenario 3: Aggressive Rebalancing
+    aggressive_actions = []
+    # Sell most underperforming and average holdings
+    for holding in current_holdings:
+        if holding['performance_rating'] in ['Poor', 'Below Average', 'Average'] and holding['current_value'] > 500:
+            sell_percentage = 0.8 if holding['performance_rating'] in ['Poor', 'Below Average'] else 0.5
+            aggressive_actions.append({
+                'type': 'sell',
+                'fund_name': holding['fund_name'],
+                'fund_symbol': holding['fund_symbol'],
+                'amount': min(holding['current_value'] * sell_percentage, 8000),  # Sell 50-80% or max $8000
+                'reason': f'Maximizing portfolio optimization ({holding["return_percent"]:.1f}% → targeting 15%+ returns)',
+                'current_performance': holding['return_percent'],
+                'units': holding['units_held'] * sell_percentage
+            })
+
+    # Buy top recommended funds
+    if recommended_funds:
+        total_sell_amount = sum(action['amount'] for action in aggressive_actions if action['type'] == 'sell')
+        if total_sell_amount < 2000:  # Ensure substantial buying power for aggressive strategy
+            total_sell_amount = 5000
+
+        for i, fund in enumerate(recommended_funds[:5]):  # Buy top 5 recommended
+            buy_amount = total_sell_amount / 5 if i < 5 else 0
+            if buy_amount > 500:  # Reasonable minimum for aggressive strategy
+                aggressive_actions.append({
+                    'type': 'buy',
+                    'fund_name': fund['fund_name'],
+                    'fund_symbol': fund['fund_symbol'],
+                    'amount': buy_amount,
+                    'reason': f'Top-tier opportunity: {fund["returns_1year"]:.1f}% annual returns, {fund["performance_rating"]} rating',
+                    'current_performance': fund['returns_1year'],
+                    'expected_units': buy_amount / fund['current_price']
+                })
+
+    scenarios.append({
+        'id': 3,
+        'name': 'Aggressive Rebalancing',
+        'description': 'Maximum optimization for growth, substantial portfolio restructuring',
+        'risk_level': 'High',
+        'expected_return': '+6.8% annually',
+        'timeframe': '1-3 months',
+        'cost': '$65-100',
+        'actions': aggressive_actions,
+        'allocation_change': {
+            'equity_change': 0 if asset_class != 'equities' else 5,
+            'bond_change': 0 if asset_class != 'bonds' else 3,
+            'cash_change': 0 if asset_class != 'cash' else -8
+        }
+    })
+    return scenarios
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall-clock time of func(*args) over repeat runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_drift():
+    """Latency of the legacy per-customer loop vs the snapshot-backed drift engine"""
+    print(f"\n{'='*60}")
+    print("DRIFT ENGINE: latency vs number of users")
+    print(f"{'='*60}")
+    print(f"{'users':>8} {'legacy (ms)':>14} {'engine (ms)':>14} {'speedup':>10}")
+    for num_users in [100, 1000, 5000, 20000, 40000]:
+        conn = build_synthetic_db(num_users)
+        legacy_ms = time_call(legacy_drift, conn)
+        engine_ms = time_call(compute_portfolio_drift, conn)
+        conn.close()
+        print(f"{num_users:>8} {legacy_ms:>14.1f} {engine_ms:>14.1f} {legacy_ms / engine_ms:>9.1f}x")
+
+
+def bench_scenarios():
+    """Scenario generation for a whole book: per-user Python loops vs one batched array pass"""
+    print(f"\n{'='*60}")
+    print("SCENARIO ENGINE: Equity scenarios for every user")
+    print(f"{'='*60}")
+    print(f"{'users':>8} {'legacy (ms)':>14} {'engine (ms)':>14} {'speedup':>10}")
+    for num_users in [100, 1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=20)
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM investor_ref_data')]
+        legacy_ms = time_call(lambda: [legacy_scenarios(conn, user_id, 'Equity') for user_id in user_ids])
+        engine_ms = time_call(generate_scenarios, conn, user_ids, 'Equity')
+        conn.close()
+        print(f"{num_users:>8} {legacy_ms:>14.1f} {engine_ms:>14.1f} {legacy_ms / engine_ms:>9.1f}x")
+
+
+def write_product_file(path, num_rows, seed=42):
+    """Write a synthetic ProductMarketData file (.csv or .xlsx) with num_rows securities"""
+    rng = random.Random(seed)
+    rows = ((rng.choice(['Stocks', 'Bonds', 'ETFs', 'Real Estate']), rng.choice(['Technology', 'Healthcare', 'Energy']),
+             rng.choice(['Large Cap', 'Mid Cap', 'Small Cap']), 'Growth, Aggressive', f'Security {i} (S{i})',
+             f'S{i}', round(rng.uniform(1, 900), 2)) for i in range(num_rows))
+    headers = ['Invesment Type', 'Industry Sector', 'Market Segment', 'Investment Strategies',
+               'Investment Product', 'Symbol', 'Market Price (USD)']
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(headers)
+            writer.writerows(rows)
+    else:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+
+
+def legacy_product_load(conn, path):
+    """The old database_setup path: read the whole sheet into a DataFrame, then to_sql"""
+    import pandas as pd
+    frame = pd.read_csv(path) if path.endswith('.csv') else pd.read_excel(path)
+    frame.columns = PRODUCT_COLUMNS
+    frame.to_sql('product_market_data', conn, if_exists='append', index=False)
+
+
+def measure_load(loader, path):
+    """(seconds, peak traced MB) for loading path into a fresh in-memory database"""
+    results = []
+    for traced in (False, True):  # time without tracemalloc overhead, then measure memory
+        conn = sqlite3.connect(':memory:')
+        apply_migrations(conn, verbose=False)
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        loader(conn, path)
+        results.append(time.perf_counter() - start)
+        if traced:
+            results[-1] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        conn.close()
+    return tuple(results)
+
+
+def bench_product_load():
+    """Peak memory and time of the chunked product loader vs pandas read + to_sql"""
+    print(f"\n{'='*60}")
+    print("PRODUCT LOADER: peak memory vs file size")
+    print(f"{'='*60}")
+    print(f"{'file':>14} {'legacy MB':>11} {'chunked MB':>11} {'legacy s':>10} {'chunked s':>10}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for extension, sizes in [('csv', [10000, 100000, 300000]), ('xlsx', [5000, 20000])]:
+            for num_rows in sizes:
+                path = os.path.join(work_dir, f'products_{num_rows}.{extension}')
+                write_product_file(path, num_rows)
+                legacy_s, legacy_mb = measure_load(legacy_product_load, path)
+                chunked_s, chunked_mb = measure_load(
+                    lambda conn, p: load_product_market_data(conn.cursor(), p), path)
+                label = f'{num_rows // 1000}k {extension}'
+                print(f"{label:>14} {legacy_mb:>11.1f} {chunked_mb:>11.1f} {legacy_s:>10.2f} {chunked_s:>10.2f}")
+
+
+def legacy_table_json(conn, table):
+    """The old table API path: a dict per row for the whole table, then a sorted-key json.dumps"""
+    result = query_table(conn, table, {})
+    data = result['data']
+    return json.dumps({'success': True, 'data': data, 'count': len(data)},
+                      sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def cursor_table_json(conn, table, encoder):
+    """The serializer path: rows encoded from the cursor in chunks"""
+    result = open_table_query(conn, table, {})
+    return encode_rows(result['columns'], result['rows'], encoder)[0]
+
+
+def measure_peak_mb(func, *args):
+    """Peak traced memory of func(*args), in MB"""
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return peak
+
+
+def bench_json():
+    """/api/investor-data body: dicts + json.dumps vs cursor encoding with each installed encoder"""
+    print(f"\n{'='*60}")
+    print("JSON SERIALIZERS: /api/investor-data response body")
+    print(f"{'='*60}")
+    if 'orjson' not in ENCODERS:
+        print("⚠️ orjson is not installed; only the stdlib encoder is measured")
+    print(f"{'users':>8} {'encoder':>10} {'ms':>10} {'peak MB':>10}")
+    for num_users in [1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=2)
+        legacy_ms = time_call(legacy_table_json, conn, 'investor-data')
+        print(f"{num_users:>8} {'legacy':>10} {legacy_ms:>10.1f} "
+              f"{measure_peak_mb(legacy_table_json, conn, 'investor-data'):>10.1f}")
+        for name, encoder in ENCODERS.items():
+            encoder_ms = time_call(cursor_table_json, conn, 'investor-data', encoder)
+            print(f"{num_users:>8} {name:>10} {encoder_ms:>10.1f} "
+                  f"{measure_peak_mb(cursor_table_json, conn, 'investor-data', encoder):>10.1f}")
+        conn.close()
+
+
+# The chat agents' vocabularies, in the old if/elif order
+CHAT_INTENTS = [
+    ('rebalancing', ['rebalance', 'buy', 'sell', 'allocation']),
+    ('risk', ['risk', 'safe', 'protect', 'lose']),
+    ('planning', ['goal', 'retire', 'plan', 'future']),
+    ('market', ['market', 'news', 'trend', 'economy'])
+]
+
+
+def legacy_route(message, intents):
+    """The old process_chat_message dispatch: one any() substring scan per agent, first hit wins"""
+    message_lower = message.lower()
+    for name, keywords in intents:
+        if any(word in message_lower for word in keywords):
+            return name
+    return 'general'
+
+
+def synthetic_intents(num_agents, keywords_per_agent, seed=42):
+    """The chat vocabularies padded out with made-up agents and words"""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    intents = [(name, list(keywords)) for name, keywords in CHAT_INTENTS]
+    for i in range(num_agents - len(intents)):
+        intents.append((f'agent{i}', []))
+    for _, keywords in intents:
+        while len(keywords) < keywords_per_agent:
+            keywords.append(''.join(rng.choice(letters) for _ in range(rng.randint(5, 10))))
+    return intents
+
+
+def chat_messages(num_messages, seed=42):
+    """Synthetic advisor questions, some matching a keyword and some not"""
+    rng = random.Random(seed)
+    templates = ['Should I {} my portfolio this quarter?', 'What is the {} outlook for my holdings?',
+                 'Can you explain how my investments are doing overall and what I should {} next?',
+                 'Tell me about {} and my retirement goal', 'Hello there, how are you today?']
+    words = [keyword for _, keywords in CHAT_INTENTS for keyword in keywords] + ['review', 'hold', 'check']
+    return [rng.choice(templates).format(rng.choice(words)) for _ in range(num_messages)]
+
+
+def bench_intents():
+    """Chat messages routed per second: per-agent substring scans vs the compiled intent router"""
+    print(f"\n{'='*60}")
+    print("INTENT ROUTER: messages routed per second")
+    print(f"{'='*60}")
+    print(f"{'agents x keywords':>18} {'legacy msg/s':>14} {'router msg/s':>14} {'speedup':>10}")
+    messages = chat_messages(20000)
+    for num_agents, keywords_per_agent in [(4, 4), (10, 50), (25, 200)]:
+        intents = synthetic_intents(num_agents, keywords_per_agent)
+        router = IntentRouter()
+        for name, keywords in intents:
+            router.register(name, keywords)
+        legacy_ms = time_call(lambda: [legacy_route(message, intents) for message in messages])
+        router_ms = time_call(lambda: [router.match(message) for message in messages])
+        label = f'{num_agents} x {keywords_per_agent}'
+        print(f"{label:>18} {len(messages) / legacy_ms * 1000:>14,.0f} {len(messages) / router_ms * 1000:>14,.0f} "
+              f"{legacy_ms / router_ms:>9.1f}x")
+
+
+def legacy_risk_alerts(conn, user_id):
+    """The old per-user concentration check, recomputing the portfolio total per row twice"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT fund_name, current_value,
+               (current_value * 100.0 / (SELECT SUM(current_value) FROM user_holdings WHERE user_id = ?)) as percentage
+        FROM user_holdings
+        WHERE user_id = ? AND
+              (current_value * 100.0 / (SELECT SUM(current_value) FROM user_holdings WHERE user_id = ?)) > 30
+    ''', (user_id, user_id, user_id))
+    return cursor.fetchall()
+
+
+def bench_risk_scan():
+    """Alerts for the whole book: the old per-user concentration query vs the three-check scan"""
+    print(f"\n{'='*60}")
+    print("RISK SCAN: alerts for every user")
+    print(f"{'='*60}")
+    print(f"{'users':>8} {'per-user (ms)':>14} {'scan (ms)':>14} {'speedup':>10}")
+    for num_users in [100, 1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=8)
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM investor_ref_data')]
+        legacy_ms = time_call(lambda: [legacy_risk_alerts(conn, user_id) for user_id in user_ids])
+        scan_ms = time_call(scan_risk_alerts, conn.cursor())
+        conn.close()
+        print(f"{num_users:>8} {legacy_ms:>14.1f} {scan_ms:>14.1f} {legacy_ms / scan_ms:>9.1f}x")
+
+
+def legacy_monitoring(agent, cursor):
+    """The old sweep: list every user with holdings, then one snapshot lookup each"""
+    cursor.execute('SELECT DISTINCT user_id FROM user_holdings')
+    alerts = []
+    for (user_id,) in cursor.fetchall():
+        alert = agent.check_user_portfolio(cursor, user_id)
+        if alert:
+            alerts.append(alert)
+    return alerts
+
+
+def bench_monitoring():
+    """Rebalancing alerts for the whole book: per-user snapshot lookups vs one filtered sweep"""
+    print(f"\n{'='*60}")
+    print("MONITORING: rebalancing alerts for every user")
+    print(f"{'='*60}")
+    print(f"{'users':>8} {'per-user (ms)':>14} {'sweep (ms)':>14} {'speedup':>10}")
+    agent = AutoRebalancingAgent(db_path=None)
+    for num_users in [100, 1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=8)
+        legacy_ms = time_call(legacy_monitoring, agent, conn.cursor())
+        sweep_ms = time_call(lambda: list(agent.sweep_portfolios(conn.cursor())))
+        conn.close()
+        print(f"{num_users:>8} {legacy_ms:>14.1f} {sweep_ms:>14.1f} {legacy_ms / sweep_ms:>9.1f}x")
+
+
+def target_plans(conn, user_ids):
+    """The bulk job's default planner: every asset class all the way back to target"""
+    portfolios = load_batch_positions(conn, user_ids)
+    buy_candidates = load_buy_candidates(conn)
+    return {user_id: plan_target_orders(portfolio, buy_candidates) for user_id, portfolio in portfolios.items()}
+
+
+def plan_turnover(sells, buys):
+    return sum(order['amount'] for order in sells) + sum(order['amount'] for order in buys)
+
+
+def add_positions(conn, user_id, num_positions, seed=42):
+    """Give one synthetic investor num_positions more holdings (funds repeat across positions)"""
+    rng = random.Random(seed)
+    rows = []
+    for k in range(num_positions):
+        j = k % NUM_SYNTHETIC_FUNDS
+        price = rng.uniform(10, 500)
+        units = rng.uniform(1, 100)
+        rows.append((user_id, f'F{j:03d}', f'Fund {j}', ASSET_CLASSES[j % len(ASSET_CLASSES)], units, price,
+                     price * units, price * units, rng.uniform(-30, 30), rng.choice(RATINGS), 'Medium', 0.1))
+    conn.executemany('''
+        INSERT INTO user_holdings (user_id, fund_symbol, fund_name, asset_class, units_held,
+            current_price, invested_amount, current_value, return_percent, performance_rating,
+            risk_rating, expense_ratio)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def bench_solver():
+    """Rebalancing the whole book: back-to-target planner vs the minimum-turnover band solver"""
+    print(f"\n{'='*60}")
+    print("SOLVER: whole-book rebalancing plans")
+    print(f"{'='*60}")
+    print(f"{'users':>8} {'target (ms)':>12} {'solver (ms)':>12} {'target turnover':>16} {'solver turnover':>16}")
+    for num_users in [100, 1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=8)
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM investor_ref_data')]
+        target_ms = time_call(target_plans, conn, user_ids)
+        solver_ms = time_call(solve_rebalancing, conn)
+        target_turnover = sum(plan_turnover(*plan) for plan in target_plans(conn, user_ids).values())
+        solver_turnover = sum(plan['turnover'] for plan in solve_rebalancing(conn).values())
+        conn.close()
+        print(f"{num_users:>8} {target_ms:>12.1f} {solver_ms:>12.1f} {target_turnover:>16,.0f} {solver_turnover:>16,.0f}")
+
+    print(f"\n{'positions':>10} {'solve one portfolio (ms)':>26}")
+    for num_positions in [10, 100, 500, 1000]:
+        conn = build_synthetic_db(1, holdings_per_user=1)
+        add_positions(conn, 'USR000000', num_positions)
+        solve_ms = time_call(solve_rebalancing, conn, ['USR000000'])
+        conn.close()
+        print(f"{num_positions:>10} {solve_ms:>26.2f}")
+
+
+def row_by_row_revaluation(conn):
+    """Reprice holdings one UPDATE per changed row, looking up each fund's price in Python"""
+    prices = dict(conn.execute('SELECT fund_symbol, current_price FROM funds_universe'))
+    updates = []
+    for holding_id, symbol, units, price, invested in conn.execute(
+            'SELECT id, fund_symbol, units_held, current_price, invested_amount FROM user_holdings'):
+        new_price = prices.get(symbol)
+        if new_price is not None and new_price != price:
+            value = units * new_price
+            updates.append((new_price, value, round((value - invested) * 100.0 / invested, 2), holding_id))
+    conn.executemany('''
+        UPDATE user_holdings SET current_price = ?, current_value = ?, return_percent = ? WHERE id = ?
+    ''', updates)
+    refresh_portfolio_snapshots(conn.cursor())
+    conn.commit()
+
+
+def copy_db(conn):
+    """An in-memory copy of a synthetic database"""
+    copy = sqlite3.connect(':memory:')
+    conn.backup(copy)
+    copy.row_factory = sqlite3.Row
+    return copy
+
+
+def bench_revaluation():
+    """Repricing every holding after half the fund prices move: row-by-row vs one set-based UPDATE"""
+    print(f"\n{'='*60}")
+    print("REVALUATION: mark holdings to the latest fund prices")
+    print(f"{'='*60}")
+    print(f"{'holdings':>10} {'row-by-row (ms)':>16} {'set-based (ms)':>16} {'speedup':>10}")
+    rng = random.Random(7)
+    for num_users in [1250, 12500, 125000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=8)
+        revalue_holdings(conn, ('funds',))  # start from a book marked to the current prices
+        conn.executemany('UPDATE funds_universe SET current_price = current_price * ? WHERE fund_symbol = ?',
+                         [(rng.uniform(0.8, 1.2), f'F{j:03d}') for j in range(0, NUM_SYNTHETIC_FUNDS, 2)])
+        conn.commit()
+
+        legacy_conn, set_conn = copy_db(conn), copy_db(conn)
+        conn.close()
+        start = time.perf_counter()
+        row_by_row_revaluation(legacy_conn)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        revalue_holdings(set_conn, ('funds',))
+        set_ms = (time.perf_counter() - start) * 1000
+        legacy_conn.close()
+        set_conn.close()
+        print(f"{num_users * 8:>10} {legacy_ms:>16.1f} {set_ms:>16.1f} {legacy_ms / set_ms:>9.1f}x")
+
+
+def bench_ticks():
+    """A fund's price moves: full-book revaluation vs a tick applied through the reverse index"""
+    print(f"\n{'='*60}")
+    print("PRICE TICKS: reprice the holders of one fund")
+    print(f"{'='*60}")
+    print("(widely held: 1 of 40 funds in every book; niche: 50 holders)")
+    print(f"{'holdings':>10} {'index build (ms)':>17} {'fund':>7} {'full scan (ms)':>15} {'tick (ms)':>10} {'speedup':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_users in [1250, 12500, 125000]:
+            # The index reads through the connection pool, so this benchmark needs a file database
+            path = os.path.join(tmp, f'ticks_{num_users}.db')
+            conn = build_synthetic_db(num_users, holdings_per_user=8)
+            conn.execute("INSERT INTO funds_universe (fund_symbol, fund_name, asset_class, current_price) "
+                         "VALUES ('NICHE', 'Niche Fund', 'Equity', 100)")
+            conn.executemany('''
+                INSERT INTO user_holdings (user_id, fund_symbol, fund_name, asset_class, units_held,
+                    current_price, invested_amount, current_value)
+                VALUES (?, 'NICHE', 'Niche Fund', 'Equity', 10, 100, 1000, 1000)
+            ''', [(f'USR{i:06d}',) for i in range(0, num_users, num_users // 50)])
+            conn.commit()
+            revalue_holdings(conn, ('funds',))
+            disk = sqlite3.connect(path)
+            conn.backup(disk)
+            disk.close()
+            conn.close()
+
+            conn = sqlite3.connect(path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            index = HoldingsIndex(db_path=path)
+            build_ms = time_call(index.rebuild, repeat=1)
+            for label, symbol in (('wide', 'F000'), ('niche', 'NICHE')):
+                conn.execute('UPDATE funds_universe SET current_price = current_price * 1.01 WHERE fund_symbol = ?',
+                             (symbol,))
+                full_ms = time_call(revalue_holdings, conn, ('funds',), repeat=1)
+                price = conn.execute('SELECT current_price FROM funds_universe WHERE fund_symbol = ?',
+                                     (symbol,)).fetchone()[0]
+                tick_ms = time_call(apply_ticks, conn, [(symbol, price * 1.01)], index, repeat=1)
+                print(f"{num_users * 8:>10} {build_ms:>17.1f} {label:>7} {full_ms:>15.1f} {tick_ms:>10.1f} "
+                      f"{full_ms / tick_ms:>9.1f}x")
+            conn.close()
+
+
+def looped_projection(inputs):
+    """Simulate one path and one year at a time with the random module"""
+    rng = random.Random(inputs.seed)
+    chol = [[0.0] * 4 for _ in range(4)]
+    for i in range(4):
+        for j in range(i + 1):
+            total = CORRELATIONS[i][j] - sum(chol[i][k] * chol[j][k] for k in range(j))
+            chol[i][j] = total ** 0.5 if i == j else total / chol[j][j]
+    assumptions = [RETURN_ASSUMPTIONS[asset_class] for asset_class in ASSET_CLASSES]
+    finals = []
+    for _ in range(inputs.paths):
+        value = inputs.start_value
+        for year in range(1, inputs.years + 1):
+            z = [rng.gauss(0, 1) for _ in range(4)]
+            gross = 0.0
+            for i, (mean, vol) in enumerate(assumptions):
+                shock = sum(chol[i][k] * z[k] for k in range(i + 1))
+                gross += inputs.weights[i] * 2.718281828459045 ** (math.log1p(mean) - vol ** 2 / 2 + vol * shock)
+            value = value * gross + (inputs.annual_contribution if year <= inputs.contribution_years else 0)
+        finals.append(value)
+    return sum(value >= inputs.goals[0].target_amount for value in finals) / inputs.paths
+
+
+def bench_projections():
+    """Goal projections: per-path Python loop vs vectorized paths, the fingerprint cache and a process pool"""
+    print(f"\n{'='*60}")
+    print("PROJECTIONS: Monte Carlo goal success probabilities")
+    print(f"{'='*60}")
+    inputs = make_inputs([60000, 30000, 5000, 5000], 100000, 10000, 25,
+                         [Goal('retirement', 1000000, 25)], paths=5000)
+    looped_ms = time_call(looped_projection, inputs, repeat=1)
+    vector_ms = time_call(simulate_projection, inputs)
+    cache = ProjectionCache()
+    project_many({'u': inputs}, cache=cache)
+    cached_ms = time_call(project_many, {'u': inputs}, 0, cache)
+    print(f"one portfolio, 5,000 paths x 25 years: looped {looped_ms:.1f} ms, vectorized {vector_ms:.1f} ms "
+          f"({looped_ms / vector_ms:.0f}x), cached {cached_ms:.3f} ms")
+
+    workers = max(2, min(4, os.cpu_count() or 1))
+    print(f"\n({os.cpu_count()} CPUs; the pool only pays off with spare cores)")
+    print(f"{'portfolios':>10} {'distinct mixes':>15} {'serial (ms)':>12} {f'{workers} processes (ms)':>17}")
+    rng = random.Random(3)
+    for num_users in [50, 200, 1000]:
+        book = {}
+        for i in range(num_users):
+            equity = rng.randint(2, 16) * 5000  # many investors share a mix, as model portfolios do
+            book[f'USR{i:06d}'] = make_inputs([equity, 100000 - equity, 0, 0], 100000, 10000,
+                                              rng.randint(5, 35), [Goal('retirement', 1000000, 30)], paths=2000)
+        serial_ms = time_call(project_many, book, 0, ProjectionCache(), repeat=1)
+        pool_ms = time_call(project_many, book, workers, ProjectionCache(), repeat=1)
+        print(f"{num_users:>10} {len(set(book.values())):>15} {serial_ms:>12.1f} {pool_ms:>17.1f}")
+
+
+def add_price_history(conn, symbols, num_days, last_day_ago=1, seed=42):
+    """Daily closes for symbols over num_days, ending last_day_ago days before today"""
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    prices = {symbol: rng.uniform(10, 500) for symbol in symbols}
+    rows = []
+    for day in range(last_day_ago + num_days - 1, last_day_ago - 1, -1):
+        market = rng.gauss(0, 0.01)
+        price_date = (today - datetime.timedelta(days=day)).isoformat()
+        for symbol in symbols:
+            prices[symbol] *= math.exp(market + rng.gauss(0, 0.008))
+            rows.append((symbol, price_date, prices[symbol]))
+    conn.executemany('INSERT OR REPLACE INTO fund_price_history (fund_symbol, price_date, price) VALUES (?, ?, ?)',
+                     rows)
+    conn.commit()
+
+
+def recomputed_covariance(conn):
+    """Re-read the last year of history and rebuild the covariance with np.cov"""
+    history = {}
+    for symbol, price in conn.execute('''
+            SELECT fund_symbol, price FROM fund_price_history
+            WHERE price_date >= date('now', '-253 days') AND price_date < date('now')
+            ORDER BY price_date'''):
+        history.setdefault(symbol, []).append(price)
+    returns = np.diff(np.log(np.array(list(history.values()))), axis=1)
+    return np.cov(returns) * 252
+
+
+def per_user_risk(conn, covariance):
+    """The risk agent's path run for every user: one portfolio_risk call each"""
+    user_ids = [row[0] for row in conn.execute('SELECT user_id FROM investor_ref_data').fetchall()]
+    return {user_id: portfolio_risk(conn, [user_id], covariance=covariance) for user_id in user_ids}
+
+
+def bench_risk_engine():
+    """Fund covariance: full recompute vs one incremental day; portfolio VaR: per user vs one batch"""
+    print(f"\n{'='*60}")
+    print("RISK ENGINE: covariance upkeep and portfolio volatility / VaR")
+    print(f"{'='*60}")
+    print(f"{'funds':>8} {'recompute (ms)':>15} {'+1 day (ms)':>12} {'speedup':>10}")
+    for num_funds in [40, 200, 500]:
+        conn = build_synthetic_db(1, holdings_per_user=1)
+        symbols = [f'H{j:04d}' for j in range(num_funds)]
+        add_price_history(conn, symbols, COVARIANCE_DAYS, last_day_ago=2)
+        covariance = FundCovariance()
+        covariance.refresh(conn)
+        recompute_ms = time_call(recomputed_covariance, conn)
+        add_price_history(conn, symbols, 1, last_day_ago=1, seed=7)
+        start = time.perf_counter()
+        covariance.refresh(conn, force=True)
+        covariance.estimated()
+        day_ms = (time.perf_counter() - start) * 1000
+        conn.close()
+        print(f"{num_funds:>8} {recompute_ms:>15.1f} {day_ms:>12.1f} {recompute_ms / day_ms:>9.1f}x")
+
+    print(f"\n{'users':>8} {'per-user (ms)':>14} {'batched (ms)':>13} {'speedup':>10}")
+    for num_users in [1000, 5000, 20000]:
+        conn = build_synthetic_db(num_users, holdings_per_user=8)
+        symbols = [f'F{j:03d}' for j in range(NUM_SYNTHETIC_FUNDS)]
+        add_price_history(conn, symbols, COVARIANCE_DAYS)
+        covariance = FundCovariance()
+        covariance.refresh(conn)
+        legacy_ms = time_call(per_user_risk, conn, covariance, repeat=1)
+        batch_ms = time_call(portfolio_risk, conn, None, 0.95, 1, covariance, repeat=1)
+        conn.close()
+        print(f"{num_users:>8} {legacy_ms:>14.1f} {batch_ms:>13.1f} {legacy_ms / batch_ms:>9.1f}x")
+
+
+BENCHMARKS = {
+    'drift': bench_drift,
+    'scenarios': bench_scenarios,
+    'product_load': bench_product_load,
+    'json': bench_json,
+    'intents': bench_intents,
+    'risk_scan': bench_risk_scan,
+    'monitoring': bench_monitoring,
+    'solver': bench_solver,
+    'revaluation': bench_revaluation,
+    'ticks': bench_ticks,
+    'projections': bench_projections,
+    'risk_engine': bench_risk_engine
+}
+
+
+def main():
+    """Run the selected benchmarks (all by default)"""
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
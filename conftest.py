@@ -0,0 +1,45 @@
+"""
+Shared Test Setup
+Every test runs against scratch copies of the portal database. The app's database is
+pointed at a session-wide copy before any backend module is imported (db reads
+PORTFOLIO_DB_PATH once, on import), and the seeded_db fixtures give a test its own
+migrated copy to write to.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(ROOT, 'database', 'portfolio_management.db')
+
+# pytest imports this before any test module, so the real database is never migrated or written
+WORK_DIR = tempfile.mkdtemp(prefix='portfolio_tests_')
+os.environ['PORTFOLIO_DB_PATH'] = os.path.join(WORK_DIR, 'portfolio_management.db')
+shutil.copyfile(SOURCE_DB, os.environ['PORTFOLIO_DB_PATH'])
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from db import get_db_connection  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+
+
+@pytest.fixture
+def seeded_db_path(tmp_path):
+    """Path of this test's own migrated copy of the portal database"""
+    path = str(tmp_path / 'portfolio_management.db')
+    shutil.copyfile(SOURCE_DB, path)
+    conn = get_db_connection(path)
+    apply_migrations(conn, verbose=False)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def seeded_db(seeded_db_path):
+    """A connection to this test's own copy of the portal database"""
+    conn = get_db_connection(seeded_db_path)
+    yield conn
+    conn.close()
@@ -11,6 +11,23 @@ class PortfolioApp {
         this.selectedScenario = null;
         this.currentAssetClass = null;
         
+        // Table APIs are paged on the server; rows are fetched lazily as the user scrolls
+        this.pagedTables = ['investor-data', 'portfolio-allocation', 'product-market-data', 'master-allocation-model'];
+        this.pageSize = 100;
+        this.pagination = null;
+        this.searchTerm = '';
+        this.searchTimer = null;
+        this.loadMoreObserver = null;
+        
+        // Investor view filter buttons, applied on the server as table API column filters
+        this.clientFilter = 'all';
+        this.clientFilters = {
+            'conservative': [['risk_capacity', 'Conservative'], ['risk_capacity', 'Low'], ['risk_capacity', 'Very Low']],
+            'moderate': [['risk_capacity', 'Moderate'], ['risk_capacity', 'Medium']],
+            'aggressive': [['risk_capacity', 'Aggressive'], ['risk_capacity', 'High'], ['risk_capacity', 'Very High']],
+            'high-net-worth': [['total_portfolio_value_min', '500000']]
+        };
+        
         this.init();
     }
 
@@ -216,6 +233,13 @@ class PortfolioApp {
         // Clear data arrays
         this.currentData = [];
         this.filteredData = [];
+        this.pagination = null;
+        this.searchTerm = '';
+        this.clientFilter = 'all';
+        if (this.loadMoreObserver) {
+            this.loadMoreObserver.disconnect();
+            this.loadMoreObserver = null;
+        }
         
         // Destroy any existing charts
         Object.values(this.charts).forEach(chart => {
@@ -333,13 +357,12 @@ class PortfolioApp {
         this.showLoadingSpinner();
         
         try {
-            // Add cache-busting parameter to ensure fresh data
-            const cacheBuster = Date.now();
-            const response = await fetch(`${this.baseUrl}/api/${tableName}?_cb=${cacheBuster}`);
-            const result = await response.json();
+            // Only the first page is fetched up front
+            const result = await this.fetchTablePage(tableName);
             
             if (result.success) {
                 // Store fresh data
+                this.pagination = { nextCursor: result.next_cursor || null, total: result.total, loading: false };
                 this.currentData = result.data;
                 this.filteredData = [...this.currentData];
                 
@@ -361,6 +384,125 @@ class PortfolioApp {
         }
     }
 
+    tableQueryParams(tableName) {
+        // Search and the investor view's client filter, as the table, summary and export APIs take them
+        const params = new URLSearchParams();
+        if (this.searchTerm) {
+            params.set('q', this.searchTerm);
+        }
+        if (tableName === 'investor-data') {
+            (this.clientFilters[this.clientFilter] || []).forEach(([name, value]) => params.append(name, value));
+        }
+        return params;
+    }
+
+    async fetchTablePage(tableName, after = null) {
+        // No cache-buster: the server revalidates with ETags and answers 304 when nothing changed
+        const params = this.tableQueryParams(tableName);
+        params.set('limit', this.pageSize);
+        if (after) {
+            params.set('after', after);
+        }
+        
+        const response = await fetch(`${this.baseUrl}/api/${tableName}?${params}`);
+        const result = await response.json();
+        
+        // Total matching rows on the server (falls back to the rows received for unpaged APIs)
+        const total = parseInt(response.headers.get('X-Total-Count'), 10);
+        result.total = isNaN(total) ? (result.data || []).length : total;
+        return result;
+    }
+
+    async loadMoreRows() {
+        const pagination = this.pagination;
+        if (!pagination || !pagination.nextCursor || pagination.loading) {
+            return;
+        }
+        
+        pagination.loading = true;
+        try {
+            const result = await this.fetchTablePage(this.currentTable, pagination.nextCursor);
+            
+            // Ignore a page that arrives after the user switched tables or searched again
+            if (pagination !== this.pagination) {
+                return;
+            }
+            
+            if (result.success) {
+                this.pagination = { nextCursor: result.next_cursor || null, total: result.total, loading: false };
+                this.currentData = this.currentData.concat(result.data);
+                this.filteredData = [...this.currentData];
+                this.appendRows(this.currentTable, result.data);
+            } else {
+                pagination.loading = false;
+                console.error('Error loading more rows:', result.error);
+            }
+        } catch (error) {
+            pagination.loading = false;
+            console.error('Error loading more rows:', error);
+        }
+    }
+
+    appendRows(tableName, rows) {
+        // Only the new page is rendered; rebuilding every loaded row per page would grow quadratically
+        const containers = {
+            'investor-data': ['clientCardsGrid', () => this.createInvestorCards(rows)],
+            'portfolio-allocation': ['portfolioCardsGrid', () => rows.map(row => this.createPortfolioCard(row)).join('')],
+            'product-market-data': ['investmentGrid', () => this.createInvestmentCards(rows)]
+        };
+        const [containerId, render] = containers[tableName] || ['tableBody', () => this.tableRowsHtml(rows, tableName)];
+        const container = document.getElementById(containerId);
+        
+        // Grouped views (allocation models) have no flat list to extend
+        if (!container || tableName === 'master-allocation-model') {
+            this.displayTable(tableName, this.filteredData);
+            return;
+        }
+        
+        container.insertAdjacentHTML('beforeend', render());
+        if (tableName === 'product-market-data') {
+            // Keep the active category filter on the new cards
+            const active = document.querySelector('.filter-btn.active');
+            this.filterInvestmentCards(active ? active.dataset.filter : 'all');
+        }
+        this.renderLoadMore();
+        this.updateRecordCount(this.currentData.length);
+    }
+
+    renderLoadMore() {
+        if (this.loadMoreObserver) {
+            this.loadMoreObserver.disconnect();
+            this.loadMoreObserver = null;
+        }
+        document.querySelectorAll('.load-more-rows').forEach(footer => footer.remove());
+        
+        const pagination = this.pagination;
+        if (!pagination || !pagination.nextCursor) {
+            return;
+        }
+        
+        const footer = document.createElement('div');
+        footer.className = 'load-more-rows';
+        footer.innerHTML = `
+            <button class="btn btn-secondary">
+                <i class="fas fa-chevron-down"></i>
+                Load more (${this.currentData.length} of ${pagination.total})
+            </button>
+        `;
+        footer.querySelector('button').addEventListener('click', () => this.loadMoreRows());
+        document.querySelector('.table-wrapper').appendChild(footer);
+        
+        // Fetch the next page as soon as the footer scrolls into view
+        if ('IntersectionObserver' in window) {
+            this.loadMoreObserver = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    this.loadMoreRows();
+                }
+            });
+            this.loadMoreObserver.observe(footer);
+        }
+    }
+
     displayTable(tableName, data) {
         // Ensure clean state before display
         this.clearPreviousViews();
@@ -394,6 +536,7 @@ class PortfolioApp {
             this.createTableBody(data, tableName);
         }
         
+        this.renderLoadMore();
         this.updateRecordCount(data.length);
     }
 
@@ -405,10 +548,8 @@ class PortfolioApp {
         const dataContainer = document.getElementById('dataContainer');
         dataContainer.classList.add('investor-data-view');
         
-        // Process data for professional display
-        const investorOverview = this.processInvestorData(data);
-        
-        // Create professional investor data layout
+        // Create professional investor data layout; the overview covers every matching
+        // investor, so it is filled in from the server rather than from the loaded page
         const tableWrapper = document.querySelector('.table-wrapper');
         tableWrapper.innerHTML = `
             <div class="investor-data-container">
@@ -419,11 +560,9 @@ class PortfolioApp {
                         Client Portfolio Overview
                     </h2>
                     <div class="overview-intro">
-                        <p>Comprehensive client database with ${data.length} active investors. Monitor portfolio performance, risk profiles, and investment preferences across your entire client base.</p>
-                    </div>
-                    <div class="client-stats-grid">
-                        ${this.createInvestorOverviewCards(investorOverview)}
+                        <p>Comprehensive client database with <span id="investorOverviewCount">…</span> active investors. Monitor portfolio performance, risk profiles, and investment preferences across your entire client base.</p>
                     </div>
+                    <div class="client-stats-grid" id="investorOverviewCards"></div>
                 </div>
                 
                 <!-- Client Categories -->
@@ -434,11 +573,10 @@ class PortfolioApp {
                             Client Profiles
                         </h2>
                         <div class="client-filters">
-                            <button class="client-filter-btn active" data-filter="all">All Clients</button>
-                            <button class="client-filter-btn" data-filter="conservative">Conservative</button>
-                            <button class="client-filter-btn" data-filter="moderate">Moderate</button>
-                            <button class="client-filter-btn" data-filter="aggressive">Aggressive</button>
-                            <button class="client-filter-btn" data-filter="high-net-worth">High Net Worth</button>
+                            ${[['all', 'All Clients'], ['conservative', 'Conservative'], ['moderate', 'Moderate'],
+                               ['aggressive', 'Aggressive'], ['high-net-worth', 'High Net Worth']].map(([filter, label]) =>
+                                `<button class="client-filter-btn ${filter === this.clientFilter ? 'active' : ''}" data-filter="${filter}">${label}</button>`
+                            ).join('')}
                         </div>
                     </div>
                     <div class="client-cards-grid" id="clientCardsGrid">
@@ -452,51 +590,57 @@ class PortfolioApp {
                         <i class="fas fa-analytics"></i>
                         Portfolio Analytics
                     </h2>
-                    <div class="analytics-grid">
-                        ${this.createPortfolioAnalytics(data)}
-                    </div>
+                    <div class="analytics-grid" id="investorAnalytics"></div>
                 </div>
             </div>
         `;
         
         // Add event listeners for filters
         this.attachInvestorDataListeners();
+        this.loadInvestorOverview();
     }
 
-    processInvestorData(data) {
-        const totalClients = data.length;
-        const totalAUM = data.reduce((sum, client) => sum + (parseFloat(client.total_portfolio_value) || 0), 0);
-        const avgPortfolioValue = totalClients > 0 ? totalAUM / totalClients : 0;
-        
-        // Risk profile distribution
-        const riskProfiles = {};
-        data.forEach(client => {
-            const risk = client.risk_capacity || 'Unknown';
-            riskProfiles[risk] = (riskProfiles[risk] || 0) + 1;
-        });
-        
-        // Age distribution
-        const ageGroups = { 'Under 30': 0, '30-45': 0, '46-60': 0, 'Over 60': 0 };
-        data.forEach(client => {
-            const age = parseInt(client.age) || 0;
-            if (age < 30) ageGroups['Under 30']++;
-            else if (age <= 45) ageGroups['30-45']++;
-            else if (age <= 60) ageGroups['46-60']++;
-            else ageGroups['Over 60']++;
-        });
-        
-        // Top performers by portfolio value
-        const topPerformers = data
-            .sort((a, b) => (parseFloat(b.total_portfolio_value) || 0) - (parseFloat(a.total_portfolio_value) || 0))
-            .slice(0, 5);
+    async loadInvestorOverview() {
+        // Aggregates over every investor matching the search (the client filter only narrows the cards)
+        const term = this.searchTerm;
+        const params = new URLSearchParams();
+        if (term) {
+            params.set('q', term);
+        }
         
+        try {
+            const response = await fetch(`${this.baseUrl}/api/investor-data/summary?${params}`);
+            const result = await response.json();
+            
+            if (!result.success) {
+                console.error('Error loading investor overview:', result.error);
+                return;
+            }
+            
+            // Ignore a summary that arrives after the user switched tables or searched again
+            const cards = document.getElementById('investorOverviewCards');
+            if (term !== this.searchTerm || this.currentTable !== 'investor-data' || !cards) {
+                return;
+            }
+            
+            const investorOverview = this.processInvestorData(result.summary);
+            document.getElementById('investorOverviewCount').textContent = investorOverview.totalClients.toLocaleString();
+            cards.innerHTML = this.createInvestorOverviewCards(investorOverview);
+            document.getElementById('investorAnalytics').innerHTML = this.createPortfolioAnalytics(investorOverview);
+        } catch (error) {
+            console.error('Error loading investor overview:', error);
+        }
+    }
+
+    processInvestorData(summary) {
+        // Server-side aggregates (see /api/investor-data/summary) in the shape the overview cards use
         return {
-            totalClients,
-            totalAUM,
-            avgPortfolioValue,
-            riskProfiles,
-            ageGroups,
-            topPerformers
+            totalClients: summary.total_clients,
+            totalAUM: summary.total_aum,
+            avgPortfolioValue: summary.avg_portfolio_value,
+            riskProfiles: summary.risk_profiles,
+            ageGroups: summary.age_groups,
+            topPerformers: summary.top_investors
         };
     }
 
@@ -635,12 +779,9 @@ class PortfolioApp {
         }).join('');
     }
 
-    createPortfolioAnalytics(data) {
-        const riskDistribution = {};
-        data.forEach(client => {
-            const risk = client.risk_capacity || 'Unknown';
-            riskDistribution[risk] = (riskDistribution[risk] || 0) + 1;
-        });
+    createPortfolioAnalytics(overview) {
+        const riskDistribution = overview.riskProfiles;
+        const totalClients = overview.totalClients || 1;
         
         return `
             <div class="analytics-card">
@@ -653,7 +794,7 @@ class PortfolioApp {
                         <div class="risk-item">
                             <div class="risk-label">${risk}</div>
                             <div class="risk-bar">
-                                <div class="risk-fill ${this.getInvestorRiskLevel(risk).class}" style="width: ${(count / data.length) * 100}%"></div>
+                                <div class="risk-fill ${this.getInvestorRiskLevel(risk).class}" style="width: ${(count / totalClients) * 100}%"></div>
                             </div>
                             <div class="risk-count">${count}</div>
                         </div>
@@ -728,21 +869,34 @@ class PortfolioApp {
         });
     }
 
-    filterInvestorCards(filter) {
-        const cards = document.querySelectorAll('.investor-card');
+    async filterInvestorCards(filter) {
+        // Filtered on the server, so the cards cover every matching client and not just the loaded pages
+        if (filter === this.clientFilter) {
+            return;
+        }
+        this.clientFilter = filter;
         
-        cards.forEach(card => {
-            if (filter === 'all') {
-                card.style.display = 'block';
-            } else if (filter === 'high-net-worth') {
-                const portfolioText = card.querySelector('.detail-value').textContent;
-                const portfolioValue = parseFloat(portfolioText.replace(/[$,]/g, ''));
-                card.style.display = portfolioValue >= 500000 ? 'block' : 'none';
+        try {
+            const result = await this.fetchTablePage('investor-data');
+            
+            // A newer filter or search has been applied in the meantime
+            if (filter !== this.clientFilter || this.currentTable !== 'investor-data') {
+                return;
+            }
+            
+            if (result.success) {
+                this.pagination = { nextCursor: result.next_cursor || null, total: result.total, loading: false };
+                this.currentData = result.data;
+                this.filteredData = [...this.currentData];
+                document.getElementById('clientCardsGrid').innerHTML = this.createInvestorCards(result.data);
+                this.renderLoadMore();
+                this.updateRecordCount(this.currentData.length);
             } else {
-                const riskCategory = card.dataset.risk;
-                card.style.display = riskCategory === filter ? 'block' : 'none';
+                console.error('Error filtering clients:', result.error);
             }
-        });
+        } catch (error) {
+            console.error('Error filtering clients:', error);
+        }
     }
 
     displayPortfolioAllocationProfessional(data) {
@@ -901,8 +1055,11 @@ class PortfolioApp {
     }
 
     createTableBody(data, tableName) {
-        const tbody = document.getElementById('tableBody');
-        tbody.innerHTML = data.map(row => {
+        document.getElementById('tableBody').innerHTML = this.tableRowsHtml(data, tableName);
+    }
+
+    tableRowsHtml(data, tableName) {
+        return data.map(row => {
             const cells = Object.values(row).map(value => {
                 return `<td>${this.formatCellValue(value)}</td>`;
             }).join('');
@@ -2022,6 +2179,13 @@ Status: Portfolio Successfully Rebalanced
     }
 
     filterData(searchTerm) {
+        // Paged tables are searched on the server so the search also covers rows that have not been loaded yet
+        if (this.pagedTables.includes(this.currentTable)) {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.searchTable(searchTerm.trim()), 300);
+            return;
+        }
+        
         if (!searchTerm.trim()) {
             this.filteredData = [...this.currentData];
         } else {
@@ -2037,6 +2201,34 @@ Status: Portfolio Successfully Rebalanced
         this.updateRecordCount(this.filteredData.length);
     }
 
+    async searchTable(term) {
+        if (!this.currentTable || term === this.searchTerm) {
+            return;
+        }
+        
+        this.searchTerm = term;
+        try {
+            const result = await this.fetchTablePage(this.currentTable);
+            
+            // A newer search has been issued in the meantime
+            if (term !== this.searchTerm) {
+                return;
+            }
+            
+            if (result.success) {
+                this.pagination = { nextCursor: result.next_cursor || null, total: result.total, loading: false };
+                this.currentData = result.data;
+                this.filteredData = [...this.currentData];
+                this.displayTable(this.currentTable, this.filteredData);
+            } else {
+                this.showError(`Error searching data: ${result.error}`);
+            }
+        } catch (error) {
+            console.error('Error searching table:', error);
+            this.showError('Failed to search data. Please try again.');
+        }
+    }
+
     updateTitle(tableName) {
         const titles = {
             'investor-data': 'Investor Reference Data - Client Profiles & Preferences',
@@ -2052,7 +2244,10 @@ Status: Portfolio Successfully Rebalanced
     updateRecordCount(count) {
         const recordCount = document.getElementById('recordCount');
         if (recordCount) {
-            recordCount.textContent = `${count} record${count !== 1 ? 's' : ''}`;
+            const total = this.pagination ? this.pagination.total : count;
+            recordCount.textContent = total > count
+                ? `${count} of ${total} records`
+                : `${count} record${count !== 1 ? 's' : ''}`;
         }
     }
 
@@ -2102,6 +2297,14 @@ Status: Portfolio Successfully Rebalanced
     }
 
     exportData() {
+        // Table APIs are exported by the server so the file covers every matching row, not just the loaded pages
+        if (this.pagedTables.includes(this.currentTable)) {
+            const params = this.tableQueryParams(this.currentTable);
+            params.set('format', 'csv');
+            window.location.href = `${this.baseUrl}/api/export/${this.currentTable}?${params}`;
+            return;
+        }
+        
         if (!this.filteredData.length) {
             alert('No data to export');
             return;
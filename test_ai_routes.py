@@ -0,0 +1,52 @@
+"""
+AI bulk route validation tests.
+Malformed request bodies and query parameters must be rejected with a 400, not answered
+with defaults or a 500. Runs against a copy of the portal database.
+Run with: python -m pytest -q test_ai_routes.py
+"""
+
+from app import app  # applies migrations to the scratch copy
+
+
+def assert_rejected(response, fragment):
+    assert response.status_code == 400, response.get_data(as_text=True)
+    body = response.get_json()
+    assert body['success'] is False and fragment in body['error']
+
+
+def test_goal_projections_reject_malformed_bodies():
+    client = app.test_client()
+    for body, fragment in [
+        ({'user_ids': 'USR000001'}, 'user_ids'),
+        ({'user_ids': ['USR000001', 7]}, 'user_ids'),
+        ({'user_ids': {'USR000001': True}}, 'user_ids'),
+        ({'goals': 'house:100000:5'}, 'goals'),
+        ({'goals': ['house:inf:5']}, 'positive number'),
+        ({'goals': ['house:nan:5']}, 'positive number'),
+        ({'goals': ['house:1e999:5']}, 'positive number'),
+        ({'user_ids': ['USR000001'], 'workers': 'two'}, 'workers'),
+        (['USR000001'], 'JSON object')
+    ]:
+        assert_rejected(client.post('/api/ai/goals/projections', json=body), fragment)
+
+
+def test_goal_projections_accept_a_list_of_user_ids():
+    response = app.test_client().post('/api/ai/goals/projections', json={'user_ids': ['USR000001']})
+    assert response.status_code == 200
+    assert set(response.get_json()['projections']) <= {'USR000001'}
+
+
+def test_risk_metrics_reject_non_numeric_parameters():
+    client = app.test_client()
+    for url, fragment in [
+        ('/api/ai/risk/metrics?confidence=abc', 'confidence'),
+        ('/api/ai/risk/metrics?horizon_days=1.5', 'horizon_days'),
+        ('/api/ai/risk/metrics/USR000001?confidence=nan', 'confidence'),
+        ('/api/ai/risk/metrics/USR000001?horizon_days=week', 'horizon_days')
+    ]:
+        assert_rejected(client.get(url), fragment)
+
+    response = client.get('/api/ai/risk/metrics?user_ids=USR000001&confidence=0.99&horizon_days=10')
+    assert response.status_code == 200
+    for metrics in response.get_json()['metrics_by_user'].values():
+        assert (metrics['confidence'], metrics['horizon_days']) == (0.99, 10)
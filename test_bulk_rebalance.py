@@ -0,0 +1,56 @@
+"""
+Bulk rebalancing tests.
+Malformed job requests are rejected with a 400, and finished jobs and their per-user
+outcomes stay bounded. Jobs run against their own copy of the portal database.
+Run with: python -m pytest -q test_bulk_rebalance.py
+"""
+
+import datetime
+
+import bulk_rebalance
+from app import app  # applies migrations to the scratch copy
+from bulk_rebalance import BulkRebalanceQueue
+
+
+def test_malformed_bulk_requests_are_rejected():
+    client = app.test_client()
+    for body, fragment in [
+        ({'portfolios': [{'selected_sells': []}]}, 'portfolios[0] needs a user_id'),
+        ({'portfolios': ['USR000001']}, 'portfolios[0] needs a user_id'),
+        ({'portfolios': [{'user_id': 'USR000001', 'selected_buys': 'all'}]}, 'selected_buys'),
+        ({'user_ids': ['USR000001'], 'batch_size': 0}, 'batch_size'),
+        ({'user_ids': ['USR000001'], 'batch_size': '50'}, 'batch_size'),
+        ({'user_ids': ['USR000001'], 'batch_size': True}, 'batch_size'),
+        ({'user_ids': 'USR000001'}, 'user_ids'),
+        ({'filter': {'city': 'Boston'}}, 'Unknown filter city'),
+        ({'user_ids': ['USR000001'], 'strategy': 'fastest'}, 'strategy'),
+        (['USR000001'], 'JSON object')
+    ]:
+        response = client.post('/api/rebalance/bulk', json=body)
+        assert response.status_code == 400, f'{body}: {response.status_code}'
+        assert fragment in response.get_json()['error']
+
+
+def test_job_results_are_capped(seeded_db_path, monkeypatch):
+    monkeypatch.setattr(bulk_rebalance, 'MAX_REPORTED_RESULTS', 3)
+    queue = BulkRebalanceQueue(workers=1, db_path=seeded_db_path)
+    user_ids = [f'USR9{i:05d}' for i in range(8)]  # unknown users fail without writing
+
+    job = queue.submit(user_ids, batch_size=2)
+    queue.shutdown(wait=True)
+
+    assert (job.status, job.processed, job.failed) == ('failed', 8, 8)
+    assert len(job.results) == 3
+    assert job.to_dict(include_results=True)['results_omitted'] == 5
+
+
+def test_finished_jobs_expire_and_are_capped(seeded_db_path, monkeypatch):
+    monkeypatch.setattr(bulk_rebalance, 'MAX_FINISHED_JOBS', 2)
+    queue = BulkRebalanceQueue(workers=1, db_path=seeded_db_path)
+    jobs = [queue.submit([]) for _ in range(4)]  # no users: finished on submit
+    assert [job.job_id for job in queue.jobs()] == [job.job_id for job in jobs[-2:]]
+
+    jobs[-2].finished_at -= datetime.timedelta(seconds=bulk_rebalance.FINISHED_JOB_TTL_SECONDS + 1)
+    assert queue.get(jobs[-2].job_id) is None
+    assert [job.job_id for job in queue.jobs()] == [jobs[-1].job_id]
+    queue.shutdown()
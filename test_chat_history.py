@@ -0,0 +1,75 @@
+"""
+Chat history store tests.
+Each test keeps its history in its own copy of the portal database and checks what stays
+in memory and what reaches the chat_messages table.
+Run with: python -m pytest -q test_chat_history.py
+"""
+
+import datetime
+import threading
+
+from chat_history import ChatHistoryStore, ChatMessage
+
+
+def message(content, role='user'):
+    return ChatMessage(role, content, datetime.datetime(2026, 1, 1, 9, 30))
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+def test_histories_are_kept_per_user_and_capped(seeded_db_path):
+    store = ChatHistoryStore(db_path=seeded_db_path, max_messages=3)
+    store.append('USR000001', *(message(f'one {i}') for i in range(5)))
+    store.append('USR000002', message('two 0'), message('two 1', 'assistant'))
+
+    assert contents(store.recent('USR000001')) == ['one 2', 'one 3', 'one 4']
+    assert contents(store.recent('USR000001', limit=2)) == ['one 3', 'one 4']
+    assert contents(store.recent('USR000002')) == ['two 0', 'two 1']
+    assert store.recent('USR000003') == []
+
+
+def test_flush_persists_every_message(seeded_db_path, seeded_db):
+    store = ChatHistoryStore(db_path=seeded_db_path, max_messages=3)
+    store.append('USR000001', *(message(f'one {i}') for i in range(5)))
+    store.flush()
+
+    assert store.stats()['pending_writes'] == 0
+    assert seeded_db.execute("SELECT COUNT(*) FROM chat_messages WHERE user_id = 'USR000001'").fetchone()[0] == 5
+    # A fresh store loads the newest messages back, up to its cap
+    reloaded = ChatHistoryStore(db_path=seeded_db_path, max_messages=3).recent('USR000001')
+    assert contents(reloaded) == ['one 2', 'one 3', 'one 4']
+    assert store.session_count() == 1
+
+
+def test_least_recently_used_users_are_evicted_and_reloaded(seeded_db_path):
+    store = ChatHistoryStore(db_path=seeded_db_path, max_users=2)
+    for user_id in ('USR000001', 'USR000002', 'USR000003'):
+        store.append(user_id, message(f'hello from {user_id}'))
+    store.flush()
+
+    stats = store.stats()
+    assert stats['resident_users'] == 2 and stats['resident_messages'] == 2
+    assert contents(store.recent('USR000001')) == ['hello from USR000001']
+    assert store.stats()['resident_users'] == 2
+
+
+def test_load_racing_an_append_keeps_the_appended_message(seeded_db_path):
+    store = ChatHistoryStore(db_path=seeded_db_path, max_users=1)
+    load = store._load
+
+    def slow_load(user_id):
+        loaded = load(user_id)
+        if user_id == 'USR000001' and not getattr(slow_load, 'raced', False):
+            # While this read was outside the lock, another thread appends, the writer
+            # persists it and a second user pushes USR000001 past the resident cap
+            slow_load.raced = True
+            racer = threading.Thread(target=lambda: (store.append('USR000001', message('racing')), store.flush(),
+                                                     store.append('USR000002', message('other')), store.flush()))
+            racer.start()
+            racer.join()
+        return loaded
+
+    store._load = slow_load
+    assert contents(store.recent('USR000001')) == ['racing']
@@ -0,0 +1,85 @@
+"""
+Incremental ingest tests.
+Each test ingests into its own copy of the seeded portal database and checks the counts
+and the rows left behind.
+Run with: python -m pytest -q test_ingest.py
+"""
+
+import csv
+
+from ingest import DATASETS, ingest_dataset
+
+
+def table_counts(conn):
+    return {
+        'investors': conn.execute('SELECT COUNT(*) FROM investor_ref_data').fetchone()[0],
+        'holdings': conn.execute('SELECT COUNT(*) FROM user_holdings').fetchone()[0],
+        'orphaned_holdings': conn.execute('''
+            SELECT COUNT(*) FROM user_holdings
+            WHERE user_id NOT IN (SELECT user_id FROM investor_ref_data)
+        ''').fetchone()[0]
+    }
+
+
+def write_investors_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(DATASETS['investors'].columns)
+        writer.writerows(rows)
+
+
+def investor_rows(conn, user_ids):
+    columns = ', '.join(DATASETS['investors'].columns)
+    return [list(conn.execute(f'SELECT {columns} FROM investor_ref_data WHERE user_id = ?', (user_id,)).fetchone())
+            for user_id in user_ids]
+
+
+def test_default_ingest_keeps_investors_missing_from_the_file(seeded_db):
+    before = table_counts(seeded_db)
+
+    counts = ingest_dataset(seeded_db, 'investors')
+
+    after = table_counts(seeded_db)
+    assert counts['deleted'] == 0
+    assert counts['missing'] > 0  # the seeded investors are not all in InvestorRefData.xlsx
+    assert after['investors'] == before['investors'] + counts['inserted']
+    assert after['holdings'] == before['holdings']
+    assert after['orphaned_holdings'] == 0
+
+
+def test_delete_missing_never_orphans_holdings(tmp_path, seeded_db):
+    before = table_counts(seeded_db)
+    # Keep two investors in the file and add one without holdings, then drop it from the next file
+    kept = investor_rows(seeded_db, ['USR000001', 'USR000003'])
+    newcomer = kept[0][:]
+    newcomer[0], newcomer[1] = 'USR999999', 'New Investor'
+    path = str(tmp_path / 'investors.csv')
+    write_investors_csv(path, kept + [newcomer])
+    assert ingest_dataset(seeded_db, 'investors', path)['inserted'] == 1
+    write_investors_csv(path, kept)
+
+    counts = ingest_dataset(seeded_db, 'investors', path, delete_missing=True)
+
+    after = table_counts(seeded_db)
+    assert counts['deleted'] == 1  # only the investor without holdings
+    assert counts['protected'] == before['investors'] - 2
+    assert after['investors'] == before['investors']
+    assert after['orphaned_holdings'] == 0
+    assert seeded_db.execute("SELECT COUNT(*) FROM investor_ref_data WHERE user_id = 'USR999999'").fetchone()[0] == 0
+
+
+def test_ingest_diffs_by_key(tmp_path, seeded_db):
+    rows = investor_rows(seeded_db, ['USR000001', 'USR000003'])
+    rows[1][2] = rows[1][2] + 1  # age changed
+    path = str(tmp_path / 'investors.csv')
+    write_investors_csv(path, rows + [rows[1]])  # a repeated key keeps its last row
+
+    dry_run = ingest_dataset(seeded_db, 'investors', path, dry_run=True)
+    counts = ingest_dataset(seeded_db, 'investors', path)
+
+    assert dry_run == counts
+    assert (counts['inserted'], counts['updated'], counts['unchanged'], counts['duplicates']) == (0, 1, 1, 1)
+    assert seeded_db.execute("SELECT age FROM investor_ref_data WHERE user_id = 'USR000003'").fetchone()[0] == rows[1][2]
+    assert ingest_dataset(seeded_db, 'investors', path)['updated'] == 0
+    logged = seeded_db.execute("SELECT COUNT(*) FROM ingest_log WHERE table_name = 'investor_ref_data'").fetchone()[0]
+    assert logged == 2
@@ -0,0 +1,81 @@
+"""
+Price tick tests.
+Each test applies ticks to its own copy of the portal database through a fresh reverse
+index and checks the holdings and snapshots left behind.
+Run with: python -m pytest -q test_price_ticks.py
+"""
+
+import sqlite3
+
+import pytest
+
+from holdings_index import HoldingsIndex
+from price_ticks import apply_ticks, parse_tick
+
+
+def holding_values(conn, symbol):
+    return {row[0]: (row[1], row[2]) for row in conn.execute(
+        'SELECT id, units_held, current_value FROM user_holdings WHERE fund_symbol = ?', (symbol,))}
+
+
+def add_holding(path, user_id, symbol, units):
+    """Buy symbol for user_id through a separate connection, as another process would"""
+    other = sqlite3.connect(path)
+    cursor = other.execute('''
+        INSERT INTO user_holdings (user_id, fund_symbol, fund_name, asset_class, units_held, current_price,
+                                   invested_amount, current_value)
+        SELECT ?, fund_symbol, fund_name, asset_class, ?, current_price, ? * current_price, ? * current_price
+        FROM funds_universe WHERE fund_symbol = ?
+    ''', (user_id, units, units, units, symbol))
+    other.commit()
+    other.close()
+    return cursor.lastrowid
+
+
+def test_tick_reprices_every_holding_of_the_symbol(seeded_db_path, seeded_db):
+    symbol = seeded_db.execute('SELECT fund_symbol FROM user_holdings GROUP BY fund_symbol ORDER BY COUNT(*) DESC').fetchone()[0]
+    untouched = seeded_db.execute('SELECT id, current_value FROM user_holdings WHERE fund_symbol != ?', (symbol,)).fetchall()
+
+    result = apply_ticks(seeded_db, [(symbol, 1.0), (symbol, 2.5)], HoldingsIndex(db_path=seeded_db_path))
+
+    holdings = holding_values(seeded_db, symbol)
+    assert result['holdings_repriced'] == len(holdings)
+    assert all(abs(value - units * 2.5) < 1e-9 for units, value in holdings.values())
+    assert seeded_db.execute('SELECT current_price FROM funds_universe WHERE fund_symbol = ?', (symbol,)).fetchone()[0] == 2.5
+    assert [tuple(row) for row in seeded_db.execute('SELECT id, current_value FROM user_holdings WHERE fund_symbol != ?',
+                                               (symbol,))] == [tuple(row) for row in untouched]
+    for user_id in result['user_ids']:
+        snapshot = seeded_db.execute('SELECT total_value FROM portfolio_snapshot WHERE user_id = ?', (user_id,)).fetchone()[0]
+        total = seeded_db.execute('SELECT SUM(current_value) FROM user_holdings WHERE user_id = ?', (user_id,)).fetchone()[0]
+        assert abs(snapshot - total) < 0.01
+
+
+def test_index_follows_holdings_written_by_another_process(seeded_db_path, seeded_db):
+    index = HoldingsIndex(db_path=seeded_db_path)
+    symbol = 'AAPL'
+    apply_ticks(seeded_db, [(symbol, 100.0)], index)  # builds the index
+    assert not index.holders(symbol) & {'USR000001'}
+
+    bought = add_holding(seeded_db_path, 'USR000001', symbol, 3)
+    result = apply_ticks(seeded_db, [(symbol, 120.0)], index)
+
+    assert 'USR000001' in result['user_ids']
+    assert holding_values(seeded_db, symbol)[bought] == (3, 360.0)
+
+    other = sqlite3.connect(seeded_db_path)
+    other.execute('DELETE FROM user_holdings WHERE id = ?', (bought,))
+    other.commit()
+    other.close()
+    result = apply_ticks(seeded_db, [(symbol, 130.0)], index)
+
+    assert 'USR000001' not in result['user_ids']
+    assert 'USR000001' not in index.holders(symbol)
+
+
+def test_malformed_ticks_are_rejected():
+    assert parse_tick(' aapl ,101.5') == ('AAPL', 101.5)
+    assert parse_tick('{"symbol": "vnq", "price": 88}') == ('VNQ', 88.0)
+    assert parse_tick('# comment') is None
+    for line in (',100', 'AAPL,0', 'AAPL,-3', 'AAPL,inf', 'AAPL,nan', '{"symbol": "AAPL", "price": 1e999}'):
+        with pytest.raises(ValueError):
+            parse_tick(line)
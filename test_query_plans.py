@@ -0,0 +1,70 @@
+"""
+Query-plan regression test for the hot API routes.
+Runs each route against a copy of the portal database, captures every SELECT it issues
+and fails if SQLite plans a full-table scan on one of the indexed tables.
+Run with: python -m pytest -q test_query_plans.py
+"""
+
+import re
+
+from app import app  # applies migrations to the scratch copy
+from db import get_pool
+
+INDEXED_TABLES = {'user_holdings', 'funds_universe', 'investor_ref_data', 'portfolios_cur_allocation', 'portfolio_snapshot'}
+
+HOT_ROUTES = [
+    '/api/user/USR000012',
+    '/api/user/USR000012/holdings',
+    '/api/rebalance/USR000012/Equity',
+    '/api/rebalance-options/USR000012/Equity',
+    '/api/ai/scenarios/USR000012'
+]
+
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)(?: AS (\w+))?')
+
+
+def capture_route_queries(url):
+    """Call a route and return the SELECT statements it executed (with bound values)"""
+    statements = []
+    pool = get_pool()
+    conn = pool.acquire()
+    conn.set_trace_callback(statements.append)
+    conn.close()  # back to the pool; the test client borrows this same connection
+
+    try:
+        response = app.test_client().get(url)
+    finally:
+        conn = pool.acquire()
+        conn.set_trace_callback(None)
+        conn.close()
+
+    assert response.status_code == 200, f'{url} returned {response.status_code}'
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+def full_scans(sql):
+    """Tables (or aliases of tables) in INDEXED_TABLES that the plan reads with a full scan"""
+    aliases = {}
+    for table, alias in re.findall(r'(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'ON', 'JOIN', 'LEFT', 'INNER', 'ORDER', 'GROUP', 'LIMIT'):
+            aliases[alias] = table
+
+    with get_pool().connection() as conn:
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+
+    scans = []
+    for row in plan:
+        match = SCAN_PATTERN.match(row['detail'])
+        if match and aliases.get(match.group(1)) in INDEXED_TABLES:
+            scans.append(row['detail'])
+    return scans
+
+
+def test_hot_routes_use_indexes():
+    for url in HOT_ROUTES:
+        queries = capture_route_queries(url)
+        assert queries, f'{url} issued no queries'
+        for sql in queries:
+            scans = full_scans(sql)
+            assert not scans, f'{url} full-table scan {scans} in:\n{sql}'
@@ -0,0 +1,80 @@
+"""
+Minimum-turnover solver tests.
+The class-level solve is checked on hand-worked books; the trade plans are checked on a
+copy of the portal database, before and after their orders are applied.
+Run with: python -m pytest -q test_rebalance_solver.py
+"""
+
+import numpy as np
+
+from bulk_rebalance import load_batch_positions, load_buy_candidates, plan_target_orders
+from order_engine import apply_orders
+from rebalance_solver import MIN_TRADE_AMOUNT, solve_class_values, solve_rebalancing
+
+ALL_BUYABLE = np.array([True, True, True, True])
+
+
+def solve_one(class_values, targets, band, buyable=ALL_BUYABLE, unclassified=0.0):
+    class_values = np.array([class_values], dtype=float)
+    return solve_class_values(class_values, class_values.sum(axis=1) + unclassified, np.array([targets], dtype=float),
+                              np.array([band], dtype=float), buyable)[0]
+
+
+def test_trades_stop_at_the_band_edges():
+    solved = solve_one([70, 20, 5, 5], [50, 30, 10, 10], 5)
+
+    # Equity is trimmed only to the top of its band; the proceeds go to the classes short of target
+    assert np.allclose(solved, [55, 25 + 10 / 3, 5 + 10 / 3, 5 + 10 / 3])
+    assert abs(solved.sum() - 100) < 1e-9
+    assert np.abs(solved - [70, 20, 5, 5]).sum() < np.abs(np.array([50, 30, 10, 10]) - [70, 20, 5, 5]).sum()
+
+
+def test_portfolio_inside_its_bands_is_left_alone():
+    assert np.allclose(solve_one([52, 28, 11, 9], [50, 30, 10, 10], 5), [52, 28, 11, 9])
+
+
+def test_class_without_a_fund_to_buy_never_grows():
+    solved = solve_one([70, 20, 5, 5], [50, 30, 10, 10], 5, np.array([True, True, True, False]))
+    assert solved[3] <= 5 + 1e-9
+    assert abs(solved.sum() - 100) < 1e-9
+
+
+def test_unclassified_holdings_are_not_spent():
+    # 10 of the 100 sits in a holding outside the asset classes: buying the short class up to
+    # its band must be paid for by trims, not by that holding
+    solved = solve_one([50, 30, 10, 0], [50, 30, 10, 10], 5, unclassified=10)
+
+    assert abs(solved.sum() - 90) < 1e-9
+    assert np.allclose(solved, [50 - 5 / 3, 30 - 5 / 3, 10 - 5 / 3, 5])
+
+
+def test_plans_are_self_financing_and_trade_less_than_target_rebalancing(seeded_db):
+    plans = solve_rebalancing(seeded_db)
+    positions = load_batch_positions(seeded_db, list(plans))
+    buy_candidates = load_buy_candidates(seeded_db)
+    assert plans
+
+    for user_id, plan in plans.items():
+        sold = sum(order['amount'] for order in plan['sells'])
+        bought = sum(order['amount'] for order in plan['buys'])
+        assert abs(sold - bought) <= MIN_TRADE_AMOUNT * 4, user_id
+        assert all(order['amount'] >= MIN_TRADE_AMOUNT for order in plan['sells'] + plan['buys'])
+        if plan['within_band']:
+            for asset_class, target in plan['target'].items():
+                assert abs(plan['proposed'][asset_class] - target) <= plan['variation_limit'] + 0.01
+
+        target_sells, target_buys = plan_target_orders(positions[user_id], buy_candidates)
+        target_turnover = sum(order['amount'] for order in target_sells + target_buys)
+        assert sold + bought <= target_turnover + 0.05, user_id
+
+
+def test_applied_plans_need_no_further_trades(seeded_db):
+    plans = solve_rebalancing(seeded_db)
+    for user_id, plan in plans.items():
+        if plan['sells'] or plan['buys']:
+            apply_orders(seeded_db, user_id, plan['sells'], plan['buys'])
+
+    for user_id, plan in solve_rebalancing(seeded_db).items():
+        if plans[user_id]['within_band']:
+            assert plan['within_band'], user_id
+            assert plan['turnover'] <= MIN_TRADE_AMOUNT * 4, user_id
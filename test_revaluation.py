@@ -0,0 +1,90 @@
+"""
+Mark-to-market revaluation tests.
+Each test revalues its own copy of the portal database and checks the holdings, snapshots
+and price history left behind.
+Run with: python -m pytest -q test_revaluation.py
+"""
+
+import pytest
+
+from revaluation import revalue_holdings
+
+SYMBOL = 'VNQ'  # quoted by both funds_universe and product_market_data, held by five investors
+
+
+def set_prices(conn, funds_price, market_price):
+    conn.execute('UPDATE funds_universe SET current_price = ? WHERE fund_symbol = ?', (funds_price, SYMBOL))
+    conn.execute('UPDATE product_market_data SET market_price_usd = ? WHERE symbol = ?', (market_price, SYMBOL))
+    conn.commit()
+
+
+def holdings_of(conn, symbol=SYMBOL):
+    return conn.execute('''
+        SELECT user_id, units_held, current_price, current_value FROM user_holdings
+        WHERE fund_symbol = ? ORDER BY id
+    ''', (symbol,)).fetchall()
+
+
+def test_holdings_are_marked_to_the_first_source_quoting_them(seeded_db):
+    revalue_holdings(seeded_db)  # settle the seeded book on the default sources
+    set_prices(seeded_db, 100.0, 90.0)
+
+    result = revalue_holdings(seeded_db)
+
+    holdings = holdings_of(seeded_db)
+    assert result['holdings_revalued'] == len(holdings)  # only the holdings whose price moved
+    assert sorted(result['user_ids']) == sorted({row['user_id'] for row in holdings})
+    assert all(row['current_price'] == 100.0 and abs(row['current_value'] - row['units_held'] * 100.0) < 1e-9
+               for row in holdings)
+
+    revalue_holdings(seeded_db, ('market', 'funds'))
+    assert all(row['current_price'] == 90.0 for row in holdings_of(seeded_db))
+
+
+def test_revaluation_refreshes_snapshots_and_price_history(seeded_db):
+    set_prices(seeded_db, 123.45, 90.0)
+
+    result = revalue_holdings(seeded_db)
+
+    assert result['value_change'] == round(result['book_value_after'] - result['book_value_before'], 2)
+    for user_id, snapshot_value, holdings_value in seeded_db.execute('''
+            SELECT s.user_id, s.total_value, SUM(h.current_value)
+            FROM portfolio_snapshot s JOIN user_holdings h ON h.user_id = s.user_id
+            GROUP BY s.user_id'''):
+        assert abs(snapshot_value - holdings_value) < 0.01, user_id
+    assert seeded_db.execute('''
+        SELECT price FROM fund_price_history WHERE fund_symbol = ? AND price_date = CURRENT_DATE
+    ''', (SYMBOL,)).fetchone()[0] == 123.45
+    assert revalue_holdings(seeded_db)['holdings_revalued'] == 0
+
+
+def test_dry_run_reports_without_writing(seeded_db):
+    set_prices(seeded_db, 150.0, 90.0)
+    before = [tuple(row) for row in holdings_of(seeded_db)]
+
+    dry_run = revalue_holdings(seeded_db, dry_run=True)
+
+    assert [tuple(row) for row in holdings_of(seeded_db)] == before
+    result = revalue_holdings(seeded_db)
+    assert {key: dry_run[key] for key in ('holdings_revalued', 'user_ids', 'book_value_after')} == \
+        {key: result[key] for key in ('holdings_revalued', 'user_ids', 'book_value_after')}
+
+
+def test_unknown_price_source_is_rejected(seeded_db):
+    with pytest.raises(ValueError):
+        revalue_holdings(seeded_db, ('funds', 'bloomberg'))
+
+
+def test_revaluation_bumps_the_holdings_version_once(seeded_db):
+    def holdings_version():
+        return seeded_db.execute("SELECT version FROM table_versions WHERE table_name = 'user_holdings'").fetchone()[0]
+
+    set_prices(seeded_db, 111.0, 90.0)
+    before = holdings_version()
+    assert revalue_holdings(seeded_db)['holdings_revalued'] > 1
+    assert holdings_version() == before + 1
+    assert revalue_holdings(seeded_db)['holdings_revalued'] == 0
+    assert holdings_version() == before + 1
+
+    seeded_db.execute('UPDATE user_holdings SET units_held = units_held + 1 WHERE fund_symbol = ?', (SYMBOL,))
+    assert holdings_version() > before + 1  # other writes still bump it per row
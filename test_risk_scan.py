@@ -0,0 +1,63 @@
+"""
+Risk scan tests.
+Two investors in a copy of the portal database get hand-built books, one past every alert
+threshold and one sitting exactly on them, and the scan's alerts are checked.
+Run with: python -m pytest -q test_risk_scan.py
+"""
+
+from portfolio_snapshot import refresh_portfolio_snapshots
+from risk_scan import scan_risk_alerts
+
+# (fund_name, current_value, return_percent, risk_rating) per holding; each book is worth 10,000
+BOOKS = {
+    # 31% in one fund, one holding down exactly 25%, and 56% in High / Very High funds
+    'USR000001': [('Alpha Growth', 3100, 0.0, 'High'), ('Beta Frontier', 2500, -25.0, 'Very High'),
+                  ('Gamma Bond', 2500, -24.9, 'Low'), ('Delta Cash', 1900, 2.0, 'Low')],
+    # 30% in one fund, no return below -25% and exactly 50% in High / Very High funds
+    'USR000002': [('Alpha Growth', 3000, 0.0, 'High'), ('Beta Frontier', 2000, -24.99, 'Very High'),
+                  ('Gamma Bond', 2500, 1.0, 'Low'), ('Delta Cash', 2500, 1.0, 'Low')]
+}
+
+
+def load_books(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM user_holdings WHERE user_id IN ({', '.join('?' * len(BOOKS))})", list(BOOKS))
+    cursor.executemany('''
+        INSERT INTO user_holdings (user_id, fund_symbol, fund_name, asset_class, units_held, current_price,
+                                   invested_amount, current_value, return_percent, risk_rating)
+        VALUES (?, ?, ?, 'Equity', 1, ?, ?, ?, ?, ?)
+    ''', [(user_id, name.split()[0].upper(), name, value, value, value, return_percent, rating)
+          for user_id, holdings in BOOKS.items() for name, value, return_percent, rating in holdings])
+    refresh_portfolio_snapshots(cursor, list(BOOKS))
+    conn.commit()
+
+
+def without_timestamps(alerts):
+    return [{key: value for key, value in alert.items() if key != 'timestamp'} for alert in alerts]
+
+
+def test_alerts_fire_past_each_threshold(seeded_db):
+    load_books(seeded_db)
+
+    alerts = scan_risk_alerts(seeded_db.cursor(), list(BOOKS))
+
+    assert set(alerts) == {'USR000001'}
+    by_type = {}
+    for alert in alerts['USR000001']:
+        by_type.setdefault(alert['type'], []).append(alert)
+    assert [a['affected_holdings'] for a in by_type['concentration_risk']] == [['Alpha Growth']]
+    assert [a['affected_holdings'] for a in by_type['deep_loss']] == [['Beta Frontier']]
+    exposure, = by_type['high_risk_exposure']
+    assert sorted(exposure['affected_holdings']) == ['Alpha Growth', 'Beta Frontier']
+    assert exposure['message'].startswith('56.0%')
+
+
+def test_whole_book_scan_matches_the_per_user_scan(seeded_db):
+    load_books(seeded_db)
+
+    everyone = scan_risk_alerts(seeded_db.cursor())
+
+    assert 'USR000002' not in everyone
+    one = scan_risk_alerts(seeded_db.cursor(), ['USR000001'])
+    assert without_timestamps(everyone['USR000001']) == without_timestamps(one['USR000001'])
+    assert scan_risk_alerts(seeded_db.cursor(), []) == {}
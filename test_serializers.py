@@ -0,0 +1,41 @@
+"""
+Row serializer tests.
+Every installed encoder must produce the same objects as encoding a dict per row.
+Run with: python -m pytest -q test_serializers.py
+"""
+
+import json
+
+from serializers import ENCODERS, encode_rows, encoded_row_chunks
+
+COLUMNS = ['user_id', 'full_name', 'age', 'annual_income', 'note', '100%']
+ROWS = [
+    ('USR000001', 'Ana "AJ" Jones', 34, 85000.5, None, 1),
+    ('USR000002', 'Smith, John', 41, None, 'tab\there, and a comma', 0.1 + 0.2),
+    ('USR000003', 'Zoë Ørsted', 29, 1e-07, 'back\\slash %s %b', -3),
+    ('USR000004', '', 0, 0.0, ' ', 2 ** 53, 'extra trailing value')
+]
+
+
+def expected_objects(rows=ROWS):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def test_encode_rows_matches_dict_encoding():
+    for name, encoder in ENCODERS.items():
+        for chunk_rows in (1, 3, 1000):
+            body, count = encode_rows(COLUMNS, ROWS, encoder, chunk_rows=chunk_rows)
+            assert count == len(ROWS)
+            assert json.loads(body) == expected_objects(), f'{name} encoder, chunks of {chunk_rows}'
+
+
+def test_encode_rows_without_rows():
+    for encoder in ENCODERS.values():
+        assert encode_rows(COLUMNS, [], encoder) == (b'[]', 0)
+
+
+def test_encoded_row_chunks_are_one_object_per_row():
+    for encoder in ENCODERS.values():
+        chunks = list(encoded_row_chunks(COLUMNS, ROWS, encoder, chunk_rows=2))
+        assert [len(chunk) for chunk in chunks] == [2, 2]
+        assert [json.loads(row) for chunk in chunks for row in chunk] == expected_objects()
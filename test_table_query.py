@@ -0,0 +1,149 @@
+"""
+Table API tests: keyset paging (including NULL sort values), column and range filters on
+plain and computed columns. Runs against copies of the portal database.
+Run with: python -m pytest -q test_table_query.py
+"""
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import app  # applies migrations to the scratch copy
+from db import get_pool
+from table_query import query_table
+
+INVESTORS_FROM = 'investor_ref_data i LEFT JOIN portfolios_cur_allocation p ON i.user_id = p.user_id'
+
+
+def get_rows(url):
+    response = app.test_client().get(url)
+    assert response.status_code == 200, f'{url} returned {response.status_code}: {response.get_data(as_text=True)}'
+    body = response.get_json()
+    assert int(response.headers['X-Total-Count']) == body.get('total', body['count'])
+    return body['data']
+
+
+def count_where(where, params=()):
+    with get_pool().connection() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {INVESTORS_FROM} WHERE {where}', params).fetchone()[0]
+
+
+@pytest.fixture
+def null_sort_db(seeded_db):
+    """The test's copy of the portal database with allocations that sort on NULLs"""
+    seeded_db.execute("UPDATE portfolios_cur_allocation SET last_rebalance_date = '2024-0' || (id % 3 + 1) || '-15' WHERE id % 2 = 0")
+    seeded_db.executemany('''
+        INSERT INTO portfolios_cur_allocation (user_id, full_name, total_investment_amount, equities_percent,
+                                               bonds_percent, cash_percent, alternatives_percent)
+        VALUES (?, ?, ?, ?, 20, 10, 10)
+    ''', [(f'USR8{i:05d}', f'Null Sort {i}', 1000.0 * i, None if i % 3 else 60.0) for i in range(7)])
+    seeded_db.commit()
+    return seeded_db
+
+
+def page_through(conn, table, args, limit):
+    """Every row of table for args, fetched limit rows at a time by following next_cursor"""
+    rows, pages, after = [], 0, None
+    while True:
+        page_args = MultiDict(args)
+        page_args['limit'] = str(limit)
+        if after:
+            page_args['after'] = after
+        result = query_table(conn, table, page_args)
+        rows.extend(result['data'])
+        pages += 1
+        after = result['next_cursor']
+        if after is None:
+            return rows, pages
+        assert len(result['data']) == limit
+
+
+def test_keyset_pages_cover_the_table_with_null_sort_values(null_sort_db):
+    for sort in ('last_rebalance_date', '-last_rebalance_date', 'equities_percent,user_id',
+                 '-equities_percent,-last_rebalance_date', 'last_rebalance_date,-equities_percent'):
+        expected = query_table(null_sort_db, 'portfolio-allocation', {'sort': sort})['data']
+        assert any(row['last_rebalance_date'] is None for row in expected)
+        for limit in (1, 3, 4):
+            rows, pages = page_through(null_sort_db, 'portfolio-allocation', {'sort': sort}, limit)
+            assert [row['id'] for row in rows] == [row['id'] for row in expected], f'sort={sort} limit={limit}'
+            assert pages == -(-len(expected) // limit)
+
+
+def test_keyset_pages_with_filters(null_sort_db):
+    args = {'sort': '-equities_percent', 'equities_percent_min': '40', 'total_investment_amount_max': '1e9'}
+    expected = query_table(null_sort_db, 'portfolio-allocation', args)['data']
+    assert expected and all(row['equities_percent'] >= 40 for row in expected)
+
+    rows, _ = page_through(null_sort_db, 'portfolio-allocation', args, 2)
+    assert rows == expected
+    assert query_table(null_sort_db, 'portfolio-allocation', dict(args, limit='2'))['total'] == len(expected)
+
+    names = ['Null Sort 1', 'Null Sort 4']
+    rows, _ = page_through(null_sort_db, 'portfolio-allocation', MultiDict([('full_name', name) for name in names]), 1)
+    assert sorted(row['full_name'] for row in rows) == names
+
+
+def test_range_filter_on_plain_column():
+    rows = get_rows('/api/investor-data?age_min=30&age_max=60')
+    assert len(rows) == count_where('i.age BETWEEN 30 AND 60')
+    assert rows and all(30 <= row['age'] <= 60 for row in rows)
+
+
+def test_range_filter_on_computed_columns():
+    threshold = get_rows('/api/investor-data?sort=total_portfolio_value')[-1]['total_portfolio_value']
+    rows = get_rows(f'/api/investor-data?total_portfolio_value_min={threshold}')
+    assert rows and all(row['total_portfolio_value'] >= threshold for row in rows)
+    assert len(rows) == count_where('COALESCE(p.total_investment_amount, 0) >= ?', (threshold,))
+
+    rows = get_rows('/api/investor-data?current_equities_percent_min=1&current_equities_percent_max=100')
+    assert len(rows) == count_where('COALESCE(p.equities_percent, i.equities_percent) BETWEEN 1 AND 100')
+    assert rows
+
+
+def test_value_filter_with_range_filter():
+    city = get_rows('/api/investor-data?limit=1')[0]['city']
+    rows = get_rows(f'/api/investor-data?city={city}&total_portfolio_value_min=0')
+    assert rows and all(row['city'] == city for row in rows)
+    assert len(rows) == count_where('i.city = ?', (city,))
+
+
+def test_non_numeric_range_bound_is_rejected():
+    client = app.test_client()
+    for url in ('/api/investor-data?age_min=abc',
+                '/api/investor-data?total_portfolio_value_max=nan',
+                '/api/portfolio-allocation?equities_percent_min=1e999'):
+        response = client.get(url)
+        assert response.status_code == 400, url
+        assert response.get_json()['success'] is False
+
+
+def test_unchanged_table_revalidates_with_304():
+    client = app.test_client()
+    first = client.get('/api/portfolio-allocation?limit=5')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+
+    revalidated = client.get('/api/portfolio-allocation?limit=5', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    assert client.get('/api/portfolio-allocation?limit=6').headers['ETag'] != etag
+
+
+def test_investor_summary_covers_every_matching_investor():
+    client = app.test_client()
+    response = client.get('/api/investor-data/summary')
+    assert response.status_code == 200
+    summary = response.get_json()['summary']
+
+    investors = get_rows('/api/investor-data')
+    assert summary['total_clients'] == len(investors) == count_where('1')
+    assert abs(summary['total_aum'] - sum(row['total_portfolio_value'] for row in investors)) < 0.01
+    assert sum(summary['risk_profiles'].values()) == sum(summary['age_groups'].values()) == len(investors)
+    largest = sorted(investors, key=lambda row: -row['total_portfolio_value'])[:5]
+    assert [row['total_portfolio_value'] for row in summary['top_investors']] == \
+        [row['total_portfolio_value'] for row in largest]
+
+    # Filters and search narrow the summary exactly as they narrow the table
+    filtered = client.get('/api/investor-data/summary?age_min=30&age_max=60').get_json()['summary']
+    assert filtered['total_clients'] == count_where('i.age BETWEEN 30 AND 60')
+    assert filtered['age_groups']['Under 30'] == filtered['age_groups']['Over 60'] == 0
+    assert client.get('/api/investor-data/summary?age_min=old').status_code == 400